@@ -1,15 +1,19 @@
 __version__ = '0.1.1'  # match this to the setup.py
 from .paulialg import (
-    Pauli,PauliList,PauliMonomial,PauliPolynomial,
+    Pauli,PauliList,PauliMonomial,PauliPolynomial,PauliPolynomialBuilder,
     pauli, paulis, pauli_identity, pauli_zero)
 from .stabilizer import(
-    CliffordMap,StabilizerState,
+    CliffordMap,StabilizerState,StabilizerStateBatch,
     identity_map, random_pauli_map, random_clifford_map, clifford_rotation_map,
-    stabilizer_state, maximally_mixed_state, zero_state, one_state, bit_state,
+    stabilizer_state, stabilizer_state_batch, maximally_mixed_state, zero_state, one_state, bit_state,
     ghz_state, random_pauli_state, random_clifford_state,random_bit_state)
 from .circuit import(
-    CliffordGate,Measurement,Layer,Circuit,
+    CliffordGate,Measurement,Layer,Circuit,Tape,
     CNOT,SWAP,CZ,CX,C,X,Y,Z,H,S,clifford_rotation_gate,
     identity_circuit, brickwall_rcc, onsite_rcc, global_rcc, measurement_layer,
     diagonalize, SBRG)
-from .device import ClassicalShadow
+from .device import ClassicalShadow, PauliShadow, CliffordShadow
+from .trajectory import Trajectories, run_trajectories
+from .utils import set_num_threads, get_num_threads
+from .storage import (save, load, save_shadow, load_shadow, 
+    save_checkpoint, load_checkpoint, forward_checkpointed)
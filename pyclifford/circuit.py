@@ -1,9 +1,11 @@
 import numpy
 import warnings
-from .utils import mask, condense, pauli_diagonalize1
+from .utils import (DTYPE, mask, condense, pauli_diagonalize1, TABLE_MAX_QUBITS,
+                    frame_combine, frame_transform, frame_measure, tape_run, rng_stream, rng_words,
+                    TAPE_TABLE, TAPE_MAP, TAPE_MEASURE, TAPE_POSTSELECT)
 from .paulialg import Pauli, pauli, paulis, PauliMonomial, pauli_zero
-from .stabilizer import (StabilizerState, CliffordMap, identity_map,
-                         clifford_rotation_map, random_clifford_map)
+from .stabilizer import (StabilizerState, StabilizerStateBatch, CliffordMap, identity_map,
+                         clifford_rotation_map, random_clifford_map, clifford_group)
 
 class CliffordGate(object):
     '''Represents a Clifford unitary gate.
@@ -21,6 +23,9 @@ class CliffordGate(object):
         single Pauli operator gets mapped to. (forward and backward maps must 
         be inverse to each other).
     unitary: bool - indicates that gate is unitary.
+    index: int - for gates on 1 or 2 qubits, the index of the gate in the 
+        Clifford group table (see clifford_group), if the maps are taken 
+        from the table (shared, not to be modified in-place).
 
     Note: if either the geneator or Clifford maps are specified, the gate will 
         represent the specific unitary transformation; otherwise, the gate 
@@ -36,6 +41,7 @@ class CliffordGate(object):
         self.generator = None
         self.forward_map = None
         self.backward_map = None
+        self.index = None
     
     def __repr__(self):
         return '[{}]'.format(','.join(str(qubit) for qubit in self.qubits))
@@ -44,19 +50,36 @@ class CliffordGate(object):
         if not isinstance(gen, Pauli):
             raise TypeError("Rotation generator must be a Pauli string")
         self.generator = gen
+        self.forward_map = None # maps are compiled from the generator
+        self.backward_map = None
+        self.index = None
 
     def set_forward_map(self,forward_map):
         if not isinstance(forward_map, CliffordMap):
             raise TypeError("Forward map must be a instance of CliffordMap")
         self.forward_map = forward_map
+        self.index = None
 
     def set_backward_map(self,backward_map):
         if not isinstance(backward_map, CliffordMap):
             raise TypeError("Backward map must be a instance of CliffordMap")
         self.backward_map = backward_map
+        self.index = None
+
+    def set_index(self, index):
+        '''Set the gate to the Clifford map of a given index in the Clifford
+        group table (for gates on 1 or 2 qubits).'''
+        group = clifford_group(self.n)
+        self.generator = None
+        self.forward_map = group[index]
+        self.backward_map = group[group.inv[index]]
+        self.index = index
+        return self
 
     def copy(self):
         new = CliffordGate(*self.qubits)
+        if self.index is not None: # maps are shared with the table
+            return new.set_index(self.index)
         if self.generator is not None:
             new.generator = self.generator.copy()
         if self.forward_map is not None:
@@ -68,27 +91,37 @@ class CliffordGate(object):
     def independent_from(self, other):
         return len(set(self.qubits) & set(other.qubits))==0
 
-    def forward(self, obj):
+    def forward(self, obj, rng=None):
         '''Apply the gate forward in time. (inplace update)
         Forward transformation: O -> U O U^H
 
         Input:
         obj: Pauli, PauliList, StabilizerState - the object to be transformed
+        rng: random stream or seed of a random gate (see utils.rng_stream)
              
         Output:
         obj: (same as input type) - the object after the gate is applied
         log2prob: real - always 0.0 for unitary transformation'''
-        if self.generator is not None: # if generator is given, use generator
+        small = self.n < obj.N and self.n <= TABLE_MAX_QUBITS # small local gate
+        if self.generator is not None and not small: # if generator is given, use generator
             if self.n == obj.N: # global gate
                 obj.rotate_by(self.generator)
             else: # local gate
                 obj.rotate_by(self.generator, mask(self.qubits, obj.N))
-        else: # if generator not given, check maps
-            if self.forward_map is None:
+        else: # if generator not given (or small local gate), check maps
+            if self.generator is not None: # tabulate small local rotation
+                if self.forward_map is None:
+                    self.compile()
+                clifford_map = self.forward_map
+            elif self.forward_map is None:
                 if self.backward_map is None: 
                     # if both maps not given, treated as random gate
-                    clifford_map = random_clifford_map(self.n)
-                    self.forward_map = clifford_map # record as forward map
+                    if self.n <= 2: # draw from Clifford group table
+                        self.set_index(clifford_group(self.n).random(rng))
+                        clifford_map = self.forward_map
+                    else:
+                        clifford_map = random_clifford_map(self.n, rng)
+                        self.forward_map = clifford_map # record as forward map
                 else:
                     self.forward_map = self.backward_map.inverse()
                     clifford_map = self.forward_map
@@ -101,27 +134,37 @@ class CliffordGate(object):
         log2prob = 0.0 # unitary gate is deterministic, log2prob is always 0.0
         return obj, log2prob
 
-    def backward(self, obj):
+    def backward(self, obj, rng=None):
         '''Apply the gate backward in time. (inplace update)
         Backward transformation: O -> U^H O U
 
         Input:
         obj: Pauli, PauliList, StabilizerState - the object to be transformed
+        rng: random stream or seed of a random gate (see utils.rng_stream)
              
         Output:
         obj: (same as input type) - the object after the gate is applied
         log2prob: real - always 0.0 for unitary transformation'''
-        if self.generator is not None: # if generator is given, use generator
+        small = self.n < obj.N and self.n <= TABLE_MAX_QUBITS # small local gate
+        if self.generator is not None and not small: # if generator is given, use generator
             if self.n == obj.N: # global gate
                 obj.rotate_by(-self.generator)
             else: # local gate
                 obj.rotate_by(-self.generator, mask(self.qubits, obj.N))
-        else: # if generator not given, check maps
-            if self.backward_map is None:
+        else: # if generator not given (or small local gate), check maps
+            if self.generator is not None: # tabulate small local rotation
+                if self.backward_map is None:
+                    self.compile()
+                clifford_map = self.backward_map
+            elif self.backward_map is None:
                 if self.forward_map is None: 
                     # if both maps not given, treated as random gate
-                    clifford_map = random_clifford_map(self.n)
-                    self.backward_map = clifford_map # record as backward map
+                    if self.n <= 2: # draw from Clifford group table
+                        self.set_index(clifford_group(self.n).random(rng))
+                        clifford_map = self.backward_map
+                    else:
+                        clifford_map = random_clifford_map(self.n, rng)
+                        self.backward_map = clifford_map # record as backward map
                 else:
                     self.backward_map = self.forward_map.inverse()
                     clifford_map = self.backward_map
@@ -192,44 +235,47 @@ class Measurement(object):
     def independent_from(self, other):
         return len(set(self.qubits) & set(other.qubits))==0
 
-    def forward(self, obj):
+    def forward(self, obj, rng=None):
         '''Implements the measurement (non-deterministic sampling outcome).
         (inplace update)
         Forward transformation: rho -> M rho M^H / Tr(M rho M^H),
         where M is sampled with probability Tr(M rho M^H).
         
         Input:
-        obj: StabilizerState - the state to be measured
+        obj: StabilizerState or StabilizerStateBatch - the state to be measured
+        rng: random stream(s) or seed of the outcomes (see utils.rng_stream)
         
         Output:
-        obj: StabilizerState - the state after measurement
-        log2prob: real - log2 probability of the outcome'''
-        if not isinstance(obj, StabilizerState): # measurement only applicable to stabilizer state
+        obj: StabilizerState or StabilizerStateBatch - the state after measurement
+        log2prob: real - log2 probability of the outcome (for each state in batch)
+        
+        Note: for a batch of states, out has the shape (B, n).'''
+        if not isinstance(obj, (StabilizerState, StabilizerStateBatch)): # measurement only applicable to stabilizer state
             raise NotImplementedError("the object {} is not a stabilizer state".format(repr(obj)))
         # construct Z observables
         obs = paulis(pauli({i: 'Z'}, obj.N) for i in self.qubits)
         # perform measurement
-        self.out, log2prob = obj.measure(obs)
+        self.out, log2prob = obj.measure(obs, rng)
         return obj, log2prob
 
-    def backward(self, obj):
+    def backward(self, obj, rng=None):
         '''Postselect the measurement outcome (deterministic projection).
         (inplace update)
         Backward transformation: rho -> M^H rho M / Tr(M^H rho M)
         where M is fixed by the measurement outcome generated in the forward pass.
         
         Input:
-        obj: StabilizerState - the state to be postselected     
+        obj: StabilizerState or StabilizerStateBatch - the state to be postselected     
         
         Output:
-        obj: StabilizerState - the state after postselection
+        obj: StabilizerState or StabilizerStateBatch - the state after postselection
         log2prob: real - log2 probability of successful postselection'''
-        if not isinstance(obj, StabilizerState): # postselection only applicable to stabilizer state
+        if not isinstance(obj, (StabilizerState, StabilizerStateBatch)): # postselection only applicable to stabilizer state
             raise NotImplementedError("the object {} is not a stabilizer state".format(repr(obj)))
         # construct Z observables
         obs = paulis(pauli({i: 'Z'}, obj.N) for i in self.qubits)
         log2prob = obj.postselect(obs, self.out)
-        if log2prob == -numpy.inf: # if postselection fails
+        if numpy.any(log2prob == -numpy.inf): # if postselection fails
             warnings.warn("Impossible to postselect the recorded measurement outcomes on the current state in the backward pass. The resutlting state might be incorrect.")
         return obj, log2prob
 
@@ -266,7 +312,7 @@ class Layer(object):
     def out(self):
         outs = [op.out for op in self.ops if not op.unitary]
         if outs:
-            return numpy.concatenate(outs)
+            return numpy.concatenate(outs, axis=-1)
         else:
             return numpy.array([], dtype=numpy.int_)
 
@@ -276,7 +322,7 @@ class Layer(object):
             k = 0
             for op in self.ops:
                 if not op.unitary:
-                    op.out = out[k:k+op.n]
+                    op.out = out[..., k:k+op.n]
                     k += op.n
 
     def __repr__(self):
@@ -310,18 +356,18 @@ class Layer(object):
         self.backward_map = None
         return self
     
-    def forward(self, obj):
+    def forward(self, obj, rng=None):
         '''Apply the layer forward. (inplace update)'''
         log2prob = 0.0
         if self.unitary and self.forward_map is not None:
             obj.transform_by(self.forward_map) 
         else: # otherwise, apply each operation forward (in parallel)
             for op in self.ops:
-                obj, op_log2prob = op.forward(obj)
+                obj, op_log2prob = op.forward(obj, rng)
                 log2prob += op_log2prob
         return obj, log2prob
     
-    def backward(self, obj):
+    def backward(self, obj, rng=None):
         '''Apply the layer backward. (inplace update)'''
         log2prob = 0.0
         if self.unitary and self.backward_map is not None:
@@ -329,7 +375,7 @@ class Layer(object):
             obj.transform_by(self.backward_map)
         else: # otherwise, apply each operation backward (in parallel)
             for op in self.ops:
-                obj, op_log2prob = op.backward(obj)
+                obj, op_log2prob = op.backward(obj, rng)
                 log2prob += op_log2prob
         return obj, log2prob
     
@@ -389,7 +435,7 @@ class Circuit(object):
     def out(self):
         outs = [layer.out for layer in self.layers_forward() if not layer.unitary]
         if outs:
-            return numpy.concatenate(outs)
+            return numpy.concatenate(outs, axis=-1)
         else:
             return numpy.array([], dtype=numpy.int_)
 
@@ -403,7 +449,7 @@ class Circuit(object):
                 n = sum(op.n for op in layer.ops if not op.unitary)
                 print('number measurement:', n) # for debug
                 print('out[k:k+n]:', out[k:k+n]) # for debug
-                layer.out = out[k:k+n]
+                layer.out = out[..., k:k+n]
                 k += n
 
     def __repr__(self):
@@ -476,30 +522,147 @@ class Circuit(object):
         '''Add a measurement to the circuit'''
         return self.append(Measurement(*qubits))
 
-    def forward(self, obj):
-        '''Apply the circuit forward to a quantum object. (inplace update)'''
+    def forward(self, obj, rng=None):
+        '''Apply the circuit forward to a quantum object. (inplace update)
+        (rng: random stream or seed of random gates and measurements, see 
+        utils.rng_stream, drawn from the global numpy random state if None)'''
+        if rng is not None:
+            rng = rng_stream(rng) # share one stream among all operations
         log2prob = 0.0
         if self.forward_map is not None and self.unitary:
             # if circuit forward map has been compiled, use it
             obj.transform_by(self.forward_map)
         else: # otherwise, apply each layer forward (in forward sequence)
             for layer in self.layers_forward():
-                obj, layer_log2prob = layer.forward(obj)
+                obj, layer_log2prob = layer.forward(obj, rng)
                 log2prob += layer_log2prob
         return obj, log2prob
 
-    def backward(self, obj):
-        '''Apply the circuit backward to a quantum object. (inplace update)'''
+    def backward(self, obj, rng=None):
+        '''Apply the circuit backward to a quantum object. (inplace update)
+        (rng: random stream or seed of random gates, see Circuit.forward)'''
+        if rng is not None:
+            rng = rng_stream(rng)
         log2prob = 0.0
         if self.backward_map is not None and self.unitary:
             # if circuit backward map has been compiled, use it
             obj.transform_by(self.backward_map)
         else: # otherwise, apply each layer backward (in backward sequence)
             for layer in self.layers_backward():
-                obj, layer_log2prob = layer.backward(obj)
+                obj, layer_log2prob = layer.backward(obj, rng)
                 log2prob += layer_log2prob
         return obj, log2prob
 
+    def sample(self, obj, shots, packed=False, rng=None):
+        '''Sample measurement outcomes of many shots by Pauli frame simulation.
+
+        A reference shot is simulated by forward(obj.copy()), which also fixes
+        random gates. All shots are then propagated together as bit-packed 
+        Pauli frames relative to the reference shot (64 shots per word), 
+        costing O(n^2 shots/64) per n-qubit gate or measurement.
+
+        Input:
+        obj: StabilizerState - the initial state (not modified)
+        shots: int - number of shots
+        packed: bool - return outcomes bit-packed along the shot axis
+        rng: random stream or seed of the reference shot and of the frames
+            (see utils.rng_stream)
+
+        Output:
+        out: int (shots, M) - measurement outcomes of each shot (in the order 
+            of Circuit.out), or uint64 (M, ceil(shots/64)) if packed, where 
+            bit b of out[m, w] is outcome m of shot 64*w+b'''
+        if not isinstance(obj, StabilizerState):
+            raise NotImplementedError("the object {} is not a stabilizer state".format(repr(obj)))
+        rng = rng_stream(rng)
+        self.forward(obj.copy(), rng) # reference shot
+        W = (shots + 63)//64
+        # initial frames from stabilizers and standby destabilizers
+        gs = obj.gs[:obj.N+obj.r]
+        rand = rng_words(rng, gs.shape[0]*W).reshape((gs.shape[0], W))
+        xs, zs = frame_combine(gs, rand)
+        outs = []
+        for layer in self.layers_forward():
+            for op in layer.ops:
+                if op.unitary:
+                    if op.forward_map is None:
+                        op.compile()
+                    # local maps act on qubits in ascending order (see mask)
+                    frame_transform(xs, zs, op.forward_map.gs, numpy.sort(op.qubits))
+                else:
+                    rand = rng_words(rng, op.n*W).reshape((op.n, W))
+                    out = numpy.empty((op.n, W), dtype=numpy.uint64)
+                    outs.append(frame_measure(xs, zs, numpy.array(op.qubits), op.out, rand, out))
+        out = numpy.concatenate(outs) if outs else numpy.empty((0, W), dtype=numpy.uint64)
+        if packed:
+            return out
+        bits = numpy.unpackbits(out.astype('<u8').view(numpy.uint8), axis=-1, bitorder='little')
+        return bits[:, :shots].T.astype(numpy.int_)
+
+    def to_tape(self, N, backward=False, rng=None):
+        '''Compile the circuit into a flat instruction tape, to be run by a 
+        single compiled interpreter (see Tape). Random gates are fixed (by
+        sampling their forward maps) upon compilation.
+
+        Input:
+        N: int - number of qubits in the system
+        backward: bool - compile the backward pass (inverse gates in reverse
+            order, measurements postselected on their records) instead
+        rng: random stream or seed of random gates (see utils.rng_stream)
+
+        Output:
+        tape: Tape - the instruction tape'''
+        rng = rng_stream(rng)
+        ops, qoff, qubits, goff, poff, slots = [], [0], [], [], [], []
+        pool_gs, pool_ps = [], []
+        G, P, M = 0, 0, 0 # pool sizes and number of measurement records
+        instructions = []
+        for layer in self.layers_forward():
+            for op in layer.ops:
+                instructions.append((op, M))
+                if not op.unitary:
+                    M += op.n
+        if backward:
+            instructions.reverse()
+        for op, slot in instructions:
+            if op.unitary:
+                if op.generator is None and op.forward_map is None and op.backward_map is None:
+                    if op.n <= 2: # fix random gate
+                        op.set_index(clifford_group(op.n).random(rng))
+                    else:
+                        op.forward_map = random_clifford_map(op.n, rng)
+                clifford_map = op.backward_map if backward else op.forward_map
+                if clifford_map is None:
+                    op.compile()
+                    clifford_map = op.backward_map if backward else op.forward_map
+                qs = sorted(op.qubits) # local maps act on qubits in ascending order
+                if op.n <= TABLE_MAX_QUBITS:
+                    gs, ps = clifford_map.table
+                    ops.append(TAPE_TABLE)
+                else:
+                    gs, ps = clifford_map.gs, clifford_map.ps
+                    ops.append(TAPE_MAP)
+                pool_gs.append(gs.ravel())
+                pool_ps.append(ps.ravel())
+                goff.append(G)
+                poff.append(P)
+                G += gs.size
+                P += ps.size
+            else:
+                qs = op.qubits
+                ops.append(TAPE_POSTSELECT if backward else TAPE_MEASURE)
+                goff.append(G)
+                poff.append(P)
+            qubits.extend(qs)
+            qoff.append(len(qubits))
+            slots.append(slot)
+        pool_gs = numpy.concatenate(pool_gs + [numpy.zeros(0, dtype=DTYPE)]).astype(DTYPE)
+        pool_ps = numpy.concatenate(pool_ps + [numpy.zeros(0, dtype=DTYPE)]).astype(DTYPE)
+        return Tape(N, numpy.array(ops, dtype=numpy.int_), 
+            numpy.array(qoff, dtype=numpy.int_), numpy.array(qubits, dtype=numpy.int_), 
+            numpy.array(goff, dtype=numpy.int_), numpy.array(poff, dtype=numpy.int_), 
+            pool_gs, pool_ps, numpy.array(slots, dtype=numpy.int_), M)
+
     def compile(self, N):
         '''Compile the circuit into forward/backward maps where possible (unitary only).
         
@@ -515,6 +678,60 @@ class Circuit(object):
                 self.backward_map = layer.backward_map.compose(self.backward_map)
         return self
 
+class Tape(object):
+    '''Represents a circuit compiled to a flat instruction tape (see 
+    Circuit.to_tape and the instruction tape section of utils).
+
+    Parameters:
+    N: int - number of qubits.
+    ops: int (K) - opcodes of the K instructions.
+    qoff: int (K+1) - offsets of the qubits of each instruction.
+    qubits: int - qubits of all instructions.
+    goff, poff: int (K) - offsets of gate tables/maps in the pools.
+    pool_gs, pool_ps: int - pools of gate tables/maps (flattened).
+    slots: int (K) - measurement record slots of each instruction.
+    M: int - number of measurement records.
+
+    Data:
+    out: int (M) - measurement record, written by measurements and read by 
+        postselections (used when no buffer is passed to run).'''
+    def __init__(self, N, ops, qoff, qubits, goff, poff, pool_gs, pool_ps, slots, M):
+        self.N = N
+        self.ops, self.qoff, self.qubits = ops, qoff, qubits
+        self.goff, self.poff = goff, poff
+        self.pool_gs, self.pool_ps = pool_gs, pool_ps
+        self.slots = slots
+        self.M = M
+        self.out = numpy.zeros(M, dtype=numpy.int_)
+
+    def __repr__(self):
+        return 'Tape({} instructions, {} records)'.format(len(self), self.M)
+
+    def __len__(self):
+        return self.ops.shape[0]
+
+    def run(self, obj, out=None, rng=None):
+        '''Run the tape on a stabilizer state. (inplace update)
+
+        Input:
+        obj: StabilizerState - the state to be evolved
+        out: int (M) - measurement record buffer (default: self.out)
+        rng: random stream or seed of measurements (see utils.rng_stream)
+
+        Output:
+        obj: StabilizerState - the state after the tape is run
+        log2prob: real - log2 probability of measurements and postselections'''
+        if not isinstance(obj, StabilizerState):
+            raise NotImplementedError("the object {} is not a stabilizer state".format(repr(obj)))
+        if obj.N != self.N:
+            raise ValueError("tape on {} qubits can not run on a state of {} qubits.".format(self.N, obj.N))
+        out = self.out if out is None else out
+        gs, ps, obj.r, log2prob = tape_run(obj.gs, obj.ps, obj.r, self.ops, 
+            self.qoff, self.qubits, self.goff, self.poff, self.pool_gs, 
+            self.pool_ps, self.slots, out, rng_stream(rng))
+        obj.gs, obj.ps = gs, ps
+        return obj, log2prob
+
 # ---- gate constructors ----
 def clifford_rotation_gate(generator, qubits=None):
     '''Construct a Clifford rotation gate generted by a generator.
@@ -628,63 +845,23 @@ def Z(*qubits):
     gate.set_forward_map(f_map)
     return gate
 
+# single qubit Clifford gates C(0), ..., C(23), as (gs, ps) of forward maps
+C_MAPS = [
+    ([[1,0],[1,1]], [0,0]), ([[1,0],[1,1]], [0,2]), ([[1,0],[0,1]], [0,0]), ([[1,0],[0,1]], [0,2]),
+    ([[1,0],[1,1]], [2,0]), ([[1,0],[1,1]], [2,2]), ([[1,0],[0,1]], [2,0]), ([[1,0],[0,1]], [2,2]),
+    ([[1,1],[1,0]], [0,0]), ([[1,1],[1,0]], [0,2]), ([[1,1],[0,1]], [0,0]), ([[1,1],[0,1]], [0,2]),
+    ([[1,1],[1,0]], [2,0]), ([[1,1],[1,0]], [2,2]), ([[1,1],[0,1]], [2,0]), ([[1,1],[0,1]], [2,2]),
+    ([[0,1],[1,0]], [0,0]), ([[0,1],[1,0]], [0,2]), ([[0,1],[1,1]], [0,0]), ([[0,1],[1,1]], [0,2]),
+    ([[0,1],[1,0]], [2,0]), ([[0,1],[1,0]], [2,2]), ([[0,1],[1,1]], [2,0]), ([[0,1],[1,1]], [2,2])]
+
 def C(num, *qubits):
     # single qubit Clifford gate, num: 0-23
     if len(qubits)!=1:
         raise ValueError("Single qubit Clifford gate acts on single qubit.")
-    gate = CliffordGate(*qubits)
-    if num == 0:
-        f_map = CliffordMap(gs = numpy.array([[1,0],[1,1]]),ps = numpy.array([0,0]))
-    elif num == 1:
-        f_map = CliffordMap(gs = numpy.array([[1,0],[1,1]]),ps = numpy.array([0,2]))
-    elif num == 2:
-        f_map = CliffordMap(gs = numpy.array([[1,0],[0,1]]),ps = numpy.array([0,0]))
-    elif num == 3:
-        f_map = CliffordMap(gs = numpy.array([[1,0],[0,1]]),ps = numpy.array([0,2]))
-    elif num == 4:
-        f_map = CliffordMap(gs = numpy.array([[1,0],[1,1]]),ps = numpy.array([2,0]))
-    elif num == 5:
-        f_map = CliffordMap(gs = numpy.array([[1,0],[1,1]]),ps = numpy.array([2,2]))
-    elif num == 6:
-        f_map = CliffordMap(gs = numpy.array([[1,0],[0,1]]),ps = numpy.array([0,2]))
-    elif num == 7:
-        f_map = CliffordMap(gs = numpy.array([[1,0],[0,1]]),ps = numpy.array([2,2]))
-    elif num == 8:
-        f_map = CliffordMap(gs = numpy.array([[1,1],[1,0]]),ps = numpy.array([0,0]))
-    elif num == 9:
-        f_map = CliffordMap(gs = numpy.array([[1,1],[1,0]]),ps = numpy.array([0,2]))
-    elif num == 10:
-        f_map = CliffordMap(gs = numpy.array([[1,1],[0,1]]),ps = numpy.array([0,0]))
-    elif num == 11:
-        f_map = CliffordMap(gs = numpy.array([[1,1],[0,1]]),ps = numpy.array([0,2]))
-    elif num == 12:
-        f_map = CliffordMap(gs = numpy.array([[1,1],[1,0]]),ps = numpy.array([2,0]))
-    elif num == 13:
-        f_map = CliffordMap(gs = numpy.array([[1,1],[1,0]]),ps = numpy.array([2,2]))
-    elif num == 14:
-        f_map = CliffordMap(gs = numpy.array([[1,1],[0,1]]),ps = numpy.array([2,0]))
-    elif num == 15:
-        f_map = CliffordMap(gs = numpy.array([[1,1],[0,1]]),ps = numpy.array([2,2]))
-    elif num == 16:
-        f_map = CliffordMap(gs = numpy.array([[0,1],[1,0]]),ps = numpy.array([0,0]))
-    elif num == 17:
-        f_map = CliffordMap(gs = numpy.array([[0,1],[1,0]]),ps = numpy.array([0,2]))
-    elif num == 18:
-        f_map = CliffordMap(gs = numpy.array([[0,1],[1,1]]),ps = numpy.array([0,0]))
-    elif num == 19:
-        f_map = CliffordMap(gs = numpy.array([[0,1],[1,1]]),ps = numpy.array([0,2]))
-    elif num == 20:
-        f_map = CliffordMap(gs = numpy.array([[0,1],[1,0]]),ps = numpy.array([2,0]))
-    elif num == 21:
-        f_map = CliffordMap(gs = numpy.array([[0,1],[1,0]]),ps = numpy.array([2,2]))
-    elif num == 22:
-        f_map = CliffordMap(gs = numpy.array([[0,1],[1,1]]),ps = numpy.array([2,0]))
-    elif num == 23:
-        f_map = CliffordMap(gs = numpy.array([[0,1],[1,1]]),ps = numpy.array([2,2]))
-    else:
+    if not 0 <= num < 24:
         raise ValueError("There are only 24 single qubit Clifford gate. Input number exceed 0-23.")
-    gate.set_forward_map(f_map)
-    return gate
+    gs, ps = C_MAPS[num]
+    return CliffordGate(*qubits).set_index(clifford_group(1).index(gs, ps))
 
 # ---- two qubit gates ----
 def CNOT(*qubits):
@@ -776,7 +953,7 @@ def SBRG(hmdl, max_rate=2., tol=1.e-8):
             offdiag = htmp[~mask_commute]
             # eleminate offdiagonal terms by perturbation theory
             len_max = int(round(max_rate * len_anti)) # max perturbation terms to keep
-            prod = (offdiag @ offdiag).reduce(tol)[:len_max]
+            prod = offdiag.product(offdiag, tol, len_max)
             if len(prod) != 0:
                 htmp = diag + 0.5 * (htmp[leading].inverse() @ prod)
         # mask terms that has become trivial on the remaining qubits
@@ -1,7 +1,12 @@
 import numpy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from .utils import DTYPE, parallel, rng_stream, rng_integers, shadow_measure_local, shadow_expect_local
+from .paulialg import Pauli, PauliList, PauliPolynomial, paulis
+from .stabilizer import StabilizerStateBatch, random_clifford_map, clifford_group
 
 class ClassicalShadow(object):
-    def __init__(self, 
+    def __init__(self,
                  state,    # base state
                  circuit   # measurement circuit
                 ):
@@ -9,10 +14,23 @@ class ClassicalShadow(object):
         self.circuit = circuit
         assert self.state.N >= self.circuit.N
         self.N = self.state.N
-        
+
     def __repr__(self):
         return 'ClassicalShadow(\n{},\n{})'.format(self.state, self.circuit).replace('\n','\n  ')
 
+    @property
+    def local(self):
+        '''whether the circuit is a layer of random single-qubit gates on all
+        qubits (random Pauli measurements, see onsite_rcc)'''
+        ops = [op for layer in self.circuit.layers_forward() for op in layer.ops]
+        return (self.circuit.N == self.N and len(ops) == self.N
+            and all(op.unitary and op.n == 1 for op in ops)
+            and sorted(op.qubits[0] for op in ops) == list(range(self.N)))
+
+    def basis(self):
+        '''computational basis observables Z_i on the qubits of the circuit'''
+        return paulis(*({i: 'Z'} for i in range(self.circuit.N)), N=self.N)
+
     def snapshots(self, nsample):
         for _ in range(nsample):
             snapshot = self.state.copy()
@@ -24,3 +42,192 @@ class ClassicalShadow(object):
         #     snapshot = self.state.copy()
         #     snapshot.measure(povm)
         #     yield snapshot
+
+    def collect(self, nsample, seed=None, workers=1, chunk_size=4096, path=None, append=False):
+        '''Collect snapshots into a compact shadow dataset.
+
+        Parameters:
+        nsample: int - number of snapshots.
+        seed: int or numpy.random.SeedSequence - seed of the collection,
+            snapshots are collected in chunks, each drawing from an
+            independent stream spawned from the seed, such that the dataset
+            does not depend on the number of workers.
+        workers: int - number of processes to collect chunks in parallel.
+        chunk_size: int - number of snapshots per chunk.
+        path: str - if given, chunks are written to a shadow file as they are
+            collected (see storage.ShadowWriter), instead of kept in memory.
+        append: bool - append to an existing shadow file.
+
+        Returns:
+        shadow: PauliShadow for random Pauli measurements (see local),
+            CliffordShadow otherwise, or storage.ShadowFile if path is given.
+
+        Note: a unitary circuit is followed by an implicit measurement of the
+        computational basis on its qubits. Circuits with measurements collect
+        the snapshots of the forward-backward protocol (see snapshots).'''
+        seq = seed if isinstance(seed, numpy.random.SeedSequence) else numpy.random.SeedSequence(seed)
+        sizes = [min(chunk_size, nsample - k) for k in range(0, nsample, chunk_size)]
+        seqs = seq.spawn(len(sizes))
+        if workers > 1 and len(sizes) > 1:
+            # spawn workers, as the threading layers of numba are not fork-safe
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            chunks = pool.map(self.collect_chunk, sizes, seqs)
+        else:
+            pool = None
+            chunks = (self.collect_chunk(n, s) for n, s in zip(sizes, seqs))
+        try:
+            if path is not None: # stream chunks to file
+                from .storage import ShadowWriter, ShadowFile
+                with ShadowWriter(path, append=append) as writer:
+                    for chunk in chunks:
+                        writer.write(chunk)
+                return ShadowFile(path)
+            chunks = list(chunks)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        if self.local:
+            return PauliShadow(numpy.concatenate([c.bases for c in chunks]),
+                numpy.concatenate([c.outs for c in chunks]))
+        return CliffordShadow(StabilizerStateBatch(
+            numpy.concatenate([c.states.gs for c in chunks]),
+            numpy.concatenate([c.states.ps for c in chunks]),
+            numpy.concatenate([c.states.r for c in chunks])))
+
+    def collect_chunk(self, nsample, seq):
+        '''Collect a chunk of snapshots from the stream of a SeedSequence.'''
+        rng = rng_stream(seq) # random gates (or bases) and measurement outcomes
+        if self.local: # draw Pauli bases directly
+            bases = rng_integers(rng, 3, nsample*self.N).reshape((nsample, self.N)).astype(DTYPE)
+            outs = shadow_measure_local(self.state.gs, self.state.ps, self.state.r, bases, rng)
+            return PauliShadow(bases, outs)
+        gs = numpy.empty((nsample, 2*self.N, 2*self.N), dtype=DTYPE)
+        ps = numpy.empty((nsample, 2*self.N), dtype=DTYPE)
+        r = numpy.empty(nsample, dtype=numpy.int_)
+        for k in range(nsample):
+            self.circuit.reset()
+            for layer in self.circuit.layers_forward(): # fix random gates by rng
+                for op in layer.ops:
+                    if op.unitary and op.generator is None and op.forward_map is None and op.backward_map is None:
+                        if op.n <= 2:
+                            op.set_index(clifford_group(op.n).random(rng))
+                        else:
+                            op.forward_map = random_clifford_map(op.n, rng)
+            snapshot = self.state.copy()
+            if self.circuit.unitary:
+                obs, _ = self.circuit.backward(self.basis())
+                snapshot.measure(obs, rng)
+            else: # forward-backward protocol (see snapshots)
+                self.circuit.forward(snapshot, rng)
+                self.circuit.backward(snapshot)
+            gs[k], ps[k], r[k] = snapshot.gs, snapshot.ps, snapshot.r
+        return CliffordShadow(StabilizerStateBatch(gs, ps, r))
+
+def median_of_means(xs):
+    '''Median of the group means xs (G, ...) over groups.'''
+    return xs[0] if xs.shape[0] == 1 else numpy.median(xs, axis=0)
+
+class PauliShadow(object):
+    '''Classical shadow dataset of random Pauli measurements. Snapshot s is
+    the product state prod_i (1 + (-)^outs[s,i] P_i)/2 with P_i the Pauli
+    operator (X, Y, Z) indexed by bases[s,i] = (0, 1, 2).
+
+    Parameters:
+    bases: int (S, N) - basis index of each qubit in each snapshot.
+    outs: int (S, N) - outcome bits of each qubit in each snapshot.'''
+    def __init__(self, bases, outs):
+        self.bases = bases
+        self.outs = outs
+
+    def __repr__(self):
+        return 'PauliShadow(S={}, N={})'.format(len(self), self.N)
+
+    def __len__(self):
+        return self.bases.shape[0]
+
+    @property
+    def N(self):
+        return self.bases.shape[1]
+
+    def __getitem__(self, item): # select snapshots by slice or indices
+        return PauliShadow(self.bases[item], self.outs[item])
+
+    def expect(self, obs, z=3., groups=1):
+        '''Estimate expectation values of observables from the snapshots.
+
+        Parameters:
+        obs: Pauli, PauliList or PauliPolynomial
+        z: fugacity of operator weight (see StabilizerState.expect), the
+            default z = 3 inverts the measurement channel of Pauli shadows.
+        groups: int - number of groups for median-of-means estimation.
+
+        Returns:
+        out: real for Pauli and PauliPolynomial, real (L) for PauliList.'''
+        if isinstance(obs, Pauli):
+            return self.expect(obs.as_polynomial(), z, groups)
+        elif isinstance(obs, PauliList):
+            if not 1 <= groups <= len(self):
+                raise ValueError('number of groups must be between 1 and the number of snapshots.')
+            xs = parallel(shadow_expect_local, obs.L)(self.bases, self.outs,
+                obs.gs, obs.ps, groups)
+            if z != 1.:
+                xs = xs * z ** obs.weight()
+            if isinstance(obs, PauliPolynomial):
+                xs = numpy.sum(obs.cs * xs, -1)
+            return median_of_means(xs)
+        else:
+            raise ValueError("Unsupported observable type: {}".format(type(obs)))
+
+class CliffordShadow(object):
+    '''Classical shadow dataset of generic random Clifford measurements,
+    holding the snapshot states as a batch.
+
+    Parameters:
+    states: StabilizerStateBatch - snapshot states.'''
+    def __init__(self, states):
+        self.states = states
+
+    def __repr__(self):
+        return 'CliffordShadow(S={}, N={})'.format(len(self), self.N)
+
+    def __len__(self):
+        return self.states.B
+
+    @property
+    def N(self):
+        return self.states.N
+
+    def __getitem__(self, item): # select snapshots by slice or indices
+        return CliffordShadow(self.states[item])
+
+    def expect(self, obs, z=1., groups=1, batch_size=1024):
+        '''Estimate expectation values of observables from the snapshots.
+        (for global Clifford measurements, the inverse measurement channel
+        multiplies the estimate of a non-identity Pauli operator by 2^N+1)
+
+        Parameters:
+        obs: Pauli, PauliList or PauliPolynomial
+        z: fugacity of operator weight (see StabilizerState.expect)
+        groups: int - number of groups for median-of-means estimation.
+        batch_size: int - number of snapshots evaluated at a time.
+
+        Returns:
+        out: real for Pauli and PauliPolynomial, real (L) for PauliList.'''
+        if isinstance(obs, Pauli):
+            return self.expect(obs.as_polynomial(), z, groups, batch_size)
+        elif isinstance(obs, PauliList):
+            S = len(self)
+            if not 1 <= groups <= S:
+                raise ValueError('number of groups must be between 1 and the number of snapshots.')
+            obs_list = PauliList(obs.gs, obs.ps)
+            label = numpy.arange(S) * groups // S
+            xs = numpy.zeros((groups, obs.L))
+            for k in range(0, S, batch_size):
+                numpy.add.at(xs, label[k:k+batch_size],
+                    self.states[k:k+batch_size].expect(obs_list, z))
+            xs /= numpy.bincount(label, minlength=groups)[:, None]
+            if isinstance(obs, PauliPolynomial):
+                xs = numpy.sum(obs.cs * xs, -1)
+            return median_of_means(xs)
+        else:
+            raise ValueError("Unsupported observable type: {}".format(type(obs)))
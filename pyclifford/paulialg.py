@@ -1,8 +1,18 @@
 import numpy
 from .utils import (
-    ipow, pauli_tokenize, 
+    DTYPE, ipow, pauli_tokenize, 
     clifford_rotate, pauli_transform,
-    batch_dot, aggregate)
+    batch_dot, aggregate, pack_bits, unpack_bits, parallel, pauli_unique_packed,
+    pauli_product_packed, pauli_apply, pauli_expect_dense,
+    clifford_rotate_packed, pauli_transform_packed, pauli_transform_packed_local,
+    TABLE_MAX_QUBITS, pauli_transform_table, pauli_transform_packed_table)
+
+def _as_columns(vector, N):
+    '''cast a state vector (2^N) or a batch of vectors (2^N, B) to columns'''
+    vs = numpy.asarray(vector, dtype=numpy.complex128)
+    if vs.ndim not in (1, 2) or vs.shape[0] != 2**N:
+        raise ValueError('state vector of shape {} does not match {} qubits.'.format(vs.shape, N))
+    return vs.reshape(2**N, -1)
 
 class Pauli(object):
     '''Represents a Pauli operator.
@@ -117,7 +127,7 @@ class Pauli(object):
     def as_list(self):
         '''cast a Pauli operator to a Pauli list'''
         gs = numpy.expand_dims(self.g, 0)
-        ps = numpy.array([self.p], dtype=numpy.int_)
+        ps = numpy.array([self.p], dtype=DTYPE)
         return PauliList(gs, ps)
 
     def rotate_by(self, generator, mask=None):
@@ -132,9 +142,19 @@ class Pauli(object):
         self.p = result.ps[0]
         return self
 
+    def apply_to(self, vector):
+        '''apply the Pauli operator to a state vector (or a batch of state 
+        vectors as columns), the same as self.to_numpy() @ vector'''
+        return self.as_polynomial().apply_to(vector)
+
+    def expectation_dense(self, vector):
+        '''expectation value on a state vector (or a batch of state vectors 
+        as columns), the same as vector.conj() @ self.to_numpy() @ vector'''
+        return self.as_polynomial().expectation_dense(vector)
+
     def tokenize(self):
         gs = numpy.expand_dims(self.g, 0)
-        ps = numpy.array([self.p])
+        ps = numpy.array([self.p], dtype=DTYPE)
         return pauli_tokenize(gs, ps)
 
     def to_numpy(self):
@@ -176,10 +196,17 @@ class PauliList(object):
 
     Parameters:
     gs: int (L, 2*N) - array of Pauli strings in binary repr.
-    ps: int (L) - array of phase indicators (i powers).'''
+    ps: int (L) - array of phase indicators (i powers).
+
+    Storage:
+    By default, Pauli strings are stored in gs directly. After pack(), they 
+    are stored in bit-packed form (xs, zs: uint64 (L, ceil(N/64))) instead, 
+    and gs is unpacked on access (read-only view, assign to gs to modify).'''
     def __init__(self, gs, ps=None, **kwargs):
-        self.gs = gs
-        self.ps = numpy.zeros(self.L, dtype=numpy.int_) if ps is None else ps
+        self.xs = None # packed x bits (if packed)
+        self.zs = None # packed z bits (if packed)
+        self._gs = gs
+        self.ps = numpy.zeros(self.L, dtype=DTYPE) if ps is None else ps
         # kwargs ignored, in case subclass-specific arguments passed up
 
     def __repr__(self):
@@ -188,13 +215,55 @@ class PauliList(object):
     def __len__(self):
         return self.L
 
+    @property
+    def packed(self):
+        return self.xs is not None
+
+    @property
+    def gs(self):
+        if self.packed:
+            return unpack_bits(self.xs, self.zs, self._N)
+        return self._gs
+
+    @gs.setter
+    def gs(self, gs):
+        if self.packed:
+            self.xs, self.zs = pack_bits(gs)
+            self._N = gs.shape[1]//2
+        else:
+            self._gs = gs
+
     @property
     def L(self):
-        return self.gs.shape[0]
+        if self.packed:
+            return self.xs.shape[0]
+        return self._gs.shape[0]
 
     @property
     def N(self):
-        return self.gs.shape[1]//2
+        if self.packed:
+            return self._N
+        return self._gs.shape[1]//2
+
+    def set_packed(self, xs, zs, N):
+        '''set Pauli strings in bit-packed storage'''
+        self.xs, self.zs, self._N = xs, zs, N
+        self._gs = None
+        return self
+
+    def pack(self):
+        '''switch to bit-packed storage (in-place)'''
+        if not self.packed:
+            xs, zs = pack_bits(self._gs)
+            self.set_packed(xs, zs, self.N)
+        return self
+
+    def unpack(self):
+        '''switch to unpacked storage (in-place)'''
+        if self.packed:
+            self._gs = self.gs
+            self.xs, self.zs = None, None
+        return self
     
     def expand(self, N):
         if N is not None and N > self.N:
@@ -203,7 +272,13 @@ class PauliList(object):
 
     def __getitem__(self, item):
         if isinstance(item, (int, numpy.integer)):
+            if self.packed: # only unpack the requested string
+                g = unpack_bits(self.xs[[item]], self.zs[[item]], self.N)[0]
+                return Pauli(g, self.ps[item])
             return Pauli(self.gs[item], self.ps[item])
+        if self.packed:
+            return PauliList(None, self.ps[item]).set_packed(
+                self.xs[item], self.zs[item], self.N)
         return PauliList(self.gs[item], self.ps[item])
 
     def __neg__(self):
@@ -231,6 +306,9 @@ class PauliList(object):
         return numpy.sum(numpy.sum(self.gs.reshape(self.L, self.N, 2), -1) != 0, -1)
 
     def copy(self):
+        if self.packed:
+            return PauliList(None, self.ps.copy()).set_packed(
+                self.xs.copy(), self.zs.copy(), self.N)
         return PauliList(self.gs.copy(), self.ps.copy())
 
     def as_polynomial(self):
@@ -238,7 +316,14 @@ class PauliList(object):
 
     def rotate_by(self, generator, mask=None):
         # perform Clifford rotation by Pauli generator (in-place)
-        if mask is None:
+        if self.packed:
+            g = generator.g
+            if mask is not None: # embed generator to the full system
+                g = numpy.zeros(2*self.N, dtype=g.dtype)
+                g[numpy.repeat(mask, 2)] = generator.g
+            gx, gz = pack_bits(numpy.expand_dims(g, 0))
+            clifford_rotate_packed(gx[0], gz[0], generator.p, self.xs, self.zs, self.ps)
+        elif mask is None:
             clifford_rotate(generator.g, generator.p, self.gs, self.ps)
         else:
             mask2 = numpy.repeat(mask,  2)
@@ -248,21 +333,72 @@ class PauliList(object):
 
     def transform_by(self, clifford_map, mask=None):
         # perform Clifford transformation by Clifford map (in-place)
-        if mask is None:
-            self.gs, self.ps = pauli_transform(self.gs, self.ps, 
+        if self.packed:
+            if mask is None:
+                if clifford_map.packed:
+                    xs_map, zs_map = clifford_map.xs, clifford_map.zs
+                else:
+                    xs_map, zs_map = pack_bits(clifford_map.gs)
+                self.xs, self.zs, self.ps = parallel(pauli_transform_packed, self.L)(
+                    self.xs, self.zs, self.ps, xs_map, zs_map, clifford_map.ps)
+            elif clifford_map.N <= TABLE_MAX_QUBITS:
+                table_gs, table_ps = clifford_map.table
+                parallel(pauli_transform_packed_table, self.L)(self.xs, self.zs, 
+                    self.ps, numpy.flatnonzero(mask), table_gs, table_ps)
+            else:
+                qubits = numpy.flatnonzero(mask)
+                pauli_transform_packed_local(self.xs, self.zs, self.ps, qubits,
+                    clifford_map.gs, clifford_map.ps)
+        elif mask is None:
+            self.gs, self.ps = parallel(pauli_transform, self.L)(self.gs, self.ps, 
                 clifford_map.gs, clifford_map.ps)
+        elif clifford_map.N <= TABLE_MAX_QUBITS:
+            # small local map: update the local columns by table lookup
+            table_gs, table_ps = clifford_map.table
+            parallel(pauli_transform_table, self.L)(self.gs, self.ps, 
+                numpy.flatnonzero(mask), table_gs, table_ps)
         else:
             # print("mask: ",mask)
             mask2 = numpy.repeat(mask, 2)
             # print("shape of mask2:",self.gs[:,mask2].shape)
             # print("shape of gs: ",clifford_map.gs.shape)
             # print("shape of ps: ",clifford_map.ps.shape)
-            self.gs[:,mask2], self.ps = pauli_transform(
+            self.gs[:,mask2], self.ps = parallel(pauli_transform, self.L)(
                 self.gs[:,mask2], self.ps, clifford_map.gs, clifford_map.ps)
         return self
 
     def tokenize(self):
-        return pauli_tokenize(self.gs, self.ps)
+        return parallel(pauli_tokenize, self.L)(self.gs, self.ps)
+
+    def apply_to(self, vector):
+        '''Apply each Pauli operator to a state vector (matrix-free).
+
+        Parameters:
+        vector: complex (2^N) or (2^N, B) - a state vector, or a batch of 
+            state vectors as columns.
+
+        Returns:
+        complex (L, 2^N) or (L, 2^N, B) - the same as self.to_numpy() @ vector.'''
+        vs = _as_columns(vector, self.N)
+        gs = self.gs
+        cs = numpy.ones(1, dtype=numpy.complex128)
+        ws = numpy.empty((self.L,) + vs.shape, dtype=numpy.complex128)
+        for j in range(self.L):
+            ws[j] = parallel(pauli_apply, vs.shape[0])(gs[j:j+1], self.ps[j:j+1], cs, vs)
+        return ws.reshape((self.L,) + numpy.shape(vector))
+
+    def expectation_dense(self, vector):
+        '''Expectation values of Pauli operators on a state vector (matrix-free).
+
+        Parameters:
+        vector: complex (2^N) or (2^N, B) - a state vector, or a batch of 
+            state vectors as columns.
+
+        Returns:
+        complex (L) or (L, B) - <vector|sigma|vector> for each operator.'''
+        vs = _as_columns(vector, self.N)
+        es = parallel(pauli_expect_dense, self.L)(self.gs, self.ps, vs)
+        return es.reshape((self.L,) + numpy.shape(vector)[1:])
 
     def to_numpy(self):
         """Convert list of Pauli operators to numpy array representations in batch.
@@ -380,7 +516,7 @@ class PauliMonomial(Pauli):
     def as_polynomial(self):
         '''cast the Pauli monomial to a single-term Pauli polynomial'''
         gs = numpy.expand_dims(self.g, 0)
-        ps = numpy.array([self.p], dtype=numpy.int_)
+        ps = numpy.array([self.p], dtype=DTYPE)
         cs = numpy.array([self.c], dtype=numpy.complex128)
         return PauliPolynomial(gs, ps).set_cs(cs)
 
@@ -458,9 +594,62 @@ class PauliPolynomial(PauliList):
             N = max(self.N, other.N)
             self.expand(N)
             other.expand(N)
-        gs, ps, cs = batch_dot(self.gs, self.ps, self.cs, other.gs, other.ps, other.cs)
+        gs, ps, cs = parallel(batch_dot, self.L)(self.gs, self.ps, self.cs, 
+            other.gs, other.ps, other.cs)
         return PauliPolynomial(gs, ps).set_cs(cs)
 
+    def product(self, other, tol=1.e-10, max_terms=None):
+        '''Product of Pauli polynomials (self @ other) with like terms combined.
+        Equivalent to (self @ other).reduce(tol), but without materializing 
+        all L1*L2 products.
+
+        Parameters:
+        other: Pauli, PauliMonomial or PauliPolynomial - right factor.
+        tol: real - terms with |coefficient| <= tol are dropped.
+        max_terms: int - if given, only the max_terms largest terms are kept.
+
+        Returns:
+        PauliPolynomial - product with terms in the order of first occurrence.'''
+        other = other.as_polynomial()
+        if self.N != other.N:
+            N = max(self.N, other.N)
+            self.expand(N)
+            other.expand(N)
+        xs1, zs1 = (self.xs, self.zs) if self.packed else pack_bits(self.gs)
+        xs2, zs2 = (other.xs, other.zs) if other.packed else pack_bits(other.gs)
+        k = -1 if max_terms is None else max_terms
+        xs, zs, cs = pauli_product_packed(xs1, zs1, self.ps, self.cs, 
+            xs2, zs2, other.ps, other.cs, tol, k)
+        return PauliPolynomial(unpack_bits(xs, zs, self.N)).set_cs(cs)
+
+    def apply_to(self, vector):
+        '''Apply the Pauli polynomial to a state vector in O(L 2^N) time and
+        O(2^N) memory, without building its matrix.
+
+        Parameters:
+        vector: complex (2^N) or (2^N, B) - a state vector, or a batch of 
+            state vectors as columns (qubit 0 as the most significant bit).
+
+        Returns:
+        complex (2^N) or (2^N, B) - the same as self.to_numpy() @ vector.'''
+        vs = _as_columns(vector, self.N)
+        ws = parallel(pauli_apply, vs.shape[0])(self.gs, self.ps, self.cs, vs)
+        return ws.reshape(numpy.shape(vector))
+
+    def expectation_dense(self, vector):
+        '''Expectation value of the Pauli polynomial on a state vector in 
+        O(L 2^N) time and O(2^N) memory, without building its matrix.
+
+        Parameters:
+        vector: complex (2^N) or (2^N, B) - a state vector, or a batch of 
+            state vectors as columns (qubit 0 as the most significant bit).
+
+        Returns:
+        complex or complex (B) - <vector|self|vector>.'''
+        vs = _as_columns(vector, self.N)
+        es = parallel(pauli_expect_dense, self.L)(self.gs, self.ps, vs)
+        return self.cs.dot(es).reshape(numpy.shape(vector)[1:])[()]
+
     def set_cs(self, cs):
         '''set coefficients'''
         self.cs = cs
@@ -479,11 +668,26 @@ class PauliPolynomial(PauliList):
         '''Reduce the Pauli polynomial by 
             1. combine simiilar terms,
             2. move phase factors to coefficients,
-            3. drop terms that are too small (coefficient < tol).'''
-        gs, inds = numpy.unique(self.gs, return_inverse=True, axis=0)
-        cs = aggregate(self.cs * 1j**self.ps, inds, gs.shape[0])
+            3. drop terms that are too small (coefficient < tol).
+        Terms are sorted in lexicographic order of their Pauli strings.'''
+        if self.packed:
+            xs, zs = self.xs, self.zs
+        else:
+            xs, zs = pack_bits(self.gs)
+        first, inds = pauli_unique_packed(xs, zs)
+        # sort the unique strings once (as numpy.unique would order them)
+        gs = unpack_bits(xs[first], zs[first], self.N) if self.packed else self.gs[first]
+        order = numpy.lexsort(gs.T[::-1])
+        rank = numpy.empty_like(order)
+        rank[order] = numpy.arange(order.shape[0])
+        first, inds = first[order], rank[inds]
+        cs = aggregate(self.cs * 1j**self.ps, inds, first.shape[0])
         mask = (numpy.abs(cs) > tol)
-        return PauliPolynomial(gs[mask]).set_cs(cs[mask])
+        first = first[mask]
+        if self.packed:
+            return PauliPolynomial(None, numpy.zeros(first.shape[0], dtype=DTYPE)).set_packed(
+                xs[first], zs[first], self.N).set_cs(cs[mask])
+        return PauliPolynomial(self.gs[first]).set_cs(cs[mask])
 
     def to_numpy(self):
         """Convert Pauli polynomial to numpy array representation.
@@ -493,6 +697,117 @@ class PauliPolynomial(PauliList):
         # Contract batch dimension with coefficients to get final matrix
         return numpy.tensordot(self.cs, matrices, axes=(0,0))
 
+class PauliPolynomialBuilder(object):
+    '''Accumulate the terms of a Pauli polynomial.
+
+    Terms are appended to preallocated buffers (grown by doubling), and like
+    terms are only combined when build() is called, instead of at every 
+    addition as in PauliPolynomial.__add__.
+
+    Parameters:
+    N: int - number of qubits (grows to fit the terms if needed).
+    capacity: int - initial number of terms the buffers can hold.
+    max_terms: int - if given, like terms are combined (compact) whenever the
+        buffers exceed max_terms, to bound memory usage. (If many terms are
+        unique, the threshold is raised to twice the compacted size.)
+
+    Example:
+    >>> builder = PauliPolynomialBuilder()
+    >>> for c, s in terms:
+    ...     builder.add(pauli(s), c)
+    >>> h = builder.build()'''
+    def __init__(self, N=0, capacity=1024, max_terms=None):
+        self.gs = numpy.zeros((max(capacity, 1), 2*N), dtype=DTYPE)
+        self.ps = numpy.zeros(max(capacity, 1), dtype=DTYPE)
+        self.cs = numpy.zeros(max(capacity, 1), dtype=numpy.complex128)
+        self.L = 0 # number of terms in buffers
+        self.max_terms = max_terms
+        self.limit = max_terms # compaction threshold
+
+    def __repr__(self):
+        return 'PauliPolynomialBuilder(L={}, N={})'.format(self.L, self.N)
+
+    def __len__(self):
+        return self.L
+
+    @property
+    def N(self):
+        return self.gs.shape[1]//2
+
+    def reserve(self, L, N=0):
+        '''make room for L terms on N qubits in total'''
+        capacity = self.gs.shape[0]
+        if L > capacity or N > self.N:
+            while capacity < L:
+                capacity *= 2
+            gs = numpy.zeros((capacity, 2*max(N, self.N)), dtype=DTYPE)
+            ps = numpy.zeros(capacity, dtype=DTYPE)
+            cs = numpy.zeros(capacity, dtype=numpy.complex128)
+            gs[:self.L, :2*self.N] = self.gs[:self.L]
+            ps[:self.L] = self.ps[:self.L]
+            cs[:self.L] = self.cs[:self.L]
+            self.gs, self.ps, self.cs = gs, ps, cs
+        return self
+
+    def extend(self, gs, ps=None, cs=None):
+        '''Add terms in bulk.
+
+        Parameters:
+        gs: int (L, 2*N) - Pauli strings in binary representation.
+        ps: int (L) - phase indicators (default 0).
+        cs: complex (L) - coefficients (default 1).'''
+        L = gs.shape[0]
+        self.reserve(self.L + L, gs.shape[1]//2)
+        self.gs[self.L:self.L+L, :gs.shape[1]] = gs
+        self.gs[self.L:self.L+L, gs.shape[1]:] = 0
+        self.ps[self.L:self.L+L] = 0 if ps is None else ps
+        self.cs[self.L:self.L+L] = 1. if cs is None else cs
+        self.L += L
+        if self.limit is not None and self.L > self.limit:
+            self.compact()
+        return self
+
+    def add(self, obj, c=1.):
+        '''Add a term (or terms) c * obj.
+
+        Parameters:
+        obj: Pauli, PauliMonomial, PauliList, PauliPolynomial, or any 
+            description of a Pauli operator accepted by pauli().
+        c: complex - coefficient.'''
+        if isinstance(obj, PauliPolynomial):
+            return self.extend(obj.gs, obj.ps, c * obj.cs)
+        elif isinstance(obj, PauliList):
+            return self.extend(obj.gs, obj.ps, c)
+        obj = pauli(obj)
+        if isinstance(obj, PauliMonomial):
+            c = c * obj.c
+        if self.L == self.gs.shape[0] or obj.N > self.N:
+            self.reserve(self.L + 1, obj.N)
+        self.gs[self.L, :2*obj.N] = obj.g
+        self.gs[self.L, 2*obj.N:] = 0
+        self.ps[self.L] = obj.p
+        self.cs[self.L] = c
+        self.L += 1
+        if self.limit is not None and self.L > self.limit:
+            self.compact()
+        return self
+
+    def compact(self, tol=0.):
+        '''combine like terms in buffers (in-place)'''
+        poly = self.build(tol)
+        self.L = poly.L
+        self.gs[:self.L] = poly.gs
+        self.ps[:self.L] = 0 # phases moved to coefficients
+        self.cs[:self.L] = poly.cs
+        if self.max_terms is not None:
+            self.limit = max(self.max_terms, 2*self.L)
+        return self
+
+    def build(self, tol=1.e-10):
+        '''Combine like terms and return the Pauli polynomial.'''
+        L = self.L
+        return PauliPolynomial(self.gs[:L], self.ps[:L]).set_cs(self.cs[:L]).reduce(tol)
+
 # ---- constructors ----
 def pauli(obj, N = None):
     if isinstance(obj, Pauli):
@@ -508,7 +823,7 @@ def pauli(obj, N = None):
         return pauli(list(obj))
     else:
         raise TypeError('pauli(obj) recieves obj of type {}, which is not implemented.'.format(type(obj).__name__))
-    g = numpy.zeros(2*N, dtype=numpy.int_)
+    g = numpy.zeros(2*N, dtype=DTYPE)
     h = 0
     p = 0
     for i, mu in inds:
@@ -559,12 +874,12 @@ def paulis(*objs, N = None):
     for obj in objs:
         obj.expand(N)
     gs = numpy.stack([obj.g for obj in objs])
-    ps = numpy.array([obj.p for obj in objs])
+    ps = numpy.array([obj.p for obj in objs], dtype=DTYPE)
     return PauliList(gs, ps)
 
 def pauli_identity(N):
     '''Pauli polynomial of an idenity operator of N qubits.'''
-    return PauliPolynomial(numpy.zeros((1,2*N), dtype=numpy.int_))
+    return PauliPolynomial(numpy.zeros((1,2*N), dtype=DTYPE))
 
 def pauli_zero(N):
     '''Pauli polynomial of zero operator of N qubit'''
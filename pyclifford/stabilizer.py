@@ -1,10 +1,16 @@
 import numpy
 from numba import njit
 from .utils import (
-    acq_mat, ps0, z2inv, pauli_combine, pauli_transform, binary_repr,
+    DTYPE, acq_mat, ps0, z2inv, pauli_combine, pauli_transform, binary_repr,
     random_pauli, random_clifford, map_to_state, state_to_map, clifford_rotate,
     stabilizer_measure, stabilizer_postselect, stabilizer_project, stabilizer_expect, 
-    stabilizer_entropy, mask)
+    stabilizer_entropy, mask, parallel, pack_bits, acq_mat_packed,
+    stabilizer_measure_packed, stabilizer_postselect_packed, stabilizer_expect_packed,
+    stabilizer_index_packed, stabilizer_expect_indexed,
+    stabilizer_measure_batch, stabilizer_postselect_batch, stabilizer_expect_batch,
+    stabilizer_entropy_batch, stabilizer_statevector, pauli_group_gray,
+    stabilizer_entropy_profile, stabilizer_entropy_profile_batch,
+    rng_bit, rng_bits, rng_integer, rng_stream, rng_streams)
 from .paulialg import Pauli, PauliList, PauliPolynomial, pauli, paulis
 
 class CliffordMap(PauliList):
@@ -21,8 +27,15 @@ class CliffordMap(PauliList):
 
     Parameters:
     gs: int (2*N, 2*N) - strings of Pauli operators to be mapped to.
-    ps: int (2*N) - phase indicators of Pauli operators to be mapped to.'''
+    ps: int (2*N) - phase indicators of Pauli operators to be mapped to.
+
+    Lookup table:
+    A map on a few qubits is applied to subsystems by looking up the images
+    of all 4^N local Pauli strings, which are tabulated on first use and 
+    cached. In-place modification of gs or ps entries must be followed by 
+    reset_table().'''
     def __init__(self, *args, **kwargs):
+        self._table = None # cached lookup table
         # call superclass PauliList to handle arguments
         super(CliffordMap, self).__init__(*args, **kwargs)
 
@@ -38,6 +51,42 @@ class CliffordMap(PauliList):
             lns2 = [dis.format(xz[i%2], i//2, pauli) for i, pauli in zip(range(self.L-10, self.L), self[-10:])]
             return 'CliffordMap(\n{}\n   ...\n{})'.format('\n'.join(lns1),'\n'.join(lns2)).replace('\n','\n  ')
     
+    @PauliList.gs.setter
+    def gs(self, gs):
+        PauliList.gs.fset(self, gs)
+        self._table = None
+
+    def set_packed(self, xs, zs, N):
+        self._table = None
+        return super().set_packed(xs, zs, N)
+
+    def reset_table(self):
+        '''invalidate the cached lookup table'''
+        self._table = None
+        return self
+
+    @property
+    def table(self):
+        '''Lookup table of the map (built on demand and cached).
+
+        Returns:
+        table_gs: int (4^N, 2*N) - image of the Pauli string whose bits are
+            the binary digits of k (most significant first), for each k.
+        table_ps: int (4^N) - phase indicator increments of the images.'''
+        if self._table is None:
+            gs = binary_repr(numpy.arange(4**self.N), 2*self.N).astype(DTYPE)
+            ps = numpy.zeros(4**self.N, dtype=DTYPE)
+            self._table = pauli_transform(gs, ps, self.gs, self.ps)
+        return self._table
+
+    def rotate_by(self, generator, mask=None):
+        self._table = None
+        return super().rotate_by(generator, mask=mask)
+
+    def transform_by(self, clifford_map, mask=None):
+        self._table = None
+        return super().transform_by(clifford_map, mask=mask)
+
     def expand(self, N):
         if N is not None and N > self.N:
             return identity_map(N).embed(self, mask(range(self.N), N))
@@ -45,34 +94,49 @@ class CliffordMap(PauliList):
             return self
     
     def copy(self):
+        if self.packed:
+            return CliffordMap(None, self.ps.copy()).set_packed(
+                self.xs.copy(), self.zs.copy(), self.N)
         return CliffordMap(self.gs.copy(), self.ps.copy())
 
     def to_state(self, r=0):
         '''Interprete the Clifford map as a stabilizer state, such that the
             state is generated by the map from the zero state.'''
+        if self.packed: # reorder packed rows directly
+            order = numpy.concatenate([numpy.arange(1, 2*self.N, 2), numpy.arange(0, 2*self.N, 2)])
+            return StabilizerState(None, self.ps[order], r=r).set_packed(
+                self.xs[order], self.zs[order], self.N)
         gs, ps = map_to_state(self.gs, self.ps)
         return StabilizerState(gs, ps, r=r)
 
     def embed(self, small_map, mask):
         '''Embed a smaller map acting on a subsystem specified by qubit indices.'''
         mask2 = numpy.repeat(mask, 2)
-        self.gs[numpy.ix_(mask2, mask2)] = small_map.gs
+        gs = self.gs # (unpacked copy if packed)
+        gs[numpy.ix_(mask2, mask2)] = small_map.gs
+        self.gs = gs
         self.ps[mask2] = small_map.ps
+        self._table = None
         return self
 
     def compose(self, other):
         '''Returns the composition of this map with the other map (this map
         will transform first in the forward transformation). This is equivalent
         to tranforming the Pauli operators in this map by the next map.'''
+        if self.packed:
+            return self.copy().transform_by(other)
         gs, ps = pauli_transform(self.gs, self.ps, other.gs, other.ps)
         return CliffordMap(gs, ps)
 
     def inverse(self):
         '''Returns the inverse of this Clifford map, (such that it composes with
         its inverse results in identity map).'''
-        gs_inv = z2inv(self.gs)
-        _, ps_mis = pauli_combine(gs_inv, self.gs, self.ps)
-        ps_inv = (- ps_mis - ps0(gs_inv))%4
+        gs = self.gs
+        gs_inv = z2inv(gs)
+        _, ps_mis = pauli_combine(gs_inv, gs, self.ps)
+        ps_inv = ((- ps_mis - ps0(gs_inv))%4).astype(self.ps.dtype)
+        if self.packed:
+            return CliffordMap(gs_inv, ps_inv).pack()
         return CliffordMap(gs_inv, ps_inv)
 
 class StabilizerState(PauliList):
@@ -92,11 +156,19 @@ class StabilizerState(PauliList):
     gs: int (2*N, 2*N) - strings of Pauli operators in the stabilizer tableau.
     ps: int (2*N) - phase indicators (should only be 0 or 2).
     r:  int  - number of logical qubits (log2 rank of density matrix)
-        (r can only be provided as a keyword argument)'''
+        (r can only be provided as a keyword argument)
+
+    Decomposition index:
+    After set_indexed(), expect() decomposes observables using the symplectic
+    inverse of the tableau, which is cached and rebuilt after the tableau is 
+    updated (by measure, postselect, rotate_by, transform_by or assigning gs).
+    In-place modification of gs entries must be followed by reset_index().'''
     def __init__(self, *args, **kwargs):
         # extract r and remove it from kwargs, if present.
         # otherwise, set r = 0 as pure state by default.
         self.r = kwargs.pop('r', 0) 
+        self.indexed = False # use decomposition index in expect
+        self._index = None # cached decomposition index
         # call superclass PauliList to handle remaining arguments
         super().__init__(*args, **kwargs)
         
@@ -113,6 +185,50 @@ class StabilizerState(PauliList):
     def stabilizers(self):
         return self[self.r:self.N]
 
+    @PauliList.gs.setter
+    def gs(self, gs):
+        PauliList.gs.fset(self, gs)
+        self._index = None
+
+    def set_packed(self, xs, zs, N):
+        self._index = None
+        return super().set_packed(xs, zs, N)
+
+    def set_indexed(self, indexed=True):
+        '''enable (or disable) the decomposition index for expect'''
+        self.indexed = indexed
+        return self
+
+    def reset_index(self):
+        '''invalidate the cached decomposition index'''
+        self._index = None
+        return self
+
+    @property
+    def index(self):
+        '''Decomposition index (built on demand and cached).
+
+        Returns:
+        xs, zs: uint64 (2*N, W) - packed tableau.
+        ix, iz: uint64 (N, ceil(2*N/64)) - tableau rows that X_q, Z_q 
+            decompose into (see stabilizer_index_packed).'''
+        if self._index is None:
+            if self.packed:
+                xs, zs = self.xs, self.zs
+            else:
+                xs, zs = pack_bits(self.gs)
+            ix, iz = stabilizer_index_packed(xs, zs)
+            self._index = (xs, zs, ix, iz)
+        return self._index
+
+    def rotate_by(self, generator, mask=None):
+        self._index = None
+        return super().rotate_by(generator, mask=mask)
+
+    def transform_by(self, clifford_map, mask=None):
+        self._index = None
+        return super().transform_by(clifford_map, mask=mask)
+
     def expand(self, N):
         if N is not None and N > self.N:
             return stabilizer_state(self.stabilizers.expand(N))
@@ -120,14 +236,24 @@ class StabilizerState(PauliList):
             return self
     
     def copy(self):
-        return StabilizerState(self.gs.copy(), self.ps.copy(), r=self.r)
+        if self.packed:
+            state = StabilizerState(None, self.ps.copy(), r=self.r).set_packed(
+                self.xs.copy(), self.zs.copy(), self.N)
+        else:
+            state = StabilizerState(self.gs.copy(), self.ps.copy(), r=self.r)
+        state.indexed = self.indexed # index is rebuilt, as packed kernels mutate its arrays
+        return state
 
     def to_map(self):
         '''Interprete the stabilizer state as its encoding Clifford map.'''
+        if self.packed: # reorder packed rows directly
+            order = numpy.stack([numpy.arange(self.N, 2*self.N), numpy.arange(self.N)], -1).flatten()
+            return CliffordMap(None, self.ps[order]).set_packed(
+                self.xs[order], self.zs[order], self.N)
         gs, ps = state_to_map(self.gs, self.ps)
         return CliffordMap(gs, ps)
 
-    def measure(self, obs):
+    def measure(self, obs, rng=None):
         '''Perform Pauli observable measurement on the stabilizer state.
            - sample measurement outcomes from:
                 p(out_k = 0|rho) = (1 + Tr(rho obs_k))/2
@@ -137,14 +263,21 @@ class StabilizerState(PauliList):
         
         Parameters:
         obs: PauliList or StabilizerState (only active stabilizers measured)
+        rng: random stream or seed of the outcomes (see utils.rng_stream).
 
         Returns:
         out: int (L) - array of measurement outcomes of corresponding observables.
         log2prob: real - log2 probability of sampling this set of outcomes.'''
         if isinstance(obs, StabilizerState):
             obs = obs.stabilizers
+        self._index = None
+        if self.packed:
+            xs_obs, zs_obs = pack_bits(obs.gs)
+            self.xs, self.zs, self.ps, self.r, out, log2prob = stabilizer_measure_packed(
+                self.xs, self.zs, self.ps, xs_obs, zs_obs, obs.ps, self.r, rng_stream(rng))
+            return out, log2prob
         self.gs, self.ps, self.r, out, log2prob = stabilizer_measure(
-            self.gs, self.ps, obs.gs, obs.ps, self.r)
+            self.gs, self.ps, obs.gs, obs.ps, self.r, rng_stream(rng))
         return out, log2prob
 
     def postselect(self, obs, out=None):
@@ -167,6 +300,12 @@ class StabilizerState(PauliList):
             obs_ps = obs.ps
         else: # encode target outcomes to operator phases
             obs_ps = (obs.ps + 2*out)%4 # modify operator phases
+        self._index = None
+        if self.packed:
+            xs_obs, zs_obs = pack_bits(obs.gs)
+            self.xs, self.zs, self.ps, self.r, log2prob = stabilizer_postselect_packed(
+                self.xs, self.zs, self.ps, xs_obs, zs_obs, obs_ps, self.r)
+            return log2prob
         self.gs, self.ps, self.r, log2prob = stabilizer_postselect(
             self.gs, self.ps, obs.gs, obs_ps, self.r)
         return log2prob
@@ -202,7 +341,18 @@ class StabilizerState(PauliList):
         # WARNING: PauliList instance must be placed after StabilizerState instance
         #          otherwise StabilizerState will be shadowed by PauliList as subclass
         elif isinstance(obs, PauliList):
-            xs = stabilizer_expect(self.gs, self.ps, obs.gs, obs.ps, self.r)
+            if self.indexed:
+                xs_obs, zs_obs = (obs.xs, obs.zs) if obs.packed else pack_bits(obs.gs)
+                xs_stb, zs_stb, ix, iz = self.index
+                xs = parallel(stabilizer_expect_indexed, obs.L)(xs_stb, zs_stb, 
+                    self.ps, ix, iz, xs_obs, zs_obs, obs.ps, self.r)
+            elif self.packed:
+                xs_obs, zs_obs = pack_bits(obs.gs)
+                xs = parallel(stabilizer_expect_packed, obs.L)(self.xs, self.zs, 
+                    self.ps, xs_obs, zs_obs, obs.ps, self.r)
+            else:
+                xs = parallel(stabilizer_expect, obs.L)(self.gs, self.ps, 
+                    obs.gs, obs.ps, self.r)
             if z != 1.: # if fugacity not 1, multiply by fugacity to the power of operator weight
                 zs = z ** obs.weight()
                 xs = xs * zs
@@ -256,8 +406,31 @@ class StabilizerState(PauliList):
         # Apply normalization factor
         return rho / (2**self.r)
 
+    def to_statevector(self, out=None):
+        '''Convert a pure stabilizer state to its state vector in O(N 2^N)
+        time, without building the density matrix.
+
+        Parameters:
+        out: complex (2^N) - buffer to write the state vector to, e.g. a 
+            numpy.memmap for large N (default: a new array).
+
+        Returns:
+        out: complex (2^N) - the state vector (qubit 0 as the most significant
+            bit), up to a global phase.'''
+        if self.r != 0:
+            raise ValueError('state vector is only defined for pure states, got r = {}.'.format(self.r))
+        if out is None:
+            out = numpy.empty(2**self.N, dtype=numpy.complex128)
+        elif out.shape != (2**self.N,) or out.dtype != numpy.complex128:
+            raise ValueError('output buffer must be complex128 of shape ({},).'.format(2**self.N))
+        stabilizer_statevector(self.gs[:self.N], self.ps[:self.N], 
+            out.view(numpy.ndarray))
+        return out
+
     def entropy(self, subsys):
-        '''Entanglement entropy of the stabilizer state in a given region.'''
+        '''Entanglement entropy of the stabilizer state in a given region.
+        (for mixed states, the von Neumann entropy of the reduced density 
+        matrix, as in entropy_profile)'''
         if isinstance(subsys, (tuple, list)):
             subsys = numpy.array(subsys)
         if len(subsys) == 0:
@@ -267,13 +440,30 @@ class StabilizerState(PauliList):
                 subsys = mask(subsys, self.N)
         return stabilizer_entropy(self.stabilizers.gs, subsys)
 
+    def entropy_profile(self, order=None):
+        '''Entanglement entropies of the regions formed by the first l qubits 
+        of a qubit order, for all l in a single pass.
+
+        Parameters:
+        order: int array - order of the qubits (default: 0, 1, ..., N-1),
+            may list a subset of the qubits.
+
+        Returns:
+        entropy: int (m+1) - entropy of region order[:l] for l = 0, ..., m, 
+            with m the length of the order. (for mixed states, the von 
+            Neumann entropy of the reduced density matrix, see 
+            utils.stabilizer_entropy_profile)'''
+        order, m = cut_order(order, self.N)
+        return stabilizer_entropy_profile(self.stabilizers.gs, order)[:m+1]
+
     def tokenize(self):
         return self.stabilizers.tokenize()
     
-    def sample(self, L):
-        '''Sample stabilizers from the stabilizer group.'''
-        C = numpy.random.randint(2, size=(L,self.N-self.r))
-        gs, ps = pauli_combine(C, self.gs[self.r:self.N], self.ps[self.r:self.N])
+    def sample(self, L, rng=None):
+        '''Sample stabilizers from the stabilizer group.
+        (rng: random stream or seed, see utils.rng_stream)'''
+        C = rng_bits(rng_stream(rng), L*(self.N-self.r)).reshape((L, self.N-self.r))
+        gs, ps = parallel(pauli_combine, L)(C, self.gs[self.r:self.N], self.ps[self.r:self.N])
         return PauliList(gs, ps)
 
 
@@ -285,13 +475,28 @@ class StabilizerState(PauliList):
         return self.expect(bit_state(self.N, out))
 
 
+    def group(self, chunk_size=1024):
+        '''Iterate over the 2^(N-r) elements of the stabilizer group in Gray 
+        code order, such that each element costs one Pauli product. Elements 
+        are generated lazily in chunks, memory is bounded by the chunk size.
+
+        Parameters:
+        chunk_size: int - number of elements per chunk.
+
+        Yields:
+        PauliList - the next (at most chunk_size) group elements.'''
+        gs, ps = self.gs[self.r:self.N], self.ps[self.r:self.N]
+        L = 2**(self.N - self.r)
+        for t0 in range(0, L, chunk_size):
+            yield PauliList(*pauli_group_gray(gs, ps, t0, min(chunk_size, L - t0)))
+
     # !!! this function has exponential complexity.
     @property
     def density_matrix(self):
         '''Expand stabilizer state as density matrix in PauliPolynomial representation.
         '''
-        C = binary_repr(numpy.arange(2**(self.N-self.r)))
-        gs, ps = pauli_combine(C, self.gs[self.r:self.N], self.ps[self.r:self.N])
+        gs, ps = pauli_group_gray(self.gs[self.r:self.N], self.ps[self.r:self.N], 
+            0, 2**(self.N-self.r))
         return PauliPolynomial(gs, ps) / 2**self.N
 
     def __neg__(self):
@@ -315,30 +520,279 @@ class StabilizerState(PauliList):
     def __matmul__(self, other):
         return self.density_matrix @ other
 
+def cut_order(order, N):
+    '''Complete a (partial) order of qubits to an order of all N qubits, by
+    appending the unlisted qubits in ascending order.
+
+    Returns:
+    order: int (N) - order of all qubits.
+    m: int - length of the given order.'''
+    if order is None:
+        return numpy.arange(N), N
+    order = numpy.asarray(order, dtype=numpy.int_)
+    listed = numpy.zeros(N, dtype=numpy.bool_)
+    if order.ndim != 1 or numpy.any((order < 0) | (order >= N)):
+        raise ValueError('qubit order must be a list of qubits in range({}).'.format(N))
+    listed[order] = True
+    if numpy.sum(listed) != order.shape[0]:
+        raise ValueError('qubit order must not repeat qubits.')
+    return numpy.concatenate([order, numpy.flatnonzero(~listed)]), order.shape[0]
+
+class StabilizerStateBatch(object):
+    '''Represents a batch of B stabilizer states on the same N qubits, e.g. 
+    the trajectories of a monitored circuit, with their tableaux stored 
+    contiguously. Measurements, postselections and gates are applied to all 
+    states in lockstep, while outcomes are sampled independently.
+
+    Parameters:
+    gs: int (B, 2*N, 2*N) - stabilizer tableaux (see StabilizerState).
+    ps: int (B, 2*N) - phase indicators of (de)stabilizers.
+    r: int (B) - number of logical qubits of each state.'''
+    def __init__(self, gs, ps=None, r=None):
+        self.gs = gs
+        self.ps = numpy.zeros(gs.shape[:2], dtype=DTYPE) if ps is None else ps
+        self.r = numpy.zeros(gs.shape[0], dtype=numpy.int_) if r is None else r
+
+    def __repr__(self):
+        return 'StabilizerStateBatch(B={}, N={})'.format(self.B, self.N)
+
+    def __len__(self):
+        return self.B
+
+    @property
+    def B(self):
+        return self.gs.shape[0]
+
+    @property
+    def N(self):
+        return self.gs.shape[-1]//2
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, numpy.integer)):
+            return StabilizerState(self.gs[item], self.ps[item], r=int(self.r[item]))
+        return StabilizerStateBatch(self.gs[item], self.ps[item], self.r[item])
+
+    def copy(self):
+        return StabilizerStateBatch(self.gs.copy(), self.ps.copy(), self.r.copy())
+
+    def rows(self):
+        '''view all tableau rows in the batch as a single PauliList'''
+        return PauliList(self.gs.reshape(-1, 2*self.N), self.ps.reshape(-1))
+
+    def rotate_by(self, generator, mask=None):
+        # perform Clifford rotation on all states (in-place)
+        rows = self.rows().rotate_by(generator, mask=mask)
+        self.gs = rows.gs.reshape(self.gs.shape)
+        self.ps = rows.ps.reshape(self.ps.shape)
+        return self
+
+    def transform_by(self, clifford_map, mask=None):
+        # perform Clifford transformation on all states (in-place)
+        rows = self.rows().transform_by(clifford_map, mask=mask)
+        self.gs = rows.gs.reshape(self.gs.shape)
+        self.ps = rows.ps.reshape(self.ps.shape)
+        return self
+
+    def measure(self, obs, rng=None):
+        '''Perform Pauli observable measurement on each state in the batch.
+        (in-place update, see StabilizerState.measure)
+
+        Parameters:
+        obs: PauliList or StabilizerState (only active stabilizers measured)
+        rng: random streams (B, 2) of the states, or a seed from which 
+            independent streams are spawned (see utils.rng_streams).
+
+        Returns:
+        out: int (B, L) - measurement outcomes of each state.
+        log2prob: real (B) - log2 probability of the outcomes of each state.'''
+        if isinstance(obs, StabilizerState):
+            obs = obs.stabilizers
+        self.gs, self.ps, self.r, out, log2prob = parallel(stabilizer_measure_batch, 
+            2*self.N*self.B)(self.gs, self.ps, obs.gs, obs.ps, self.r, rng_streams(rng, self.B))
+        return out, log2prob
+
+    def postselect(self, obs, out=None):
+        '''Postselect each state in the batch on a set of Pauli observables.
+        (in-place update, see StabilizerState.postselect)
+
+        Parameters:
+        obs: PauliList or StabilizerState (only active stabilizers postselected)
+        out: int (L) or (B, L) - target measurement outcomes (shared by all 
+            states, or for each state), default is None, meaning <obs_k> = +1.
+
+        Returns:
+        log2prob: real (B) - log2 probability for postselection to succeed.'''
+        if isinstance(obs, StabilizerState):
+            obs = obs.stabilizers
+        out = numpy.zeros((self.B, obs.L), dtype=numpy.int_) if out is None else out
+        obs_ps = numpy.broadcast_to((obs.ps + 2*out)%4, (self.B, obs.L))
+        self.gs, self.ps, self.r, log2prob = parallel(stabilizer_postselect_batch, 
+            2*self.N*self.B)(self.gs, self.ps, obs.gs, obs_ps, self.r)
+        return log2prob
+
+    def expect(self, obs, z=1.):
+        '''Evaluate expectation values of observables on each state.
+
+        Parameters:
+        obs: Pauli, PauliList or PauliPolynomial
+        z: fugacity of operator weight (see StabilizerState.expect)
+
+        Returns:
+        out: real (B) for Pauli and PauliPolynomial, int (B, L) for PauliList.'''
+        if isinstance(obs, Pauli):
+            return self.expect(obs.as_polynomial(), z)
+        elif isinstance(obs, PauliPolynomial):
+            xs = self.expect(PauliList(obs.gs, obs.ps), z)
+            return numpy.sum(obs.cs * xs, -1)
+        elif isinstance(obs, PauliList):
+            xs = parallel(stabilizer_expect_batch, obs.L*self.B)(
+                self.gs, self.ps, obs.gs, obs.ps, self.r)
+            if z != 1.:
+                xs = xs * z ** obs.weight()
+            return xs
+        else:
+            raise ValueError("Unsupported observable type: {}".format(type(obs)))
+
+    def entropy(self, subsys):
+        '''Entanglement entropy of each state in a given region.'''
+        if isinstance(subsys, (tuple, list)):
+            subsys = numpy.array(subsys)
+        if len(subsys) == 0:
+            return numpy.zeros(self.B, dtype=numpy.int_)
+        else:
+            if not isinstance(subsys[0], numpy.bool_):
+                subsys = mask(subsys, self.N)
+        return parallel(stabilizer_entropy_batch, self.B)(self.gs, self.r, subsys)
+
+    def entropy_profile(self, order=None):
+        '''Entanglement entropy profile of each state in the batch.
+        (see StabilizerState.entropy_profile)
+
+        Returns:
+        entropy: int (B, m+1) - entropy of region order[:l] of each state.'''
+        order, m = cut_order(order, self.N)
+        return parallel(stabilizer_entropy_profile_batch, self.B)(
+            self.gs, self.r, order)[:, :m+1]
+
+# ---- Clifford group tables ----
+class CliffordGroup(object):
+    '''Table of all Clifford maps on n qubits (n = 1, 2), i.e. 24 maps for 
+    n = 1 and 11520 maps for n = 2 (Clifford unitaries up to global phase).
+
+    Map k = s * 4^n + t has the symplectic matrix gs[k] = the s-th symplectic
+    matrix (in the order of their binary digits), and phase indicators 
+    ps[k] = 2 * (binary digits of t), most significant first.
+
+    Parameters:
+    n: int - number of qubits.
+
+    Data:
+    gs: int (K, 2*n, 2*n) - operator maps in binary representation.
+    ps: int (K, 2*n) - phase indicators of the maps.
+    inv: int (K) - index of the inverse of each map.
+    maps: list of CliffordMap - the maps as objects (shared by all users, 
+        not to be modified in-place).'''
+    def __init__(self, n):
+        self.n = n
+        m = 4*n*n # number of bits in a symplectic matrix
+        mats = binary_repr(numpy.arange(2**m), m).reshape(-1, 2*n, 2*n).astype(DTYPE)
+        lam = numpy.kron(numpy.eye(n, dtype=DTYPE), numpy.array([[0,1],[1,0]], dtype=DTYPE))
+        symp = numpy.all((mats @ lam @ mats.transpose(0,2,1))%2 == lam, axis=(1,2))
+        # lookup from the binary code of a matrix to its symplectic index
+        self.codes = numpy.cumsum(symp) - 1
+        self.codes[~symp] = -1
+        mats = mats[symp]
+        signs = 2*binary_repr(numpy.arange(4**n), 2*n).astype(DTYPE)
+        self.gs = numpy.repeat(mats, 4**n, axis=0)
+        self.ps = numpy.tile(signs, (mats.shape[0], 1))
+        self.maps = [CliffordMap(g, p) for g, p in zip(self.gs, self.ps)]
+        # symplectic inverse, with phases fixed as in CliffordMap.inverse
+        gs_inv = (lam @ self.gs.transpose(0,2,1) @ lam)%2
+        ps_inv = numpy.empty_like(self.ps)
+        for k in range(len(self)):
+            _, ps_mis = pauli_combine(gs_inv[k], self.gs[k], self.ps[k])
+            ps_inv[k] = (- ps_mis - ps0(gs_inv[k]))%4
+        self.inv = self.index(gs_inv, ps_inv)
+
+    def __repr__(self):
+        return 'CliffordGroup(n={}, {} elements)'.format(self.n, len(self))
+
+    def __len__(self):
+        return self.gs.shape[0]
+
+    def __getitem__(self, k):
+        return self.maps[k]
+
+    def index(self, gs, ps):
+        '''Index of Clifford maps in the table.
+
+        Parameters:
+        gs: int (..., 2*n, 2*n) - operator maps in binary representation.
+        ps: int (..., 2*n) - phase indicators of the maps.
+
+        Returns:
+        int (...) - indices of the maps.'''
+        gs = numpy.asarray(gs, dtype=numpy.int_)
+        ps = numpy.asarray(ps, dtype=numpy.int_)
+        m = 4*self.n*self.n
+        s = self.codes[gs.reshape(gs.shape[:-2] + (m,)) @ (1 << numpy.arange(m)[::-1])]
+        t = (ps//2) @ (1 << numpy.arange(2*self.n)[::-1])
+        return s * 4**self.n + t
+
+    def random(self, rng=None):
+        '''Draw a uniformly random index.
+        (rng: random stream or seed, see utils.rng_stream)'''
+        return rng_integer(rng_stream(rng), len(self))
+
+CLIFFORD_GROUPS = {} # tables built on first use
+
+def clifford_group(n):
+    '''Get the (cached) table of the n-qubit Clifford group (n = 1, 2).'''
+    if n not in CLIFFORD_GROUPS:
+        if n not in (1, 2):
+            raise ValueError('Clifford group tables are only available for 1 and 2 qubits.')
+        CLIFFORD_GROUPS[n] = CliffordGroup(n)
+    return CLIFFORD_GROUPS[n]
+
 # ---- map constructors ----
-def identity_map(N):
-    '''construct identity Clifford map of N qubits.'''
-    gs = numpy.eye(2*N, dtype=numpy.int_)
+def identity_map(N, packed=False):
+    '''construct identity Clifford map of N qubits.
+        (packed = True to construct in bit-packed storage directly)'''
+    if packed:
+        xs = numpy.zeros((2*N, (N+63)//64), dtype=numpy.uint64)
+        zs = numpy.zeros((2*N, (N+63)//64), dtype=numpy.uint64)
+        i = numpy.arange(N)
+        bits = numpy.left_shift(numpy.uint64(1), (i % 64).astype(numpy.uint64))
+        xs[2*i, i//64] = bits
+        zs[2*i+1, i//64] = bits
+        return CliffordMap(None, numpy.zeros(2*N, dtype=DTYPE)).set_packed(xs, zs, N)
+    gs = numpy.eye(2*N, dtype=DTYPE)
     return CliffordMap(gs)
 
-def random_pauli_map(N):
-    '''construct random Pauli map of N qubits.'''
-    gs = random_pauli(N) # shape (2*N, 2*N), mapping matrix
-    ps = 2 * numpy.random.randint(0,2,2*N) # shape (2*N), phase indicator
+def random_pauli_map(N, rng=None):
+    '''construct random Pauli map of N qubits.
+        (rng: random stream or seed, see utils.rng_stream)'''
+    rng = rng_stream(rng)
+    gs = random_pauli(N, rng) # shape (2*N, 2*N), mapping matrix
+    ps = 2 * rng_bits(rng, 2*N).astype(DTYPE) # shape (2*N), phase indicator
     return CliffordMap(gs, ps)
 
-def random_clifford_map(N):
+def random_clifford_map(N, rng=None):
     '''construct random Clifford map of N qubits.
-        drawn from N-qubit Clifford group uniformly.'''
-    gs = random_clifford(N) # shape (2*N, 2*N), mapping matrix
-    ps = 2 * numpy.random.randint(0,2,2*N) # shape (2*N), phase indicator
+        drawn from N-qubit Clifford group uniformly.
+        (rng: random stream or seed, see utils.rng_stream)'''
+    rng = rng_stream(rng)
+    if N in (1, 2): # draw from table
+        return clifford_group(N)[clifford_group(N).random(rng)].copy()
+    gs = random_clifford(N, rng) # shape (2*N, 2*N), mapping matrix
+    ps = 2 * rng_bits(rng, 2*N).astype(DTYPE) # shape (2*N), phase indicator
     return CliffordMap(gs, ps)
 
 def clifford_rotation_map(gen):
     '''construct Clifford map from generator.'''
     gen = pauli(gen)
-    gs = numpy.eye(2*gen.N, dtype=numpy.int_) # initialize
-    ps = numpy.zeros(2*gen.N, dtype=numpy.int_) # initialize
+    gs = numpy.eye(2*gen.N, dtype=DTYPE) # initialize
+    ps = numpy.zeros(2*gen.N, dtype=DTYPE) # initialize
     gs, ps = clifford_rotate(gen.g, gen.p, gs, ps)
     return CliffordMap(gs, ps)
 
@@ -350,22 +804,36 @@ def stabilizer_state(*stabilizers):
     stabilizers: PauliList or descriptions of stabilizers.'''
     stabilizers = paulis(*stabilizers) # parsing input to PauliList
     # validity check:
-    if not (acq_mat(stabilizers.gs) == 0).all():
+    xs, zs = pack_bits(stabilizers.gs)
+    if not (parallel(acq_mat_packed, stabilizers.L)(xs, zs) == 0).all():
         raise ValueError('stabilizers must all commute with each other.')
     state = maximally_mixed_state(stabilizers.N)
     state.gs, state.r = stabilizer_project(state.gs, numpy.flipud(stabilizers.gs), state.r)
     state.ps[state.r:state.N] = stabilizers.ps
     return state
 
-def maximally_mixed_state(N):
-    return identity_map(N).to_state(r=N)
+def stabilizer_state_batch(states, B=None):
+    '''Construct a batch of stabilizer states.
+
+    Parameters:
+    states: StabilizerState or list of StabilizerState - the states in the batch.
+    B: int - if given, a single state is repeated B times.'''
+    if isinstance(states, StabilizerState):
+        states = [states] * (1 if B is None else B)
+    gs = numpy.stack([state.gs for state in states])
+    ps = numpy.stack([state.ps for state in states])
+    r = numpy.array([state.r for state in states], dtype=numpy.int_)
+    return StabilizerStateBatch(gs, ps, r)
+
+def maximally_mixed_state(N, packed=False):
+    return identity_map(N, packed).to_state(r=N)
 
-def zero_state(N):
-    return identity_map(N).to_state()
+def zero_state(N, packed=False):
+    return identity_map(N, packed).to_state()
 
 def one_state(N):
     gs = zero_state(N).gs
-    ps = (2*numpy.ones(2*N)).astype(int)
+    ps = 2*numpy.ones(2*N, dtype=DTYPE)
     return StabilizerState(gs = gs,ps = ps)
 
 def bit_state(N, bits):
@@ -378,7 +846,7 @@ def bit_state(N, bits):
             raise ValueError("bitstring must be of length N")
         bits = numpy.array(list(bits)).astype(int)
     gs = zero_state(N).gs
-    ps = 2*bits
+    ps = 2*bits.astype(DTYPE)
     return StabilizerState(gs = gs, ps = ps)
 
 def ghz_state(N):
@@ -386,21 +854,23 @@ def ghz_state(N):
     objs.append(pauli([1]*N))
     return stabilizer_state(paulis(objs))
 
-def random_pauli_state(N, r=0):
-    return random_pauli_map(N).to_state(r)
+def random_pauli_state(N, r=0, rng=None):
+    return random_pauli_map(N, rng).to_state(r)
 
-def random_clifford_state(N, r=0):
-    return random_clifford_map(N).to_state(r)
+def random_clifford_state(N, r=0, rng=None):
+    return random_clifford_map(N, rng).to_state(r)
 
-@njit
-def random_bit_state_gs_ps(N):
-    gs = numpy.zeros((2*N,2*N))
+@njit(nogil=True)
+def random_bit_state_gs_ps(N, rng):
+    gs = numpy.zeros((2*N,2*N), dtype=DTYPE)
     for i in range(N):
         gs[i,2*i+1]=1
         gs[N+i,2*i]=1
-    ps = numpy.random.choice(numpy.array([0,2]),size = 2*N)
+    ps = numpy.zeros(2*N, dtype=DTYPE)
+    for i in range(2*N):
+        ps[i] = 2*rng_bit(rng)
     return gs, ps
 
-def random_bit_state(N):
-    gs, ps = random_bit_state_gs_ps(N)
-    return StabilizerState(gs = gs.astype(int), ps = ps)
\ No newline at end of file
+def random_bit_state(N, rng=None):
+    gs, ps = random_bit_state_gs_ps(N, rng_stream(rng))
+    return StabilizerState(gs = gs, ps = ps)
\ No newline at end of file
@@ -0,0 +1,619 @@
+import os
+import numpy
+from .utils import DTYPE, pack_bits, unpack_bits
+from .paulialg import Pauli, PauliMonomial, PauliList, PauliPolynomial
+from .stabilizer import CliffordMap, StabilizerState, StabilizerStateBatch
+from .circuit import CliffordGate, Measurement, Layer, Circuit
+from .device import PauliShadow, CliffordShadow, median_of_means
+
+'''Binary file formats.
+
+Classical shadow dataset (.shd):
+    A 64-byte header followed by fixed-size snapshot records, such that the
+    records can be mapped by numpy.memmap as a structured array and read
+    column-wise (by field) without copying. Bits are packed along the qubit
+    axis in little bit order (bit i of byte k is qubit 8*k+i).
+
+    header: magic (8 bytes), version (uint32), kind (uint32), N (uint64),
+        S (uint64, number of records), zero padding to 64 bytes.
+    records (kind = SHADOW_PAULI, see PauliShadow):
+        lo, hi: uint8 (ceil(N/8)) - low and high bits of the basis indices.
+        out: uint8 (ceil(N/8)) - outcome bits.
+    records (kind = SHADOW_CLIFFORD, see CliffordShadow):
+        x, z: uint8 (2*N, ceil(N/8)) - X and Z bits of the tableau.
+        p: uint8 (2*N) - phase indicators.
+        r: int64 - number of logical qubits.
+
+Object file (see save and load):
+    A header followed by sections of arrays, each starting at a multiple of
+    64 bytes, such that sections can be mapped by numpy.memmap.
+
+    header: magic (8 bytes), version (uint32), kind (uint32), N (int64),
+        L (int64), r (int64), section table (12 x (offset, count) uint64).
+    sections (Pauli, PauliList, PauliPolynomial, StabilizerState and 
+        CliffordMap, see PauliList packed storage):
+        xs, zs: uint64 (L, ceil(N/64)) - packed x and z bits.
+        ps: uint8 (L) - phase indicators.
+        cs: complex128 (L) - coefficients (PauliPolynomial, PauliMonomial).
+    sections (Circuit):
+        ops: records of the operations in forward order (see CIRCUIT_OP).
+        qubits: int64 - qubits of all operations.
+        gs: uint8 - pool of Clifford maps and generators (packed bits in 
+            little bit order, each starting at a byte).
+        ps: uint8 - pool of their phase indicators and of measurement 
+            outcomes.
+    sections (checkpoint, see save_checkpoint):
+        xs, zs, ps: the stabilizer state (header N, L = 2*N and r).
+        ops, qubits, gs, ps: the circuit.
+        progress: one record of CHECKPOINT_PROGRESS.
+        rng: uint64 - random streams passed by the caller (flattened, see 
+            utils.rng_stream), if any.
+'''
+SHADOW_MAGIC = b'PYCLSHAD'
+SHADOW_VERSION = 1
+SHADOW_PAULI = 0
+SHADOW_CLIFFORD = 1
+SHADOW_HEADER = numpy.dtype([('magic', 'S8'), ('version', '<u4'), ('kind', '<u4'),
+    ('N', '<u8'), ('S', '<u8'), ('pad', 'u1', 32)])
+
+def shadow_kind(shadow):
+    '''file kind of a shadow dataset'''
+    if isinstance(shadow, PauliShadow):
+        return SHADOW_PAULI
+    if isinstance(shadow, CliffordShadow):
+        return SHADOW_CLIFFORD
+    raise TypeError("Unsupported shadow type: {}".format(type(shadow)))
+
+def shadow_record(kind, N):
+    '''record dtype of a shadow file of a given kind on N qubits'''
+    nb = (N + 7)//8
+    if kind == SHADOW_PAULI:
+        return numpy.dtype([('lo', 'u1', nb), ('hi', 'u1', nb), ('out', 'u1', nb)])
+    if kind == SHADOW_CLIFFORD:
+        return numpy.dtype([('x', 'u1', (2*N, nb)), ('z', 'u1', (2*N, nb)),
+            ('p', 'u1', 2*N), ('r', '<i8')])
+    raise ValueError('unknown shadow file kind {}.'.format(kind))
+
+def pack(bits):
+    '''pack bits along the last axis (little bit order)'''
+    return numpy.packbits(bits, axis=-1, bitorder='little')
+
+def unpack(data, N):
+    '''unpack N bits along the last axis (little bit order)'''
+    return numpy.unpackbits(data, axis=-1, count=N, bitorder='little')
+
+def shadow_encode(shadow):
+    '''Encode a shadow dataset into an array of records.'''
+    kind = shadow_kind(shadow)
+    records = numpy.empty(len(shadow), dtype=shadow_record(kind, shadow.N))
+    if kind == SHADOW_PAULI:
+        bases = numpy.asarray(shadow.bases, dtype=DTYPE)
+        records['lo'] = pack(bases & 1)
+        records['hi'] = pack(bases >> 1)
+        records['out'] = pack(numpy.asarray(shadow.outs, dtype=DTYPE))
+    else:
+        states = shadow.states
+        gs = numpy.asarray(states.gs, dtype=DTYPE)
+        records['x'] = pack(gs[..., 0::2])
+        records['z'] = pack(gs[..., 1::2])
+        records['p'] = states.ps
+        records['r'] = states.r
+    return records
+
+def shadow_decode(records, N):
+    '''Decode an array of records into a shadow dataset (in memory).'''
+    if 'out' in records.dtype.names:
+        bases = unpack(records['lo'], N) | (unpack(records['hi'], N) << 1)
+        return PauliShadow(bases, unpack(records['out'], N))
+    S = records.shape[0]
+    gs = numpy.empty((S, 2*N, 2*N), dtype=DTYPE)
+    gs[..., 0::2] = unpack(records['x'], N)
+    gs[..., 1::2] = unpack(records['z'], N)
+    ps = numpy.array(records['p'], dtype=DTYPE)
+    r = numpy.array(records['r'], dtype=numpy.int_)
+    return CliffordShadow(StabilizerStateBatch(gs, ps, r))
+
+class ShadowWriter(object):
+    '''Streaming writer of a shadow file, appending records to the end of the
+    file and updating the snapshot count in the header.
+
+    Parameters:
+    path: str - file path.
+    append: bool - append to an existing file (of the same kind and number
+        of qubits), otherwise the file is created (or truncated).'''
+    def __init__(self, path, append=False):
+        self.path = path
+        self.kind = None
+        self.N = None
+        self.S = 0
+        if append and os.path.exists(path):
+            header = read_shadow_header(path)
+            self.kind, self.N, self.S = int(header['kind']), int(header['N']), int(header['S'])
+            self.file = open(path, 'r+b')
+            # drop incomplete trailing record, if any
+            self.file.truncate(SHADOW_HEADER.itemsize
+                + self.S * shadow_record(self.kind, self.N).itemsize)
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(path, 'w+b')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, shadow):
+        '''Append the snapshots of a shadow dataset to the file.'''
+        kind = shadow_kind(shadow)
+        if self.kind is None: # first write, create header
+            self.kind, self.N = kind, shadow.N
+            self.write_header()
+        elif (kind, shadow.N) != (self.kind, self.N):
+            raise ValueError('shadow dataset does not match the file (kind {}, N = {}).'.format(self.kind, self.N))
+        self.file.seek(0, os.SEEK_END)
+        shadow_encode(shadow).tofile(self.file)
+        self.S += len(shadow)
+        self.write_header()
+        return self
+
+    def write_header(self):
+        header = numpy.zeros((), dtype=SHADOW_HEADER)
+        header['magic'] = SHADOW_MAGIC
+        header['version'] = SHADOW_VERSION
+        header['kind'] = self.kind
+        header['N'] = self.N
+        header['S'] = self.S
+        self.file.seek(0)
+        self.file.write(header.tobytes())
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def read_shadow_header(path):
+    '''Read and validate the header of a shadow file.'''
+    header = numpy.fromfile(path, dtype=SHADOW_HEADER, count=1)
+    if header.shape[0] == 0 or header['magic'][0] != SHADOW_MAGIC:
+        raise ValueError('{} is not a shadow file.'.format(path))
+    if header['version'][0] > SHADOW_VERSION:
+        raise ValueError('shadow file version {} is not supported.'.format(header['version'][0]))
+    return header[0]
+
+class ShadowFile(object):
+    '''Shadow dataset stored in a file, with records mapped by numpy.memmap.
+    Snapshots are decoded block by block when estimators scan the file.
+
+    Parameters:
+    path: str - file path.'''
+    def __init__(self, path):
+        self.path = path
+        header = read_shadow_header(path)
+        self.kind, self.N, self.S = int(header['kind']), int(header['N']), int(header['S'])
+        if self.S > 0:
+            self.records = numpy.memmap(path, dtype=shadow_record(self.kind, self.N),
+                mode='r', offset=SHADOW_HEADER.itemsize, shape=(self.S,))
+        else: # numpy.memmap can not map an empty region
+            self.records = numpy.zeros(0, dtype=shadow_record(self.kind, self.N))
+
+    def __repr__(self):
+        return 'ShadowFile({}, S={}, N={})'.format(self.path, self.S, self.N)
+
+    def __len__(self):
+        return self.S
+
+    def __getitem__(self, item):
+        '''decode a slice of snapshots into a shadow dataset'''
+        if isinstance(item, (int, numpy.integer)):
+            item = slice(item, item + 1)
+        return shadow_decode(self.records[item], self.N)
+
+    def blocks(self, block_size=65536, start=0, stop=None):
+        '''Generate shadow datasets of consecutive blocks of snapshots.'''
+        stop = self.S if stop is None else stop
+        for k in range(start, stop, block_size):
+            yield self[k:min(k + block_size, stop)]
+
+    def expect(self, obs, z=None, groups=1, block_size=65536):
+        '''Estimate expectation values of observables from the snapshots,
+        scanning the file block by block. (see PauliShadow.expect and
+        CliffordShadow.expect)
+
+        Parameters:
+        obs: Pauli, PauliList or PauliPolynomial
+        z: fugacity of operator weight, default of the dataset if None.
+        groups: int - number of groups for median-of-means estimation.
+        block_size: int - number of snapshots decoded at a time.
+
+        Returns:
+        out: real for Pauli and PauliPolynomial, real (L) for PauliList.'''
+        if not 1 <= groups <= self.S:
+            raise ValueError('number of groups must be between 1 and the number of snapshots.')
+        kwargs = {} if z is None else {'z': z}
+        means = []
+        for g in range(groups): # snapshot s in group s*groups//S
+            start, stop = -(-g*self.S//groups), -(-(g+1)*self.S//groups)
+            acc = 0.
+            for block in self.blocks(block_size, start, stop):
+                acc = acc + len(block) * block.expect(obs, groups=1, **kwargs)
+            means.append(acc / (stop - start))
+        return median_of_means(numpy.array(means))
+
+def save_shadow(path, shadow):
+    '''Save a shadow dataset to a file.'''
+    with ShadowWriter(path) as writer:
+        writer.write(shadow)
+
+def load_shadow(path):
+    '''Open a shadow file (memory-mapped, see ShadowFile).'''
+    return ShadowFile(path)
+
+# ---- object files ----
+OBJECT_MAGIC = b'PYCLFOBJ'
+OBJECT_VERSION = 1
+OBJECT_HEADER = numpy.dtype([('magic', 'S8'), ('version', '<u4'), ('kind', '<u4'),
+    ('N', '<i8'), ('L', '<i8'), ('r', '<i8'), ('sections', '<u8', (12, 2)), ('pad', 'u1', 24)])
+OBJECT_ALIGN = 64 # byte alignment of sections
+KINDS = [Pauli, PauliList, PauliPolynomial, StabilizerState, CliffordMap, Circuit]
+KIND_CHECKPOINT = len(KINDS) # checkpoint of a circuit run
+# operation types in circuit files
+OP_RANDOM = 0 # random Clifford gate
+OP_MAP = 1 # Clifford gate by its forward map
+OP_GENERATOR = 2 # Clifford rotation gate by its generator
+OP_INDEX = 3 # Clifford gate by its index in the Clifford group table
+OP_MEASURE = 4 # measurement
+# layer: index of the layer, type: operation type, n: number of qubits, 
+# qoff: offset in qubits, goff/poff: offsets in the gs/ps pools, m: number 
+# of qubits of the map or generator (or the gate index for OP_INDEX)
+CIRCUIT_OP = numpy.dtype([('layer', '<i8'), ('type', '<i8'), ('n', '<i8'),
+    ('qoff', '<i8'), ('goff', '<i8'), ('poff', '<i8'), ('m', '<i8')])
+
+# layer: number of layers applied, log2prob: accumulated log2 probability,
+# packed: storage of the state, np_*: global numpy random state (MT19937, 
+# see numpy.random.get_state)
+CHECKPOINT_PROGRESS = numpy.dtype([('layer', '<i8'), ('log2prob', '<f8'), ('packed', '<i8'),
+    ('np_key', '<u4', 624), ('np_pos', '<i8'), ('np_has_gauss', '<i8'), ('np_gauss', '<f8')])
+
+def object_kind(obj):
+    '''file kind of an object (index in KINDS, most derived class first)'''
+    for kind in (4, 3, 2, 1, 0, 5):
+        if isinstance(obj, KINDS[kind]):
+            return kind
+    raise TypeError("Unsupported object type: {}".format(type(obj)))
+
+class ObjectWriter(object):
+    '''Streaming writer of an object file, writing sections one after 
+    another (see save).
+
+    Parameters:
+    path: str - file path.
+    kind: int - object kind (index in KINDS).
+    N, L, r: int - header fields.'''
+    def __init__(self, path, kind, N=0, L=0, r=0):
+        self.header = numpy.zeros((), dtype=OBJECT_HEADER)
+        self.header['magic'] = OBJECT_MAGIC
+        self.header['version'] = OBJECT_VERSION
+        self.header['kind'] = kind
+        self.header['N'], self.header['L'], self.header['r'] = N, L, r
+        self.k = 0 # number of sections written
+        self.file = open(path, 'wb')
+        self.file.write(self.header.tobytes()) # placeholder, finalized on close
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def begin(self):
+        '''start a new section, return its offset'''
+        offset = -(-self.file.tell()//OBJECT_ALIGN) * OBJECT_ALIGN
+        self.file.write(bytes(offset - self.file.tell()))
+        self.header['sections'][self.k, 0] = offset
+        return offset
+
+    def end(self, count):
+        '''end the current section of count elements'''
+        self.header['sections'][self.k, 1] = count
+        self.k += 1
+
+    def write(self, data):
+        '''write an array as a section'''
+        self.begin()
+        numpy.ascontiguousarray(data).tofile(self.file)
+        self.end(data.size)
+        return self
+
+    def write_blocks(self, blocks, count):
+        '''write a section of count elements from a generator of arrays'''
+        self.begin()
+        for data in blocks:
+            numpy.ascontiguousarray(data).tofile(self.file)
+        self.end(count)
+        return self
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(self.header.tobytes())
+        self.file.close()
+
+def write_paulis(writer, obj, block_size=65536):
+    '''write packed Pauli strings and phases of a PauliList to sections,
+    packing unpacked strings block by block'''
+    L, W = obj.L, (obj.N + 63)//64
+    for a in range(2): # xs and zs sections
+        if obj.packed:
+            writer.write((obj.xs, obj.zs)[a].astype('<u8'))
+        else:
+            writer.write_blocks((pack_bits(obj.gs[k:k+block_size])[a].astype('<u8')
+                for k in range(0, L, block_size)), L*W)
+    writer.write(numpy.asarray(obj.ps, dtype=DTYPE))
+
+def write_circuit(writer, circ):
+    '''write the operations of a circuit to sections (ops, qubits, gs and
+    ps pools), with sampled gates and measurement outcomes'''
+    ops, qubits, pool_gs, pool_ps = [], [], [], []
+    G, P = 0, 0 # pool sizes
+    for l, layer in enumerate(circ.layers_forward()):
+        for op in layer.ops:
+            typ, m, goff, poff = OP_MEASURE, 0, G, P
+            gs, ps = None, None
+            if not op.unitary:
+                if op._out is not None: # store outcomes in the ps pool
+                    ps = numpy.asarray(op._out, dtype=DTYPE)
+                    m = ps.size
+            elif op.index is not None:
+                typ, m = OP_INDEX, op.index
+            elif op.generator is not None:
+                typ, m = OP_GENERATOR, op.generator.N
+                gs, ps = op.generator.g, numpy.array([op.generator.p])
+            elif op.forward_map is not None or op.backward_map is not None:
+                if op.forward_map is None:
+                    op.compile()
+                typ, m = OP_MAP, op.forward_map.N
+                gs, ps = op.forward_map.gs, op.forward_map.ps
+            else:
+                typ = OP_RANDOM
+            if gs is not None:
+                pool_gs.append(numpy.packbits(numpy.asarray(gs, dtype=DTYPE).ravel(), bitorder='little'))
+                G += pool_gs[-1].size
+            if ps is not None:
+                pool_ps.append(numpy.asarray(ps, dtype=DTYPE).ravel())
+                P += pool_ps[-1].size
+            ops.append((l, typ, op.n, len(qubits), goff, poff, m))
+            qubits.extend(op.qubits)
+    writer.write(numpy.array(ops, dtype=CIRCUIT_OP))
+    writer.write(numpy.array(qubits, dtype='<i8'))
+    writer.write(numpy.concatenate(pool_gs + [numpy.zeros(0, dtype=DTYPE)]))
+    writer.write(numpy.concatenate(pool_ps + [numpy.zeros(0, dtype=DTYPE)]))
+
+def read_circuit(path, header, k, mmap=True):
+    '''read a circuit from sections k, ..., k+3 (see write_circuit)'''
+    ops = read_section(path, header, k, CIRCUIT_OP, mmap)
+    qubits = read_section(path, header, k+1, '<i8', mmap)
+    pool_gs = read_section(path, header, k+2, DTYPE, mmap)
+    pool_ps = read_section(path, header, k+3, DTYPE, mmap)
+    circ = Circuit()
+    layer, l = [], 0
+    for op in ops:
+        if op['layer'] != l:
+            circ.append(Layer(*layer))
+            layer, l = [], op['layer']
+        n, m, goff, poff = int(op['n']), int(op['m']), int(op['goff']), int(op['poff'])
+        qs = tuple(int(q) for q in qubits[op['qoff']:op['qoff']+n])
+        if op['type'] == OP_MEASURE:
+            measurement = Measurement(*qs)
+            if m > 0:
+                out = numpy.array(pool_ps[poff:poff+m], dtype=numpy.int_)
+                measurement.out = out if m == n else out.reshape(-1, n)
+            layer.append(measurement)
+            continue
+        gate = CliffordGate(*qs)
+        if op['type'] == OP_INDEX:
+            gate.set_index(m)
+        elif op['type'] == OP_GENERATOR:
+            g = numpy.unpackbits(pool_gs[goff:], count=2*m, bitorder='little')
+            gate.set_generator(Pauli(g, int(pool_ps[poff])))
+        elif op['type'] == OP_MAP:
+            gs = numpy.unpackbits(pool_gs[goff:], count=4*m*m, bitorder='little')
+            ps = numpy.array(pool_ps[poff:poff+2*m])
+            gate.set_forward_map(CliffordMap(gs.reshape(2*m, 2*m), ps))
+        layer.append(gate)
+    circ.append(Layer(*layer))
+    return circ
+
+def read_paulis(path, header, k, mmap=True):
+    '''read packed Pauli strings and phases from sections k, k+1, k+2 
+    (see write_paulis)'''
+    N, L = int(header['N']), int(header['L'])
+    W = (N + 63)//64
+    xs = read_section(path, header, k, '<u8', mmap).reshape(L, W)
+    zs = read_section(path, header, k+1, '<u8', mmap).reshape(L, W)
+    ps = read_section(path, header, k+2, DTYPE, mmap)
+    return xs, zs, ps
+
+def save(obj, path):
+    '''Save an object to a binary file.
+
+    Parameters:
+    obj: Pauli, PauliList, PauliPolynomial, StabilizerState, CliffordMap or
+        Circuit - object to be saved (in the versioned object format, see the
+        module documentation).
+    path: str - file path.'''
+    kind = object_kind(obj)
+    if isinstance(obj, Pauli):
+        paulis = PauliList(obj.g[None, :], numpy.array([obj.p]))
+        with ObjectWriter(path, kind, obj.N, 1) as writer:
+            write_paulis(writer, paulis)
+            if isinstance(obj, PauliMonomial):
+                writer.write(numpy.array([obj.c], dtype='<c16'))
+    elif isinstance(obj, PauliList):
+        r = obj.r if isinstance(obj, StabilizerState) else 0
+        with ObjectWriter(path, kind, obj.N, obj.L, r) as writer:
+            write_paulis(writer, obj)
+            if isinstance(obj, PauliPolynomial):
+                writer.write(numpy.asarray(obj.cs, dtype='<c16'))
+    else: # Circuit
+        N = getattr(obj, 'N', None)
+        with ObjectWriter(path, kind, -1 if N is None else N) as writer:
+            write_circuit(writer, obj)
+
+def read_object_header(path):
+    '''Read and validate the header of an object file.'''
+    header = numpy.fromfile(path, dtype=OBJECT_HEADER, count=1)
+    if header.shape[0] == 0 or header['magic'][0] != OBJECT_MAGIC:
+        raise ValueError('{} is not a pyclifford object file.'.format(path))
+    if header['version'][0] > OBJECT_VERSION:
+        raise ValueError('object file version {} is not supported.'.format(header['version'][0]))
+    return header[0]
+
+def read_section(path, header, k, dtype, mmap=True):
+    '''Read section k of an object file as a flat array, memory-mapped 
+    (copy-on-write) if mmap is True.'''
+    offset, count = (int(x) for x in header['sections'][k])
+    if mmap and count > 0:
+        return numpy.memmap(path, dtype=dtype, mode='c', offset=offset, shape=(count,))
+    return numpy.fromfile(path, dtype=dtype, count=count, offset=offset)
+
+def load(path, mmap=True):
+    '''Load an object from a binary file (see save).
+
+    Parameters:
+    path: str - file path.
+    mmap: bool - if True, arrays are memory-mapped from the file (copy-on-
+        write, the file is never modified) instead of read into memory, and
+        Pauli strings are kept in packed storage.
+
+    Returns:
+    obj: the loaded object.'''
+    header = read_object_header(path)
+    if int(header['kind']) == KIND_CHECKPOINT:
+        raise ValueError('{} is a checkpoint, use load_checkpoint.'.format(path))
+    kind, N, r = KINDS[int(header['kind'])], int(header['N']), int(header['r'])
+    if kind is Circuit:
+        circ = read_circuit(path, header, 0, mmap)
+        if N >= 0:
+            circ.N = N
+        return circ
+    xs, zs, ps = read_paulis(path, header, 0, mmap)
+    if kind is Pauli:
+        g = unpack_bits(numpy.asarray(xs), numpy.asarray(zs), N)[0]
+        if int(header['sections'][3, 1]) > 0:
+            return PauliMonomial(g, int(ps[0])).set_c(complex(read_section(path, header, 3, '<c16', mmap)[0]))
+        return Pauli(g, int(ps[0]))
+    if kind is StabilizerState:
+        obj = StabilizerState(None, ps, r=r)
+    else:
+        obj = kind(None, ps)
+    if kind is PauliPolynomial:
+        obj.set_cs(read_section(path, header, 3, '<c16', mmap))
+    obj.set_packed(xs, zs, N)
+    if not mmap:
+        obj.unpack()
+    return obj
+
+# ---- checkpoints ----
+def save_checkpoint(path, circuit, state, layer, log2prob=0., rng=None):
+    '''Save the progress of a circuit applied forward to a stabilizer state,
+    together with the global numpy random state (from which default random
+    streams are drawn) and the explicit random streams of the caller. The 
+    file is replaced atomically, such that an interrupted save keeps the 
+    previous checkpoint.
+
+    Parameters:
+    path: str - file path.
+    circuit: Circuit - the circuit, with its sampled gates and measurement 
+        outcomes.
+    state: StabilizerState - the state after the first layer layers.
+    layer: int - number of layers applied.
+    log2prob: real - accumulated log2 probability.
+    rng: uint64 (2) or (n, 2) - random streams to be saved (see 
+        utils.rng_stream and utils.rng_streams).'''
+    np_state = numpy.random.get_state()
+    progress = numpy.zeros(1, dtype=CHECKPOINT_PROGRESS)
+    progress['layer'], progress['log2prob'], progress['packed'] = layer, log2prob, state.packed
+    progress['np_key'], progress['np_pos'] = np_state[1], np_state[2]
+    progress['np_has_gauss'], progress['np_gauss'] = np_state[3], np_state[4]
+    tmp = path + '.tmp'
+    with ObjectWriter(tmp, KIND_CHECKPOINT, state.N, state.L, state.r) as writer:
+        write_paulis(writer, state)
+        write_circuit(writer, circuit)
+        writer.write(progress)
+        writer.write(numpy.zeros(0, dtype='<u8') if rng is None else numpy.asarray(rng, dtype='<u8'))
+    os.replace(tmp, path)
+
+def load_checkpoint(path, circuit=None, rng=None):
+    '''Load a checkpoint (see save_checkpoint) and restore the global numpy 
+    random state.
+
+    Parameters:
+    path: str - file path.
+    circuit: Circuit - if given, its gates and measurements are restored 
+        (in-place) from the checkpoint, which must be saved from a circuit
+        of the same structure.
+    rng: uint64 (2) or (n, 2) - if given, the random streams are restored
+        (in-place) from the checkpoint, which must be saved with streams of
+        the same shape.
+
+    Returns:
+    circuit: Circuit - the circuit.
+    state: StabilizerState - the state.
+    layer: int - number of layers applied.
+    log2prob: real - accumulated log2 probability.'''
+    header = read_object_header(path)
+    if int(header['kind']) != KIND_CHECKPOINT:
+        raise ValueError('{} is not a checkpoint.'.format(path))
+    xs, zs, ps = read_paulis(path, header, 0, False)
+    state = StabilizerState(None, ps, r=int(header['r'])).set_packed(xs, zs, int(header['N']))
+    saved = read_circuit(path, header, 3, False)
+    progress = read_section(path, header, 7, CHECKPOINT_PROGRESS, False)[0]
+    if not progress['packed']:
+        state.unpack()
+    if circuit is None:
+        circuit = saved
+    else: # restore the circuit in-place
+        if repr(circuit) != repr(saved):
+            raise ValueError('circuit does not match the checkpoint.')
+        for layer, saved_layer in zip(circuit.layers_forward(), saved.layers_forward()):
+            for op, saved_op in zip(layer.ops, saved_layer.ops):
+                if op.unitary:
+                    op.generator, op.index = saved_op.generator, saved_op.index
+                    op.forward_map, op.backward_map = saved_op.forward_map, saved_op.backward_map
+                else:
+                    op.out = saved_op._out
+            layer.forward_map, layer.backward_map = None, None
+    if rng is not None:
+        saved_rng = read_section(path, header, 8, '<u8', False)
+        if saved_rng.size != rng.size:
+            raise ValueError('{} saved {} random stream words, expected {}.'.format(path, saved_rng.size, rng.size))
+        rng[...] = saved_rng.reshape(rng.shape)
+    numpy.random.set_state(('MT19937', numpy.array(progress['np_key']), int(progress['np_pos']),
+        int(progress['np_has_gauss']), float(progress['np_gauss'])))
+    return circuit, state, int(progress['layer']), float(progress['log2prob'])
+
+def forward_checkpointed(circuit, state, path, every=1):
+    '''Apply a circuit forward to a stabilizer state layer by layer, saving a
+    checkpoint every few layers. If a checkpoint exists at path, the run 
+    resumes from it (restoring the circuit, the state and the random number
+    generators), with results identical to an uninterrupted run.
+
+    Parameters:
+    circuit: Circuit - the circuit (updated in-place as in Circuit.forward).
+    state: StabilizerState - the initial state (updated in-place, unless
+        resumed from a checkpoint).
+    path: str - checkpoint file path.
+    every: int - number of layers between checkpoints.
+
+    Returns:
+    state: StabilizerState - the final state.
+    log2prob: real - log2 probability of the measurement outcomes.'''
+    start, log2prob = 0, 0.
+    if os.path.exists(path):
+        _, state, start, log2prob = load_checkpoint(path, circuit)
+    layers = list(circuit.layers_forward())
+    for l in range(start, len(layers)):
+        state, layer_log2prob = layers[l].forward(state)
+        log2prob += layer_log2prob
+        if (l + 1) % every == 0 or l + 1 == len(layers):
+            save_checkpoint(path, circuit, state, l + 1, log2prob)
+    return state, log2prob
@@ -0,0 +1,119 @@
+import numpy as np
+
+from ..circuit import *
+from ..stabilizer import zero_state, maximally_mixed_state
+from ..paulialg import pauli
+
+def test_sample():
+    # GHZ state: all outcomes agree
+    circ = Circuit(H(0), CNOT(0, 1), CNOT(1, 2))
+    circ.measure(0, 1, 2)
+    out = circ.sample(zero_state(3), 200)
+    assert out.shape == (200, 3) and np.all(out == out[:, :1])
+    packed = circ.sample(zero_state(3), 200, packed=True)
+    assert packed.shape == (3, 4) and packed.dtype == np.uint64
+    # repeated measurement agrees with mid-circuit outcome
+    circ = Circuit(H(0))
+    circ.measure(0)
+    circ.append(CNOT(0, 1))
+    circ.measure(1)
+    out = circ.sample(zero_state(2), 100)
+    assert np.all(out[:, 0] == out[:, 1])
+    # outcomes sampled from the distribution of the final state
+    nqubits = 3
+    circ = brickwall_rcc(nqubits + 1, 3)
+    circ.measure(*range(nqubits + 1))
+    out = circ.sample(zero_state(nqubits + 1), 4000)
+    state = zero_state(nqubits + 1)
+    for layer in circ.layers_forward():
+        if layer.unitary:
+            layer.forward(state)
+    for bits in np.unique(out, axis=0):
+        freq = np.mean(np.all(out == bits, -1))
+        assert abs(freq - state.get_prob(bits)) < 0.05
+    assert np.all(np.abs(Circuit().measure(0, 1).sample(maximally_mixed_state(2), 4000).mean(0) - 0.5) < 0.05)
+    # reproducible from the random stream
+    assert np.all(circ.sample(zero_state(nqubits + 1), 100, rng=5) == circ.sample(zero_state(nqubits + 1), 100, rng=5))
+    runs = []
+    for _ in range(2): # random gates are drawn from the stream on first use
+        circ = brickwall_rcc(nqubits + 1, 3)
+        circ.measure(*range(nqubits + 1))
+        runs.append(circ.forward(zero_state(nqubits + 1), rng=5) + (circ.out,))
+    (state1, log2prob1, out1), (state2, log2prob2, out2) = runs
+    assert np.all(out1 == out2) and log2prob1 == log2prob2
+    assert np.all(state1.gs == state2.gs) and np.all(state1.ps == state2.ps)
+
+def test_local_gate():
+    from ..stabilizer import random_clifford_state, random_clifford_map, identity_map
+    from ..utils import mask
+    nqubits = np.random.randint(3, 8)
+    for n in [1, 2, 3]:
+        qubits = tuple(np.sort(np.random.choice(nqubits, n, replace=False)))
+        gate = CliffordGate(*qubits)
+        gate.set_forward_map(random_clifford_map(n))
+        global_map = identity_map(nqubits).embed(gate.forward_map, mask(qubits, nqubits))
+        for packed in [False, True]:
+            state = random_clifford_state(nqubits)
+            if packed:
+                state.pack()
+            initial = state.copy()
+            expected = state.copy().transform_by(global_map)
+            gate.forward(state)
+            assert np.all(state.gs == expected.gs) and np.all(state.ps == expected.ps)
+            gate.backward(state)
+            assert np.allclose(state.to_numpy(), initial.to_numpy())
+    # rotation gates use tabulated maps on subsystems
+    state = random_clifford_state(nqubits)
+    gen = pauli({0: 'X', nqubits - 1: 'Y'}, nqubits)
+    gate = clifford_rotation_gate(gen)
+    expected = state.copy().rotate_by(gen)
+    gate.forward(state)
+    assert np.all(state.gs == expected.gs) and np.all(state.ps == expected.ps)
+
+def test_tape():
+    from ..stabilizer import random_clifford_state
+    nqubits = 6
+    circ = brickwall_rcc(nqubits, 3)
+    circ.append(clifford_rotation_gate(pauli({1: 'X', 3: 'Z'}, nqubits)))
+    circ.gate(0, 2, 4, 5, 1) # too large for a lookup table
+    circ.measure(0, 3)
+    circ.gate(3, 4)
+    circ.measure(4)
+    tape = circ.to_tape(nqubits)
+    assert tape.M == 3
+    state = random_clifford_state(nqubits)
+    final, log2prob = tape.run(state.copy())
+    # replay the circuit, postselecting on the recorded outcomes
+    replay = state.copy()
+    k, log2prob_replay = 0, 0.
+    for layer in circ.layers_forward():
+        for op in layer.ops:
+            if not op.unitary:
+                op.out = tape.out[k:k+op.n]
+                k += op.n
+                _, op_log2prob = op.backward(replay)
+            else:
+                _, op_log2prob = op.forward(replay)
+            log2prob_replay += op_log2prob
+    assert log2prob == log2prob_replay
+    assert np.allclose(final.to_numpy(), replay.to_numpy())
+    # backward tape postselects the records, replay the inverse circuit
+    initial, log2prob = circ.to_tape(nqubits, backward=True).run(final.copy(), tape.out)
+    log2prob_replay = 0.
+    for layer in reversed(list(circ.layers_forward())):
+        for op in reversed(layer.ops):
+            _, op_log2prob = op.backward(replay)
+            log2prob_replay += op_log2prob
+    assert log2prob == log2prob_replay
+    assert np.allclose(initial.to_numpy(), replay.to_numpy())
+
+def test_clifford_table_gates():
+    # the 24 single qubit Clifford gates are distinct
+    assert sorted(C(k, 0).index for k in range(24)) == list(range(24))
+    # random gates are drawn from the table, and copied by index
+    gate = CliffordGate(0, 1)
+    state = zero_state(2)
+    gate.forward(state)
+    assert gate.index is not None and gate.copy().forward_map is gate.forward_map
+    gate.backward(state)
+    assert np.allclose(state.to_numpy(), zero_state(2).to_numpy())
@@ -0,0 +1,40 @@
+import numpy as np
+from ..device import *
+from ..circuit import onsite_rcc, global_rcc
+from ..stabilizer import ghz_state
+from ..paulialg import paulis
+
+
+def test_shadow():
+    nqubits = 4
+    state = ghz_state(nqubits)
+    obs = paulis('ZZII', 'XXXX', 'YYXX', 'IIIZ')
+    shadow = ClassicalShadow(state, onsite_rcc(nqubits))
+    assert shadow.local
+    data = shadow.collect(20000, seed=7, chunk_size=3000)
+    assert isinstance(data, PauliShadow) and len(data) == 20000
+    # reproducible from the seed
+    assert np.all(data.outs == shadow.collect(20000, seed=7, chunk_size=3000).outs)
+    assert np.allclose(data.expect(obs), state.expect(obs), atol=0.15)
+    assert np.allclose(data.expect(obs, groups=5), state.expect(obs), atol=0.15)
+    # agrees with the estimates from snapshot states of a measurement circuit
+    circ = onsite_rcc(nqubits)
+    circ.measure(*range(nqubits))
+    obs2 = paulis('ZZII', 'IIIZ')
+    xs = np.mean([snapshot.expect(obs2, z=3) for snapshot in ClassicalShadow(state, circ).snapshots(400)], 0)
+    assert np.allclose(xs, state.expect(obs2), atol=0.6)
+    shadow = ClassicalShadow(state, global_rcc(nqubits))
+    data = shadow.collect(100, seed=7)
+    assert isinstance(data, CliffordShadow) and not shadow.local
+    x = np.mean([state.expect(data.states[i]) for i in range(len(data))])
+    assert np.allclose(data.expect(state.density_matrix), x)
+    # circuits with measurements collect the snapshots of the forward-backward protocol
+    circ = global_rcc(nqubits)
+    circ.measure(*range(nqubits))
+    shadow = ClassicalShadow(state, circ)
+    data = shadow.collect(100, seed=7)
+    assert isinstance(data, CliffordShadow) and len(data) == 100
+    assert np.all(data.states.r == 0)
+    assert np.all(data.states.gs == shadow.collect(100, seed=7).states.gs)
+    x = np.mean([state.expect(data.states[i]) for i in range(len(data))])
+    assert np.allclose(data.expect(state.density_matrix), x)
@@ -140,3 +140,50 @@ def test_PauliPolynomial():
     for pcomp2 in p2:
         p2_op += build_pauli_string(pcomp2)
     assert (np.allclose(p.as_polynomial().trace(), np.trace(p_op))) and (np.allclose(p2.as_polynomial().trace(), np.trace(p2_op))) and (pauli('II').as_polynomial().set_cs(np.array([1.0 + 0.0j])).trace() == 4)
+
+
+def test_PauliPolynomialBuilder():
+    from ..paulialg import PauliPolynomialBuilder
+    nqubits = np.random.randint(1, 6)
+    terms = [paulis(np.random.randint(4, size=(1, np.random.randint(1, nqubits + 1))))[0] for _ in range(30)]
+    coeffs = np.random.randn(30)
+    builder = PauliPolynomialBuilder(capacity=4, max_terms=8)
+    poly = 0
+    for c, term in zip(coeffs, terms):
+        builder.add(term, c)
+        poly = poly + c * term
+    built = builder.build()
+    assert built.N == poly.N
+    assert np.allclose(built.to_numpy(), poly.to_numpy())
+    # bulk terms narrower than the builder, after compaction
+    builder = PauliPolynomialBuilder()
+    for term in paulis('XX', 'XX', 'YY'):
+        builder.add(term)
+    builder.compact()
+    builder.extend(paulis('Z').gs)
+    builder.extend(paulis('XY', 'X').gs, cs=np.array([0.5, -1.]))
+    poly = 2 * pauli('XX') + pauli('YY') + pauli('ZI') + 0.5 * pauli('XY') - pauli('XI')
+    assert np.allclose(builder.build().to_numpy(), poly.to_numpy())
+
+def test_PauliPolynomial_product():
+    nqubits = np.random.randint(1, 5)
+    p = paulis(np.random.randint(4, size=(6, nqubits))).as_polynomial().set_cs(np.random.randn(6))
+    q = paulis(np.random.randint(4, size=(5, nqubits))).as_polynomial().set_cs(np.random.randn(5))
+    prod = p.product(q)
+    assert np.allclose(prod.to_numpy(), p.to_numpy() @ q.to_numpy())
+    ref = (p @ q).reduce()
+    top = p.product(q, max_terms=3)
+    assert len(top) == min(3, len(ref))
+    assert np.allclose(np.sort(np.abs(top.cs)), np.sort(np.abs(ref.cs))[::-1][:len(top)][::-1])
+
+def test_apply_to():
+    nqubits = np.random.randint(1, 6)
+    p = paulis(np.random.randint(4, size=(5, nqubits)))
+    p.ps = np.random.randint(4, size=5).astype(p.ps.dtype)
+    poly = p.as_polynomial().set_cs(np.random.randn(5) + 1j*np.random.randn(5))
+    vecs = np.random.randn(2**nqubits, 3) + 1j*np.random.randn(2**nqubits, 3)
+    assert np.allclose(p[0].apply_to(vecs[:,0]), p[0].to_numpy() @ vecs[:,0])
+    assert np.allclose(p.apply_to(vecs), p.to_numpy() @ vecs)
+    assert np.allclose(poly.apply_to(vecs), poly.to_numpy() @ vecs)
+    assert np.allclose(poly.expectation_dense(vecs[:,0]), vecs[:,0].conj() @ poly.to_numpy() @ vecs[:,0])
+    assert np.allclose(p.expectation_dense(vecs), np.einsum('ib,lij,jb->lb', vecs.conj(), p.to_numpy(), vecs))
@@ -292,6 +292,39 @@ def test_entropy():
     assert np.allclose(a.to_state().entropy([0, 1]), qutip.entropy_vn(qutip_ket.ptrace([0,1]), base=2))
 
 
+def test_entropy_profile():
+    nqubits = np.random.randint(1, 8)
+    state = random_clifford_state(nqubits)
+    profile = state.entropy_profile()
+    assert profile.shape == (nqubits + 1,) and profile[0] == 0
+    for l in range(1, nqubits + 1):
+        assert profile[l] == state.entropy(list(range(l)))
+    order = np.random.permutation(nqubits)[:max(nqubits - 1, 1)]
+    profile = state.entropy_profile(order)
+    for l in range(1, len(order) + 1):
+        assert profile[l] == state.entropy(list(order[:l]))
+    # mixed states: von Neumann entropy of the reduced density matrix
+    nqubits = 3
+    states = [random_clifford_state(nqubits, r) for r in range(nqubits + 1)]
+    batch = stabilizer_state_batch(states)
+    profiles = batch.entropy_profile([2, 0, 1])
+    for state, profile in zip(states, profiles):
+        rho = qutip.Qobj(state.to_numpy(), dims=[[2]*nqubits, [2]*nqubits])
+        for l, region in [(1, [2]), (2, [0, 2]), (3, [0, 1, 2])]:
+            assert np.isclose(profile[l], qutip.entropy_vn(rho.ptrace(region), base=2))
+            assert state.entropy(region) == profile[l]
+    # both definitions agree on a classically correlated mixed state
+    # (stabilizers ZZI, IZZ: each qubit is maximally mixed)
+    state = stabilizer_state('ZZI', 'IZZ')
+    assert [state.entropy(region) for region in [[0], [1], [0, 1], [0, 2], [0, 1, 2]]] == [1, 1, 1, 1, 1]
+    assert list(state.entropy_profile()) == [0, 1, 1, 1]
+    batch = stabilizer_state_batch([state, stabilizer_state('XXX')])
+    assert list(batch.entropy([0, 1])) == [1, 2]
+    from ..utils import stabilizer_entropy_batch_parallel
+    assert list(stabilizer_entropy_batch_parallel(batch.gs, batch.r, mask([0, 1], 3))) == [1, 2]
+    assert np.all(batch.entropy_profile() == [[0, 1, 1, 1], [0, 1, 2, 2]])
+
+
 def test_rank():
     nqubits = np.random.randint(1, 5)
     a = zero_state(nqubits)
@@ -322,3 +355,118 @@ def test_sample():
             output_operator = np.kron(output_operator, one_hot_to_pauli(output_op))
         output_operator = output_operator * 1j**phase
         assert np.allclose(output_a, np.matmul(output_operator, output_a)) or np.allclose(output_a, -np.matmul(output_operator, output_a))
+
+
+def test_packed():
+    nqubits = np.random.randint(1, 80)
+    state = random_clifford_state(nqubits)
+    packed_state = state.copy().pack()
+    assert packed_state.packed and np.allclose(packed_state.gs, state.gs)
+
+    ### Test transformation
+    cmap = random_clifford_map(nqubits)
+    state.transform_by(cmap)
+    packed_state.transform_by(cmap)
+    assert np.allclose(packed_state.gs, state.gs) and np.allclose(packed_state.ps, state.ps)
+
+    ### Test expectation
+    obs = paulis(np.random.randint(4, size=(10, nqubits)))
+    assert np.allclose(packed_state.expect(obs), state.expect(obs))
+
+    ### Test postselection
+    obs = paulis([pauli({i: 'Z'}, nqubits) for i in range(nqubits)])
+    out = np.random.randint(2, size=nqubits)
+    log2prob = state.postselect(obs, out)
+    assert packed_state.postselect(obs, out) == log2prob
+    assert np.allclose(packed_state.gs, state.gs) and np.allclose(packed_state.ps, state.ps)
+    assert packed_state.r == state.r
+
+
+def test_indexed_expect():
+    nqubits = np.random.randint(1, 80)
+    state = random_clifford_state(nqubits)
+    state.measure(paulis([pauli({0: 'X'}, nqubits)]))
+    indexed_state = state.copy().set_indexed()
+    obs = paulis(np.random.randint(4, size=(20, nqubits)))
+    stbs = state.sample(20)
+    for o in [obs, stbs, -stbs]:
+        assert np.allclose(indexed_state.expect(o), state.expect(o))
+
+    ### Test index invalidation on mutation
+    cmap = random_clifford_map(nqubits)
+    state.transform_by(cmap)
+    indexed_state.transform_by(cmap)
+    obs = paulis([pauli({i: 'Z'}, nqubits) for i in range(nqubits)])
+    out = np.random.randint(2, size=nqubits)
+    assert state.postselect(obs, out) == indexed_state.postselect(obs, out)
+    assert np.allclose(indexed_state.expect(obs), state.expect(obs))
+
+    ### Test copies do not share the index with a mutated original
+    gs = np.array([[1,0,0,0],[1,0,0,1],[1,1,1,0],[1,0,1,1]])
+    state = StabilizerState(gs, np.array([0,2,0,0])).pack().set_indexed()
+    obs = paulis('ZI', 'IZ')
+    xs = state.expect(obs) # build the index
+    copied = state.copy()
+    state.measure(paulis('YX')) # rewrites the packed tableau in-place
+    assert np.allclose(copied.expect(obs), xs)
+
+
+def test_state_batch():
+    nqubits, batch_size = np.random.randint(2, 10), 4
+    states = [random_clifford_state(nqubits, r=np.random.randint(2)) for _ in range(batch_size)]
+    batch = stabilizer_state_batch(states)
+    assert len(batch) == batch_size and batch.N == nqubits
+
+    ### Test transformation
+    cmap = random_clifford_map(2)
+    batch.transform_by(cmap, mask([0, nqubits - 1], nqubits))
+    for state in states:
+        state.transform_by(cmap, mask([0, nqubits - 1], nqubits))
+    for b, state in enumerate(states):
+        assert np.allclose(batch[b].gs, state.gs) and np.allclose(batch[b].ps, state.ps)
+
+    ### Test measurement against postselection of individual states
+    obs = paulis([pauli({i: 'Z'}, nqubits) for i in range(nqubits - 1)])
+    out, log2prob = batch.measure(obs)
+    assert out.shape == (batch_size, nqubits - 1)
+    for b, state in enumerate(states):
+        assert state.postselect(obs, out[b]) == log2prob[b]
+        assert np.allclose(batch[b].gs, state.gs) and batch[b].r == state.r
+
+    ### Test expectation and entropy
+    obs = paulis(np.random.randint(4, size=(10, nqubits)))
+    xs = batch.expect(obs)
+    for b, state in enumerate(states):
+        assert np.allclose(xs[b], state.expect(obs))
+        assert batch.entropy([0])[b] == state.entropy([0])
+
+def test_to_statevector():
+    nqubits = np.random.randint(1, 7)
+    state = random_clifford_state(nqubits)
+    vec = state.to_statevector()
+    assert np.allclose(np.outer(vec, vec.conj()), state.to_numpy())
+    out = np.zeros(2**nqubits, dtype=complex)
+    assert state.to_statevector(out) is out and np.allclose(out, vec)
+    assert np.allclose(ghz_state(3).to_statevector(), np.array([1, 0, 0, 0, 0, 0, 0, 1])/np.sqrt(2))
+
+def test_group():
+    nqubits = np.random.randint(1, 6)
+    state = random_clifford_state(nqubits, r=np.random.randint(nqubits))
+    chunks = list(state.group(chunk_size=3))
+    assert all(len(chunk) <= 3 for chunk in chunks)
+    gs = np.concatenate([chunk.gs for chunk in chunks])
+    ps = np.concatenate([chunk.ps for chunk in chunks])
+    assert gs.shape[0] == 2**(nqubits - state.r) and np.unique(gs, axis=0).shape[0] == gs.shape[0]
+    assert np.allclose(state.expect(PauliList(gs, ps)), 1.)
+    assert np.allclose(state.density_matrix.to_numpy(), state.to_numpy())
+
+def test_clifford_group():
+    for n, size in [(1, 24), (2, 11520)]:
+        group = clifford_group(n)
+        assert len(group) == size
+        assert np.all(group.index(group.gs, group.ps) == np.arange(size))
+        for k in np.random.randint(size, size=10):
+            prod = group[k].compose(group[group.inv[k]])
+            assert np.all(prod.gs == np.eye(2*n)) and np.all(prod.ps == 0)
+    cmap = random_clifford_map(2)
+    assert np.all(acq_mat(cmap.gs) == np.kron(np.eye(2), [[0, 1], [1, 0]]))
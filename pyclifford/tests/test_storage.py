@@ -0,0 +1,104 @@
+import numpy as np
+from ..storage import *
+from ..device import ClassicalShadow
+from ..circuit import onsite_rcc, global_rcc
+from ..stabilizer import ghz_state
+from ..paulialg import paulis
+
+
+def test_shadow_file(tmp_path):
+    nqubits = 11
+    state = ghz_state(nqubits)
+    obs = paulis({0: 'Z', 1: 'Z'}, {i: 'X' for i in range(nqubits)}, N=nqubits)
+    shadow = ClassicalShadow(state, onsite_rcc(nqubits))
+    data = shadow.collect(1000, seed=5, chunk_size=300)
+    # stream chunks to file, then append the remaining chunks
+    seqs = np.random.SeedSequence(5).spawn(4)
+    path = str(tmp_path / 'local.shd')
+    with ShadowWriter(path) as writer:
+        writer.write(shadow.collect_chunk(300, seqs[0]))
+    shadow.collect(700, seed=seqs[1], chunk_size=300, path=path, append=True)
+    file = load_shadow(path)
+    assert len(file) == 1000 and isinstance(file.records, np.memmap)
+    assert np.all(file[:300].bases == data.bases[:300]) and np.all(file[:300].outs == data.outs[:300])
+    save_shadow(path, data)
+    file = load_shadow(path)
+    assert np.all(file[:].bases == data.bases) and np.all(file[:].outs == data.outs)
+    assert np.allclose(file.expect(obs, groups=3, block_size=128), data.expect(obs, groups=3))
+    # global shadows store packed tableaux
+    data = ClassicalShadow(state, global_rcc(nqubits)).collect(20, seed=5)
+    path = str(tmp_path / 'global.shd')
+    save_shadow(path, data)
+    file = load_shadow(path)
+    assert np.all(file[:].states.gs == data.states.gs) and np.all(file[:].states.ps == data.states.ps)
+    assert np.allclose(file.expect(obs, block_size=7), data.expect(obs))
+
+
+def test_save_load(tmp_path):
+    from ..stabilizer import random_clifford_state, random_clifford_map
+    from ..circuit import brickwall_rcc, clifford_rotation_gate
+    from ..paulialg import pauli
+    path = str(tmp_path / 'obj.clf')
+    state = random_clifford_state(70, r=3)
+    save(state, path)
+    loaded = load(path)
+    assert isinstance(loaded.xs, np.memmap) and loaded.r == 3
+    assert np.all(loaded.gs == state.gs) and np.all(loaded.ps == state.ps)
+    loaded = load(path, mmap=False)
+    assert not loaded.packed and np.all(loaded.gs == state.gs)
+    cmap = random_clifford_map(5).pack()
+    save(cmap, path)
+    assert np.all(load(path).gs == cmap.gs) and np.all(load(path).ps == cmap.ps)
+    poly = 0.5 * pauli('XXY') + 2j * pauli('-ZIZ')
+    save(poly, path)
+    assert np.all(load(path).gs == poly.gs) and np.all(load(path).cs == poly.cs)
+    # circuits keep their layers and sampled gates
+    circ = brickwall_rcc(6, 2)
+    circ.append(clifford_rotation_gate(pauli({1: 'X', 3: 'Z'}, 6)))
+    circ.gate(0, 2, 4, 5, 1)
+    state = random_clifford_state(6)
+    state1 = circ.forward(state.copy())[0]
+    save(circ, path)
+    loaded = load(path)
+    assert repr(loaded) == repr(circ)
+    state2 = loaded.forward(state.copy())[0]
+    assert np.all(state1.gs == state2.gs) and np.all(state1.ps == state2.ps)
+
+
+def test_checkpoint(tmp_path):
+    from ..circuit import identity_circuit, brickwall_rcc
+    from ..stabilizer import zero_state
+    def monitored_circuit(nqubits=6, depth=4):
+        circ = identity_circuit(nqubits)
+        for _ in range(depth):
+            circ.append(brickwall_rcc(nqubits, 1))
+            circ.measure(0, 3)
+        return circ
+    np.random.seed(3)
+    circ = monitored_circuit()
+    state, log2prob = circ.forward(zero_state(6))
+    # interrupted run: checkpoint after 5 layers, then lose the later work
+    path = str(tmp_path / 'run.ckpt')
+    np.random.seed(3)
+    circ1 = monitored_circuit()
+    state1 = zero_state(6)
+    layers = list(circ1.layers_forward())
+    log2prob1 = sum(layer.forward(state1)[1] for layer in layers[:5])
+    save_checkpoint(path, circ1, state1, 5, log2prob1)
+    layers[5].forward(state1)
+    np.random.seed(7)
+    circ2 = monitored_circuit()
+    state2, log2prob2 = forward_checkpointed(circ2, zero_state(6), path, every=2)
+    assert np.all(state2.gs == state.gs) and np.all(state2.ps == state.ps)
+    assert log2prob2 == log2prob
+    assert np.all(circ2.out == circ.out)
+    # finished runs return from the last checkpoint
+    _, _, layer, _ = load_checkpoint(path)
+    assert layer == len(layers)
+    # explicit random streams are restored in-place
+    from ..utils import rng_streams
+    rngs = rng_streams(5, 3)
+    save_checkpoint(path, circ1, state1, 6, log2prob1, rng=rngs)
+    restored = np.zeros_like(rngs)
+    load_checkpoint(path, rng=restored)
+    assert np.all(restored == rngs)
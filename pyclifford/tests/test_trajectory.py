@@ -0,0 +1,78 @@
+import numpy as np
+
+from ..trajectory import run_trajectories
+from ..circuit import identity_circuit
+from ..stabilizer import zero_state
+from ..paulialg import paulis
+
+
+def monitored_circuit(nqubits, depth):
+    circ = identity_circuit(nqubits)
+    for l in range(depth):
+        for i in range(l % 2, nqubits, 2):
+            circ.gate(i, (i+1) % nqubits)
+        circ.measure(l % nqubits)
+    return circ
+
+
+def test_run_trajectories():
+    nqubits, depth, n = 6, 6, 40
+    cuts = [list(range(l)) for l in range(1, nqubits)]
+    obs = paulis(*({i: 'Z', i+1: 'Z'} for i in range(nqubits-1)), N=nqubits)
+    state = np.random.get_state()
+    data = run_trajectories(lambda: monitored_circuit(nqubits, depth), 
+        lambda: zero_state(nqubits), n, seed=3, cuts=cuts, obs=obs, 
+        keep_states=True, chunk_size=7)
+    assert np.all(np.random.get_state()[1] == state[1])
+    assert data.out.shape == (n, depth)
+    assert np.all(data.log2prob <= 0)
+    for k in range(n):
+        assert np.allclose(data.entropy[k], [data.states[k].entropy(c) for c in cuts])
+        assert np.allclose(data.expect[k], data.states[k].expect(obs))
+    outs, counts = data.histogram()
+    assert counts.sum() == n
+    # reproducible from the seed, independent of the chunks
+    data1 = run_trajectories(lambda: monitored_circuit(nqubits, depth), 
+        lambda: zero_state(nqubits), n, seed=3, cuts=cuts, obs=obs)
+    assert np.all(data1.out == data.out)
+    assert np.all(data1.entropy == data.entropy)
+    assert np.allclose(data1.mean_expect(), data.mean_expect())
+
+
+def monitored():
+    return monitored_circuit(6, 6)
+
+
+def initial():
+    return zero_state(6)
+
+
+def test_run_trajectories_workers(monkeypatch):
+    from multiprocessing.shared_memory import SharedMemory
+    from .. import trajectory
+    # record the shared memory blocks created by the parent
+    names = []
+    class SharedBuffers(trajectory.SharedBuffers):
+        def __init__(self, specs):
+            super().__init__(specs)
+            names.extend(block.name for block in self.blocks.values())
+    monkeypatch.setattr(trajectory, 'SharedBuffers', SharedBuffers)
+    cuts = [[0, 1, 2], [0, 1]]
+    obs = paulis({0: 'Z', 1: 'Z'}, {2: 'X', 3: 'X'}, N=6)
+    data = run_trajectories(monitored, initial, 12, workers=2, seed=5, 
+        cuts=cuts, obs=obs, keep_states=True)
+    serial = run_trajectories(monitored, initial, 12, seed=5, 
+        cuts=cuts, obs=obs, keep_states=True)
+    assert np.all(data.out == serial.out)
+    assert np.all(data.log2prob == serial.log2prob)
+    assert np.all(data.entropy == serial.entropy)
+    assert np.all(data.expect == serial.expect)
+    assert np.all(data.states.gs == serial.states.gs) and np.all(data.states.ps == serial.states.ps)
+    # the blocks are unlinked after the run
+    assert len(names) > 0
+    for name in names:
+        try:
+            SharedMemory(name=name).close()
+        except FileNotFoundError:
+            continue
+        raise AssertionError('shared memory block {} was not unlinked'.format(name))
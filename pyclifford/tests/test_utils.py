@@ -0,0 +1,127 @@
+import numpy as np
+
+from ..utils import acq, acq_mat
+
+
+def np_acq_mat(gs):
+    return np.array([[acq(g1, g2) for g2 in gs] for g1 in gs])
+
+
+def test_acq_mat():
+    for L, nqubits in [(1, 1), (65, 3), (130, 70)]:
+        gs = np.random.randint(2, size=(L, 2*nqubits))
+        mat = acq_mat(gs)
+        assert mat.dtype == np.uint8
+        assert np.allclose(mat, np_acq_mat(gs))
+
+
+def test_z2linalg():
+    from ..z2linalg import z2rank, z2rref, z2inv, z2null, z2solve, z2rank_batch
+    nrows, ncols = np.random.randint(1, 100, size=2)
+    mat = np.random.randint(2, size=(nrows, ncols))
+    rank = z2rank(mat)
+    rref, pivots = z2rref(mat)
+    assert len(pivots) == rank and np.allclose(rref[np.arange(rank), pivots], 1)
+    assert np.allclose(np.sum(rref[:, pivots], 0), 1)
+    null = z2null(mat)
+    assert null.shape == (ncols - rank, ncols) and np.allclose(mat.dot(null.T) % 2, 0)
+    x = np.random.randint(2, size=(ncols, 2))
+    rhs = mat.dot(x) % 2
+    assert np.allclose(mat.dot(z2solve(mat, rhs)) % 2, rhs)
+    mats = np.random.randint(2, size=(5, nrows, ncols))
+    assert np.allclose(z2rank_batch(mats), [z2rank(m) for m in mats])
+    mat = np.triu(np.random.randint(2, size=(ncols, ncols)), 1) + np.eye(ncols, dtype=int)
+    assert np.allclose(mat.dot(z2inv(mat)) % 2, np.eye(ncols))
+
+
+def test_parallel():
+    from .. import utils
+    gs = np.random.randint(2, size=(300, 2*5))
+    ps = np.random.randint(4, size=300)
+    gs_map = np.random.randint(2, size=(2*5, 2*5))
+    ps_map = np.random.randint(4, size=2*5)
+    assert utils.parallel(utils.pauli_transform, 300) is utils.pauli_transform
+    gs1, ps1 = utils.pauli_transform(gs, ps, gs_map, ps_map)
+    gs2, ps2 = utils.pauli_transform_parallel(gs, ps, gs_map, ps_map)
+    assert np.allclose(gs1, gs2) and np.allclose(ps1, ps2)
+    assert np.allclose(utils.pauli_tokenize(gs, ps), utils.pauli_tokenize_parallel(gs, ps))
+    xs, zs = utils.pack_bits(gs)
+    assert np.all(utils.acq_mat_packed(xs, zs) == utils.acq_mat_packed_parallel(xs, zs))
+    mats = np.random.randint(2, size=(300, 6, 7))
+    assert np.all(utils.z2rank_batch(mats) == utils.z2rank_batch_parallel(mats))
+    threads = utils.get_num_threads()
+    try:
+        utils.set_num_threads(utils.numba.config.NUMBA_NUM_THREADS)
+        kernel = utils.parallel(utils.pauli_transform, 300)
+        if utils.get_num_threads() > 1:
+            assert kernel is utils.pauli_transform_parallel
+            assert utils.parallel(utils.acq_mat_packed, 300) is utils.acq_mat_packed_parallel
+            assert utils.parallel(utils.z2rank_batch, 300) is utils.z2rank_batch_parallel
+    finally:
+        utils.set_num_threads(threads)
+
+
+def test_dtype():
+    from ..utils import DTYPE, pauli_transform, random_clifford
+    gs_map = random_clifford(4)
+    ps_map = 2 * np.random.randint(2, size=8).astype(DTYPE)
+    assert gs_map.dtype == DTYPE
+    gs = np.random.randint(2, size=(20, 8)).astype(DTYPE)
+    ps = np.random.randint(4, size=20).astype(DTYPE)
+    gs1, ps1 = pauli_transform(gs, ps, gs_map, ps_map)
+    assert gs1.dtype == DTYPE and ps1.dtype == DTYPE
+    gs2, ps2 = pauli_transform(gs.astype(int), ps.astype(int), gs_map.astype(int), ps_map.astype(int))
+    assert gs2.dtype == np.int_ and np.all(gs1 == gs2) and np.all(ps1 == ps2)
+
+
+def test_pauli_unique():
+    from ..utils import pauli_unique, pack_bits, hash_table, hash_lookup
+    gs = np.random.randint(2, size=(50, 2*np.random.randint(1, 100)))
+    gs = np.concatenate([gs, gs[np.random.randint(50, size=50)]])
+    first, inds = pauli_unique(gs)
+    assert len(first) == len(np.unique(gs, axis=0))
+    assert np.all(gs[first][inds] == gs) and np.all(np.diff(first) > 0)
+    # strings with colliding fingerprints are kept apart
+    xs, zs = pack_bits(np.array([[1, 0], [0, 1]]))
+    keys, slots = hash_table(2)
+    refs = np.array([0])
+    h = np.uint64(7)
+    k = hash_lookup(keys, slots, refs, xs, zs, h, xs[0], zs[0])
+    keys[k], slots[k] = h, 0
+    assert hash_lookup(keys, slots, refs, xs, zs, h, xs[0], zs[0]) == k
+    assert hash_lookup(keys, slots, refs, xs, zs, h, xs[1], zs[1]) != k
+
+
+def test_random_clifford():
+    from ..utils import DTYPE, random_clifford, random_clifford_batch, rng_stream
+    N = np.random.randint(1, 40)
+    lam = np.kron(np.eye(N, dtype=int), [[0,1],[1,0]])
+    gs = random_clifford_batch(np.zeros((5, 2*N, 2*N), dtype=DTYPE), rng_stream(7))
+    for g in gs.astype(int):
+        assert np.all((g @ lam @ g.T) % 2 == lam)
+    gs1 = random_clifford_batch(np.zeros((5, 2*N, 2*N), dtype=DTYPE), rng_stream(7))
+    assert np.all(gs == gs1)
+    assert np.all(random_clifford(N, 7) == gs[0])
+
+
+def test_rng_stream():
+    from ..utils import rng_init, rng_next, rng_stream, rng_streams, rng_bits, rng_random
+    from .. import ghz_state, stabilizer_state_batch, paulis
+    # reference output of pcg32 seeded by (42, 54)
+    rng = rng_init(42, 54)
+    assert [int(rng_next(rng)) for _ in range(3)] == [0xa15c02b7, 0x7b47f409, 0xba1d3330]
+    assert 0. <= rng_random(rng) < 1.
+    bits = rng_bits(rng_stream(3), 100000)
+    assert abs(bits.mean() - 0.5) < 0.01
+    # spawned streams are reproducible and distinct
+    rngs = rng_streams(5, 4)
+    assert np.all(rngs == rng_streams(5, 4))
+    assert len(set(rngs[:, 1])) == 4
+    # outcomes of each state follow its own stream
+    N, B = 6, 4
+    batch = stabilizer_state_batch(ghz_state(N), B)
+    obs = paulis(*({i: 'X'} for i in range(N)), N=N)
+    out, _ = batch.measure(obs, rng_streams(5, B))
+    for b in range(B):
+        out1, _ = ghz_state(N).measure(obs, rng_streams(5, B)[b])
+        assert np.all(out[b] == out1)
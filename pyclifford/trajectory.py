@@ -0,0 +1,219 @@
+import numpy
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ProcessPoolExecutor
+from .utils import DTYPE
+from .paulialg import Pauli, PauliPolynomial
+from .stabilizer import StabilizerStateBatch
+
+'''Parallel Monte Carlo over circuit trajectories.
+
+Each trajectory builds a circuit and an initial state from the factories,
+applies the circuit forward (sampling random gates and measurement outcomes)
+and evaluates entropies and expectation values on the final state. The
+global numpy random state of trajectory k is seeded from the k-th child of a
+SeedSequence, such that trajectories draw from independent streams and the
+results do not depend on the number of workers.
+
+Results are written by the workers into buffers in shared memory, indexed
+by trajectory, instead of being pickled back to the parent:
+    out: uint8 (n, M) - measurement outcomes (in the order of Circuit.out).
+    log2prob: real (n) - log2 probability of the outcomes.
+    entropy: real (n, C) - entanglement entropy of each cut.
+    expect: real (n, L) - expectation value of each observable.
+    gs, ps, r - final stabilizer tableaux (only if states are kept).
+'''
+
+def circuit_outcomes(circuit):
+    '''Number of measurement outcomes of a circuit.'''
+    return sum(op.n for layer in circuit.layers_forward()
+        for op in layer.ops if not op.unitary)
+
+def num_observables(obs):
+    '''Number of expectation values of observables (see StabilizerState.expect).'''
+    if obs is None:
+        return 0
+    if isinstance(obs, (Pauli, PauliPolynomial)):
+        return 1
+    return obs.L
+
+class SharedBuffers(object):
+    '''Named numpy arrays in shared memory.
+
+    Parameters:
+    specs: dict - name: (shape, dtype) of each array to be created, or
+        name: (shape, dtype, shm_name) to attach to an existing block.'''
+    def __init__(self, specs):
+        self.blocks = {}
+        self.arrays = {}
+        for name, spec in specs.items():
+            shape, dtype = spec[:2]
+            size = max(int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize, 1)
+            if len(spec) == 2:
+                block = SharedMemory(create=True, size=size)
+            else:
+                block = SharedMemory(name=spec[2])
+            self.blocks[name] = block
+            self.arrays[name] = numpy.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def specs(self):
+        '''Specifications to attach to the blocks from another process.'''
+        return {name: (a.shape, a.dtype.str, self.blocks[name].name)
+            for name, a in self.arrays.items()}
+
+    def close(self, unlink=False):
+        self.arrays.clear() # release views before closing the blocks
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks.clear()
+
+def run_chunk(circuit_factory, state_factory, seq, start, stop, specs, N, cuts, obs):
+    '''Run trajectories [start, stop) and write their results into the shared
+    buffers (see run_trajectories).'''
+    buffers = SharedBuffers(specs)
+    np_state = numpy.random.get_state()
+    try:
+        M = buffers['out'].shape[1]
+        for k in range(start, stop):
+            child = numpy.random.SeedSequence(seq.entropy, spawn_key=seq.spawn_key + (k,))
+            numpy.random.seed(child.generate_state(4))
+            circuit = circuit_factory()
+            state = state_factory()
+            if state.N != N:
+                raise ValueError('trajectory {} starts from a state of {} qubits, expected {}.'.format(k, state.N, N))
+            state, log2prob = circuit.forward(state)
+            out = circuit.out
+            if out.shape[-1] != M:
+                raise ValueError('trajectory {} has {} measurement outcomes, expected {}.'.format(k, out.shape[-1], M))
+            buffers['out'][k] = out
+            buffers['log2prob'][k] = log2prob
+            for c, subsys in enumerate(cuts):
+                buffers['entropy'][k, c] = state.entropy(subsys)
+            if obs is not None:
+                buffers['expect'][k] = state.expect(obs)
+            if 'gs' in buffers.arrays:
+                if state.packed:
+                    state.unpack()
+                buffers['gs'][k], buffers['ps'][k], buffers['r'][k] = state.gs, state.ps, state.r
+    finally:
+        numpy.random.set_state(np_state)
+        buffers.close()
+
+class Trajectories(object):
+    '''Results of circuit trajectories (see run_trajectories).
+
+    Parameters:
+    out: int (n, M) - measurement outcomes of each trajectory.
+    log2prob: real (n) - log2 probability of the outcomes.
+    entropy: real (n, C) - entanglement entropy of each cut.
+    expect: real (n, L) - expectation value of each observable.
+    states: StabilizerStateBatch - final states (None if not kept).'''
+    def __init__(self, out, log2prob, entropy, expect, states=None):
+        self.out = out
+        self.log2prob = log2prob
+        self.entropy = entropy
+        self.expect = expect
+        self.states = states
+
+    def __repr__(self):
+        return 'Trajectories(n={}, M={})'.format(len(self), self.out.shape[1])
+
+    def __len__(self):
+        return self.out.shape[0]
+
+    def mean_entropy(self):
+        '''Average entropy of each cut over trajectories.'''
+        return numpy.mean(self.entropy, 0)
+
+    def mean_expect(self):
+        '''Average expectation value of each observable over trajectories.'''
+        return numpy.mean(self.expect, 0)
+
+    def histogram(self, qubits=None):
+        '''Histogram of measurement outcomes over trajectories.
+
+        Parameters:
+        qubits: int array - if given, the histogram of these outcomes only 
+            (indices into Circuit.out).
+
+        Returns:
+        outs: int (K, m) - distinct outcomes (in lexicographic order).
+        counts: int (K) - number of trajectories with each outcome.'''
+        out = self.out if qubits is None else self.out[:, qubits]
+        return numpy.unique(out, axis=0, return_counts=True)
+
+def run_trajectories(circuit_factory, state_factory, n, workers=1, seed=None,
+                     cuts=(), obs=None, keep_states=False, chunk_size=None):
+    '''Run independent trajectories of random circuits in parallel processes.
+
+    Parameters:
+    circuit_factory: callable - returns the circuit of a trajectory, e.g. 
+        lambda: brickwall_rcc(N, depth) with measurement layers.
+    state_factory: callable - returns the initial StabilizerState of a 
+        trajectory. (with workers > 1, both factories are sent to spawned
+        processes, and must be picklable, e.g. module level functions or
+        functools.partial objects)
+    n: int - number of trajectories.
+    workers: int - number of processes, workers = 1 runs in the calling 
+        process. (each worker compiles the kernels on startup, which pays 
+        off for long runs)
+    seed: int or numpy.random.SeedSequence - seed of the trajectories,
+        trajectory k draws from the k-th child stream of the seed.
+    cuts: list of int arrays - subsystems of which to evaluate the 
+        entanglement entropy of the final states.
+    obs: Pauli, PauliList or PauliPolynomial - observables of which to 
+        evaluate the expectation values on the final states.
+    keep_states: bool - keep the final stabilizer tableaux.
+    chunk_size: int - number of trajectories per task, by default the 
+        trajectories are split into 4 tasks per worker.
+
+    Returns:
+    trajectories: Trajectories - the results of all trajectories.'''
+    seq = seed if isinstance(seed, numpy.random.SeedSequence) else numpy.random.SeedSequence(seed)
+    np_state = numpy.random.get_state() # probe without consuming the global random state
+    try:
+        N = state_factory().N
+        M = circuit_outcomes(circuit_factory())
+    finally:
+        numpy.random.set_state(np_state)
+    cuts = list(cuts)
+    specs = {'out': ((n, M), numpy.uint8), 'log2prob': ((n,), numpy.float64),
+        'entropy': ((n, len(cuts)), numpy.float64),
+        'expect': ((n, num_observables(obs)), numpy.float64)}
+    if keep_states:
+        specs.update(gs=((n, 2*N, 2*N), DTYPE), ps=((n, 2*N), DTYPE), r=((n,), numpy.int_))
+    if chunk_size is None:
+        chunk_size = max(-(-n // (4 * workers)), 1)
+    starts = list(range(0, n, chunk_size))
+    stops = [min(start + chunk_size, n) for start in starts]
+    buffers = SharedBuffers(specs)
+    try:
+        args = (circuit_factory, state_factory, seq)
+        rest = (buffers.specs(), N, cuts, obs)
+        if workers > 1 and len(starts) > 1:
+            # spawn workers, as the threading layers of numba are not fork-safe
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                tasks = [pool.submit(run_chunk, *args, start, stop, *rest)
+                    for start, stop in zip(starts, stops)]
+                for task in tasks:
+                    task.result() # raise errors of workers
+        else:
+            for start, stop in zip(starts, stops):
+                run_chunk(*args, start, stop, *rest)
+        # copy the (small) per-trajectory results out of shared memory
+        results = {name: a.copy() for name, a in buffers.arrays.items()}
+    finally:
+        buffers.close(unlink=True)
+    states = None
+    if keep_states:
+        states = StabilizerStateBatch(results['gs'], results['ps'], results['r'])
+    expect = results['expect']
+    if isinstance(obs, (Pauli, PauliPolynomial)):
+        expect = expect[:, 0]
+    return Trajectories(results['out'].astype(numpy.int_), results['log2prob'],
+        results['entropy'], expect, states)
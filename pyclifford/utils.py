@@ -1,5 +1,8 @@
+import os
 import numpy
-from numba import njit
+import numba
+from numba import njit, prange
+from .z2linalg import z2rank, z2rank_batch, z2inv, z2matmul, pack_rows, z2eliminate
 
 '''Conventions:
 Binary representation of Pauli string. (arXiv:quant-ph/0406196)
@@ -12,9 +15,18 @@ Commutation relation of Pauli strings:
         sigma[g1] sigma[g2] = (-)^acq(g1,g2) sigma[g2] sigma[g1]
 Product of Pauli strings:
         sigma[g1] sigma[g2] = i^ipow(g1,g2) sigma[(g1+g2)%2]
+Data type:
+    Pauli bits (0,1) and phase indicators (0,1,2,3) are stored as uint8 
+    (DTYPE) by all constructors. Kernels allocate their outputs with the 
+    dtype of their inputs, such that arrays of other integer types are also
+    accepted. Phase arithmetic wraps around modulo 2^8 (or 2^64 after numba 
+    integer promotion), which preserves phase indicators modulo 4. Bits read 
+    in scalar kernels are cast to int64, as mixing uint64 and int64 scalars 
+    would promote to float64 in numba.
 '''
+DTYPE = numpy.uint8 # dtype of Pauli bits and phase indicators
 # ---- Pauli foundation ----
-@njit
+@njit(nogil=True)
 def front(g):
     '''Find the first nontrivial qubit in a Pauli string.
 
@@ -34,7 +46,7 @@ def front(g):
             break
     return i
 
-@njit
+@njit(nogil=True)
 def condense(g):
     '''Condense the Pauli string by taking collecting it in its support, returns
     a shorter string and the support.
@@ -54,7 +66,7 @@ def condense(g):
     qubits = numpy.arange(N)[mask]
     return g[numpy.repeat(mask, 2)], qubits
 
-@njit
+@njit(nogil=True)
 def p0(g):
     '''Bare phase factor due to x.z for a Pauli string.
 
@@ -67,10 +79,10 @@ def p0(g):
     N = N2//2
     p0 = 0
     for i in range(N):
-        p0 += g[2*i] * g[2*i+1]
+        p0 += numpy.int64(g[2*i]) * numpy.int64(g[2*i+1])
     return p0 % 4
 
-@njit
+@njit(nogil=True)
 def acq(g1, g2):
     '''Calculate Pauli operator anticmuunation indicator.
 
@@ -85,10 +97,10 @@ def acq(g1, g2):
     N = N2//2
     acq = 0
     for i in range(N):
-        acq += g1[2*i+1]*g2[2*i] - g1[2*i]*g2[2*i+1]
+        acq += numpy.int64(g1[2*i+1])*g2[2*i] - numpy.int64(g1[2*i])*g2[2*i+1]
     return acq % 2
 
-@njit
+@njit(nogil=True)
 def ipow(g1, g2):
     '''Phase indicator for the product of two Pauli strings.
 
@@ -104,16 +116,16 @@ def ipow(g1, g2):
     N = N2//2
     ipow = 0
     for i in range(N):
-        g1x = g1[2*i  ]
-        g1z = g1[2*i+1]
-        g2x = g2[2*i  ]
-        g2z = g2[2*i+1]
+        g1x = numpy.int64(g1[2*i  ])
+        g1z = numpy.int64(g1[2*i+1])
+        g2x = numpy.int64(g2[2*i  ])
+        g2z = numpy.int64(g2[2*i+1])
         gx = g1x + g2x
         gz = g1z + g2z 
         ipow += g1z * g2x - g1x * g2z + 2*((gx//2) * gz + gx * (gz//2))
     return ipow % 4
 
-@njit
+@njit(nogil=True)
 def ps0(gs):
     '''Bare phase factor due to x.z for Pauli strings.
 
@@ -125,12 +137,12 @@ def ps0(gs):
     (L, N2) = gs.shape
     N = N2//2
     ps0 = numpy.zeros(L, dtype=numpy.int_)
-    for j in range(L):
+    for j in prange(L):
         for i in range(N):
-            ps0[j] += gs[j,2*i] * gs[j,2*i+1]
+            ps0[j] += numpy.int64(gs[j,2*i]) * gs[j,2*i+1]
     return ps0 % 4
 
-@njit
+@njit(nogil=True)
 def acq_mat(gs):
     '''Construct anticommutation indicator matrix for a set of Pauli strings.
 
@@ -138,18 +150,14 @@ def acq_mat(gs):
     gs: int (L,2*N) - array of Pauli strings in binary representation.
 
     Returns:
-    mat: int (L,L) - anticommutation indicator matrix.'''
-    (L, N2) = gs.shape
-    N = N2//2
-    mat = numpy.zeros((L,L), dtype=numpy.int_)
-    for j1 in range(L):
-        for j2 in range(L):
-            for i in range(N):
-                mat[j1,j2] += gs[j1,2*i+1]*gs[j2,2*i] - gs[j1,2*i]*gs[j2,2*i+1]
-    mat = mat % 2
-    return mat
+    mat: uint8 (L,L) - anticommutation indicator matrix.
 
-@njit
+    Note: strings are bit-packed and passed to the word-parallel kernel 
+    acq_mat_packed.'''
+    xs, zs = pack_bits(gs)
+    return acq_mat_packed(xs, zs)
+
+@njit(nogil=True)
 def batch_dot(gs1, ps1, cs1, gs2, ps2, cs2):
     '''batch dot product of two Pauli polynomials
 
@@ -167,12 +175,12 @@ def batch_dot(gs1, ps1, cs1, gs2, ps2, cs2):
     cs: complex (L1*L2) - coefficients in the second polynomial.'''
     (L1, N2) = gs1.shape
     (L2, N2) = gs2.shape
-    gs = numpy.empty((L1,L2,N2), dtype=numpy.int_)
-    ps = numpy.empty((L1,L2), dtype=numpy.int_)
+    gs = numpy.empty((L1,L2,N2), dtype=gs1.dtype)
+    ps = numpy.empty((L1,L2), dtype=ps1.dtype)
     cs = numpy.empty((L1,L2), dtype=numpy.complex128)
-    for j1 in range(L1):
+    for j1 in prange(L1):
         for j2 in range(L2):
-            ps[j1,j2] = (ps1[j1] + ps2[j2] + ipow(gs1[j1], gs2[j2]))%4
+            ps[j1,j2] = (numpy.int64(ps1[j1]) + ps2[j2] + ipow(gs1[j1], gs2[j2]))%4
             gs[j1,j2] = (gs1[j1] + gs2[j2])%2
             cs[j1,j2] = cs1[j1] * cs2[j2]
     gs = numpy.reshape(gs, (L1*L2,-1))
@@ -181,7 +189,7 @@ def batch_dot(gs1, ps1, cs1, gs2, ps2, cs2):
     return gs, ps, cs
 
 # ---- token related ----
-@njit
+@njit(nogil=True)
 def pauli_tokenize(gs, ps):
     '''Create a token of Pauli operators for learning tasks.
 
@@ -195,15 +203,16 @@ def pauli_tokenize(gs, ps):
     (L, N2) = gs.shape
     N = N2//2
     ts = numpy.zeros((L,N+1), dtype=numpy.int_)
-    for j in range(L):
+    for j in prange(L):
         for i in range(N):
-            ts[j,i] = 3*gs[j,2*i+1] + (-1)**gs[j,2*i+1] * gs[j,2*i]
-        x = ps[j]
+            x, z = numpy.int64(gs[j,2*i]), numpy.int64(gs[j,2*i+1])
+            ts[j,i] = 3*z + (1 - 2*z) * x
+        x = numpy.int64(ps[j])
         ts[j,N] = 4 + x * (11 - 9 * x + 2 * x**2) // 2
     return ts
 
 # ---- combination, trasnformation, decomposition ----
-@njit
+@njit(nogil=True)
 def pauli_combine(C, gs_in, ps_in): 
     '''Combine Pauli operators by operator product.
         (left multiplication)
@@ -219,16 +228,16 @@ def pauli_combine(C, gs_in, ps_in):
     '''
     (L_out, L_in) = C.shape
     N2 = gs_in.shape[-1]
-    gs_out = numpy.zeros((L_out, N2), dtype=numpy.int_) # identity
-    ps_out = numpy.zeros((L_out,), dtype=numpy.int_)
-    for j_out in range(L_out):
+    gs_out = numpy.zeros((L_out, N2), dtype=gs_in.dtype) # identity
+    ps_out = numpy.zeros((L_out,), dtype=ps_in.dtype)
+    for j_out in prange(L_out):
         for j_in in range(L_in):
             if C[j_out, j_in]:
-                ps_out[j_out] = (ps_out[j_out] + ps_in[j_in] + ipow(gs_out[j_out], gs_in[j_in]))%4
+                ps_out[j_out] = (numpy.int64(ps_out[j_out]) + ps_in[j_in] + ipow(gs_out[j_out], gs_in[j_in]))%4
                 gs_out[j_out] = (gs_out[j_out] + gs_in[j_in])%2
     return gs_out, ps_out
 
-@njit
+@njit(nogil=True)
 def pauli_transform(gs_in, ps_in, gs_map, ps_map):
     '''Transform Pauli operators by Clifford map.
         (right multiplication)
@@ -243,10 +252,110 @@ def pauli_transform(gs_in, ps_in, gs_map, ps_map):
     gs_out: int (L, 2*N) - output binary representation of Pauli strings.
     ps_out: int (L) - phase indicators of output operators.'''
     gs_out, ps_out = pauli_combine(gs_in, gs_map, ps_map)
-    ps_out = (ps_in + ps0(gs_in) + ps_out)%4
+    ps_out = ((ps_in + ps0(gs_in) + ps_out)%4).astype(ps_in.dtype)
+    return gs_out.astype(gs_in.dtype), ps_out
+
+TABLE_MAX_QUBITS = 4 # local maps on at most this many qubits use lookup tables
+
+@njit(nogil=True)
+def pauli_transform_table(gs, ps, qubits, table_gs, table_ps):
+    '''Transform Pauli operators by a local Clifford map given as a lookup 
+    table over all local Pauli strings. (in-place)
+    Only the 2*n columns of the local qubits are read and written.
+
+    Parameters:
+    gs: int (L, 2*N) - Pauli strings in binary representation.
+    ps: int (L) - phase indicators.
+    qubits: int (n) - qubits that the map acts on (in the order of the map).
+    table_gs: int (4^n, 2*n) - image of local Pauli string k, whose bits 
+        are the binary digits of k (most significant first).
+    table_ps: int (4^n) - phase indicator increment of local Pauli string k.
+
+    Returns: gs, ps in-place modified.'''
+    L = gs.shape[0]
+    n = qubits.shape[0]
+    for j in prange(L):
+        k = 0 # index of local Pauli string
+        for a in range(n):
+            k = (k << 2) | (numpy.int64(gs[j,2*qubits[a]]) << 1) | numpy.int64(gs[j,2*qubits[a]+1])
+        ps[j] = (numpy.int64(ps[j]) + table_ps[k])%4
+        for a in range(n):
+            gs[j,2*qubits[a]] = table_gs[k,2*a]
+            gs[j,2*qubits[a]+1] = table_gs[k,2*a+1]
+    return gs, ps
+
+@njit(nogil=True)
+def pauli_transform_local(gs, ps, qubits, gs_map, ps_map):
+    '''Transform Pauli operators by a Clifford map acting on a subset of 
+    qubits. (in-place, for maps too large to tabulate)
+
+    Parameters:
+    gs: int (L, 2*N) - Pauli strings in binary representation.
+    ps: int (L) - phase indicators.
+    qubits: int (n) - qubits that the map acts on (in the order of the map).
+    gs_map: int (2*n, 2*n) - local operator map in binary representation.
+    ps_map: int (2*n) - phase indicators associated to target operators.
+
+    Returns: gs, ps in-place modified.'''
+    L = gs.shape[0]
+    n = qubits.shape[0]
+    g_in = numpy.zeros(2*n, dtype=numpy.int_)
+    g_out = numpy.zeros(2*n, dtype=numpy.int_)
+    for j in range(L):
+        for a in range(n):
+            g_in[2*a] = gs[j,2*qubits[a]]
+            g_in[2*a+1] = gs[j,2*qubits[a]+1]
+        g_out[:] = 0
+        p = numpy.int64(ps[j]) + p0(g_in)
+        for k in range(2*n):
+            if g_in[k]:
+                p += ps_map[k] + ipow(g_out, gs_map[k])
+                for l in range(2*n):
+                    g_out[l] = (g_out[l] + gs_map[k,l])%2
+        ps[j] = p % 4
+        for a in range(n):
+            gs[j,2*qubits[a]] = g_out[2*a]
+            gs[j,2*qubits[a]+1] = g_out[2*a+1]
+    return gs, ps
+
+@njit(nogil=True)
+def pauli_group_gray(gs_gen, ps_gen, t0, m):
+    '''Enumerate elements of the group generated by commuting Pauli operators
+    in Gray code order. Element t is the product of the generators selected
+    by the bits of the Gray code t^(t>>1), such that consecutive elements 
+    differ by one generator, and each element costs one product.
+
+    Parameters:
+    gs_gen: int (n, 2*N) - Pauli strings of the generators.
+    ps_gen: int (n) - phase indicators of the generators.
+    t0: int - index of the first element to enumerate.
+    m: int - number of elements to enumerate (t0 + m <= 2^n).
+
+    Returns:
+    gs_out: int (m, 2*N) - Pauli strings of elements t0, ..., t0+m-1.
+    ps_out: int (m) - phase indicators of the elements.'''
+    (n, N2) = gs_gen.shape
+    gs_out = numpy.zeros((m, N2), dtype=gs_gen.dtype)
+    ps_out = numpy.zeros(m, dtype=ps_gen.dtype)
+    g = numpy.zeros(N2, dtype=gs_gen.dtype)
+    p = 0
+    c = t0 ^ (t0 >> 1) # starting element from scratch
+    for j in range(n):
+        if (c >> j) & 1:
+            p = (p + ps_gen[j] + ipow(g, gs_gen[j]))%4
+            g ^= gs_gen[j]
+    for t in range(t0, t0 + m):
+        gs_out[t - t0] = g
+        ps_out[t - t0] = p
+        j = 0 # generator flipped from t to t+1
+        while ((t + 1) >> j) & 1 == 0 and j < n:
+            j += 1
+        if j < n:
+            p = (p + ps_gen[j] + ipow(g, gs_gen[j]))%4
+            g ^= gs_gen[j]
     return gs_out, ps_out
 
-@njit
+@njit(nogil=True)
 def pauli_decompose(gs_in, ps_in, gs_stb, ps_stb, r):
     '''Decompose Pauli operators into stabilizer and destabilizers.
 
@@ -263,9 +372,9 @@ def pauli_decompose(gs_in, ps_in, gs_stb, ps_stb, r):
     ps_out: int (L) - phase indicators of decomposed operators.'''
     (L, N2) = gs_in.shape
     N = N2//2
-    bs_out = numpy.zeros((L, N-r), dtype=numpy.int_)
-    cs_out = numpy.zeros((L, N-r), dtype=numpy.int_)
-    ps_out = ps_in.copy()
+    bs_out = numpy.zeros((L, N-r), dtype=gs_in.dtype)
+    cs_out = numpy.zeros((L, N-r), dtype=gs_in.dtype)
+    ps_out = ps_in.astype(numpy.int_)
     g_tmp = numpy.zeros(N2, dtype=numpy.int_)
     for k in range(L):
         g_tmp.fill(0)
@@ -279,10 +388,10 @@ def pauli_decompose(gs_in, ps_in, gs_stb, ps_stb, r):
                 cs_out[k,j-r] = 1
                 ps_out[k] = ps_out[k] - ps_stb[j] - ipow(g_tmp, gs_stb[j])
                 g_tmp = (g_tmp + gs_stb[j])%2
-    return bs_out, cs_out, ps_out%4
+    return bs_out, cs_out, (ps_out%4).astype(ps_in.dtype)
 
 # ---- clifford rotation ----
-@njit
+@njit(nogil=True)
 def clifford_rotate(g, p, gs, ps):
     '''Apply Clifford rotation to Pauli operators.
 
@@ -296,11 +405,11 @@ def clifford_rotate(g, p, gs, ps):
     (L, N2) = gs.shape
     for j in range(L):
         if acq(g, gs[j]):
-            ps[j] = (ps[j] + p + 1 + ipow(gs[j], g))%4
+            ps[j] = (numpy.int64(ps[j]) + p + 1 + ipow(gs[j], g))%4
             gs[j] = (gs[j] + g)%2
     return gs, ps
 
-@njit
+@njit(nogil=True)
 def clifford_rotate_signless(g, gs):
     '''Apply Clifford rotation to Pauli strings without signs.
 
@@ -316,7 +425,7 @@ def clifford_rotate_signless(g, gs):
     return gs
 
 # ---- diagonalization ----
-@njit
+@njit(nogil=True)
 def pauli_is_onsite(g, i0=0):
     '''check if a Pauli string is localized on a qubit.
 
@@ -336,7 +445,7 @@ def pauli_is_onsite(g, i0=0):
             break
     return out
 
-@njit
+@njit(nogil=True)
 def pauli_diagonalize1(g1, i0 = 0):
     '''Find a series of Clifford roations to diagonalize a single Pauli string
     to qubit i0 as Z.
@@ -361,16 +470,16 @@ def pauli_diagonalize1(g1, i0 = 0):
                 # now g anticommute with g1
             g[2*i0] = 1 # such that g also anticommute with Z0
             gs.append(g)
-            g1 = (g1 + g)%2
+            g1 = g1 ^ g
         # now g1 anticommute with Z0                
         g = g1.copy()
         g[2*i0+1] = (g[2*i0+1] + 1)%2 # g = g1 (*) Z0
         gs.append(g)
-        g1 = (g1 + g)%2
+        g1 = g1 ^ g
         # now g1 has been transformed to Z0
     return gs
 
-@njit
+@njit(nogil=True)
 def pauli_diagonalize2(g1, g2, i0 = 0):
     '''Find a series of Clifford roations to diagonalize a pair of anticommuting
     Pauli strings to qubit i0 as Z and X (or Y).
@@ -399,14 +508,16 @@ def pauli_diagonalize2(g1, g2, i0 = 0):
                 # now g anticommute with g1
             g[2*i0] = 1 # such that g also anticommute with Z0
             gs.append(g)
-            g1 = (g1 + g)%2
-            g2 = (g2 + acq(g, g2) * g)%2
+            g1 = g1 ^ g
+            if acq(g, g2):
+                g2 = g2 ^ g
         # now g1 anticommute with Z0                
         g = g1.copy()
         g[2*i0+1] = (g[2*i0+1] + 1)%2 # g = g1 (*) Z0
         gs.append(g)
-        g1 = (g1 + g)%2
-        g2 = (g2 + acq(g, g2) * g)%2
+        g1 = g1 ^ g
+        if acq(g, g2):
+            g2 = g2 ^ g
         # now g1 has been transformed to Z0
     # bring g2 to X0,Y0
     if not pauli_is_onsite(g2, i0): # if g2 is not on site
@@ -414,26 +525,171 @@ def pauli_diagonalize2(g1, g2, i0 = 0):
         g[2*i0] = 0
         g[2*i0+1] = 1
         gs.append(g)
-        g2 = (g2 + g)%2
+        g2 = g2 ^ g
         # now g2 has been transformed to X0 or Y0
     return gs, g1, g2
 
+# ---- random number generators ----
+''' Sampling kernels draw random numbers from explicit random streams, such 
+that results do not depend on the hidden generator state of numba threads. A 
+stream is a PCG32 generator (O'Neill 2014, XSH-RR output) whose state is held
+in a uint64 array rng = [state, inc] and advanced in-place; streams with 
+different increments inc (odd) produce independent sequences. Streams are 
+created from seeds by rng_stream, and independent streams are spawned from a 
+numpy.random.SeedSequence by rng_streams. Without a seed, a stream is seeded 
+from the global numpy random state, such that numpy.random.seed applies.
+'''
+PCG_MULT = numpy.uint64(6364136223846793005)
+
+@njit(nogil=True)
+def rng_next(rng):
+    '''Advance a random stream and return 32 random bits (as uint64).'''
+    old = rng[0]
+    rng[0] = old * PCG_MULT + rng[1]
+    xorshifted = ((old >> numpy.uint64(18)) ^ old) >> numpy.uint64(27)
+    xorshifted &= numpy.uint64(0xffffffff)
+    rot = old >> numpy.uint64(59)
+    return ((xorshifted >> rot) | (xorshifted << ((numpy.uint64(32) - rot) & numpy.uint64(31)))) & numpy.uint64(0xffffffff)
+
+@njit(nogil=True)
+def rng_init(initstate, initseq):
+    '''Initialize a random stream from a state and a sequence selector 
+    (following pcg32_srandom).'''
+    rng = numpy.zeros(2, dtype=numpy.uint64)
+    rng[1] = (numpy.uint64(initseq) << numpy.uint64(1)) | numpy.uint64(1)
+    rng_next(rng)
+    rng[0] += numpy.uint64(initstate)
+    rng_next(rng)
+    return rng
+
+@njit(nogil=True)
+def rng_random(rng):
+    '''Draw a uniform random real in [0,1) with 53 random bits.'''
+    a = rng_next(rng) >> numpy.uint64(5)
+    b = rng_next(rng) >> numpy.uint64(6)
+    return (a * 67108864. + b) / 9007199254740992.
+
+@njit(nogil=True)
+def rng_bit(rng):
+    '''Draw a random bit (0 or 1).'''
+    return numpy.int64(rng_next(rng) >> numpy.uint64(31))
+
+@njit(nogil=True)
+def rng_integer(rng, n):
+    '''Draw a uniform random integer in [0, n), n <= 2^32, by rejection of 
+    the biased range (following pcg32_boundedrand).'''
+    bound = numpy.uint64(n)
+    threshold = (numpy.uint64(1 << 32) - bound) % bound
+    while True:
+        w = rng_next(rng)
+        if w >= threshold:
+            return numpy.int64(w % bound)
+
+@njit(nogil=True)
+def rng_integers(rng, n, size):
+    '''Draw size uniform random integers in [0, n).'''
+    out = numpy.empty(size, dtype=numpy.int_)
+    for i in range(size):
+        out[i] = rng_integer(rng, n)
+    return out
+
+@njit(nogil=True)
+def rng_words(rng, size):
+    '''Draw size random 64-bit words.'''
+    out = numpy.empty(size, dtype=numpy.uint64)
+    for i in range(size):
+        out[i] = (rng_next(rng) << numpy.uint64(32)) | rng_next(rng)
+    return out
+
+@njit(nogil=True)
+def rng_bits(rng, n):
+    '''Draw n random bits, 32 bits per step of the stream.
+
+    Parameters:
+    rng: uint64 (2) - random stream.
+    n: int - number of bits.
+
+    Returns:
+    bits: int (n) - random bits (0 or 1).'''
+    bits = numpy.empty(n, dtype=numpy.int_)
+    w = numpy.uint64(0)
+    for i in range(n):
+        if i % 32 == 0:
+            w = rng_next(rng)
+        bits[i] = numpy.int64(w & numpy.uint64(1))
+        w >>= numpy.uint64(1)
+    return bits
+
+def rng_stream(seed=None):
+    '''Create a random stream.
+
+    Parameters:
+    seed: None, int, numpy.random.SeedSequence or a random stream - if None,
+        the stream is seeded from the global numpy random state; a random 
+        stream is returned as it is (and will be advanced by its users).
+
+    Returns:
+    rng: uint64 (2) - random stream.'''
+    if isinstance(seed, numpy.ndarray):
+        if seed.shape != (2,) or seed.dtype != numpy.uint64:
+            raise ValueError('a random stream must be a uint64 array of shape (2,).')
+        return seed
+    if seed is None:
+        words = numpy.random.randint(0, 2**63, size=2, dtype=numpy.int64).astype(numpy.uint64)
+    else:
+        if not isinstance(seed, numpy.random.SeedSequence):
+            seed = numpy.random.SeedSequence(seed)
+        words = seed.generate_state(2, numpy.uint64)
+    return rng_init(words[0], words[1])
+
+def rng_streams(seed, n):
+    '''Spawn independent random streams.
+
+    Parameters:
+    seed: None, int, numpy.random.SeedSequence or random streams - if None, 
+        the streams are spawned from a seed drawn from the global numpy 
+        random state; random streams (n, 2) are returned as they are; from
+        a single random stream (2), the seeds of the streams are drawn.
+    n: int - number of streams.
+
+    Returns:
+    rngs: uint64 (n, 2) - random streams.'''
+    if isinstance(seed, numpy.ndarray):
+        if seed.shape == (2,) and seed.dtype == numpy.uint64:
+            words = rng_words(seed, 2*n)
+            rngs = numpy.empty((n, 2), dtype=numpy.uint64)
+            for k in range(n):
+                rngs[k] = rng_init(words[2*k], words[2*k+1])
+            return rngs
+        if seed.shape != (n, 2) or seed.dtype != numpy.uint64:
+            raise ValueError('random streams must be a uint64 array of shape ({}, 2).'.format(n))
+        return seed
+    if seed is None:
+        seed = numpy.random.randint(2**63)
+    if not isinstance(seed, numpy.random.SeedSequence):
+        seed = numpy.random.SeedSequence(seed)
+    rngs = numpy.empty((n, 2), dtype=numpy.uint64)
+    for k, child in enumerate(seed.spawn(n)):
+        rngs[k] = rng_stream(child)
+    return rngs
+
 # ---- random Clifford ---
-@njit
-def random_pair(N):
+@njit(nogil=True)
+def random_pair(N, rng):
     '''Sample an anticommuting pair of random stabilizer and destabilizer.
 
     Parameters:
     N: int - number of qubits.
+    rng: uint64 (2) - random stream (see rng_stream).
 
     Returns:
     g1: int (2*N) - binary representation of stabilizer.
     g2: int (2*N) - binary representation of destabilizer.
     '''
-    g1 = numpy.random.randint(0,2,2*N)
-    g2 = numpy.random.randint(0,2,2*N)
+    g1 = rng_bits(rng, 2*N)
+    g2 = rng_bits(rng, 2*N)
     while (g1 == 0).all(): # resample g1 if it is all zero
-        g1 = numpy.random.randint(0,2,2*N)
+        g1 = rng_bits(rng, 2*N)
     if acq(g1, g2) == 0: # if g1, g2 commute
         i = front(g1) # locate the first nontrivial g1 site
         # flip commutativity by chaning g2
@@ -441,55 +697,142 @@ def random_pair(N):
         g2[2*i+1] = (g2[2*i+1] + g1[2*i] + g1[2*i+1])%2
     return g1, g2
 
-@njit
-def random_pauli(N):
+@njit(nogil=True)
+def random_pauli(N, rng):
     '''Sample a random Pauli map.
 
     Parameters:
     N: int - number of qubits.
+    rng: uint64 (2) - random stream (see rng_stream).
 
     Returs:
     gs: int (2*N, 2*N) - random Pauli map matrix.'''
-    gs = numpy.zeros((2*N,2*N), dtype=numpy.int_)
+    gs = numpy.zeros((2*N,2*N), dtype=DTYPE)
     for i in range(N):
-        g1, g2 = random_pair(1)
+        g1, g2 = random_pair(1, rng)
         gs[2*i  ,2*i:2*i+2] = g1
         gs[2*i+1,2*i:2*i+2] = g2
     return gs
 
-def random_clifford(N):
+@njit(nogil=True)
+def random_hadamard_permutation(N, rng):
+    '''Sample the Hadamard layer and the qubit permutation of the canonical
+    form C = B1.H.S.B2 from the quantum Mallows distribution.
+        (https://arxiv.org/abs/2003.09412)
+
+    Parameters:
+    N: int - number of qubits.
+    rng: uint64 (2) - random stream (see rng_stream).
+
+    Returns:
+    had: bool (N) - whether a Hadamard gate acts on each qubit.
+    perm: int (N) - qubit permutation.'''
+    had = numpy.zeros(N, dtype=numpy.bool_)
+    perm = numpy.zeros(N, dtype=numpy.int_)
+    inds = numpy.arange(N)
+    for i in range(N):
+        m = N - i
+        r = 1. - rng_random(rng) # uniform in (0,1]
+        index = -int(numpy.ceil(numpy.log2(r + (1. - r) * 4.**(-m))))
+        had[i] = index < m
+        k = index if index < m else 2*m - index - 1
+        perm[i] = inds[k]
+        for j in range(k, m - 1): # remove inds[k] from the remaining list
+            inds[j] = inds[j+1]
+    return had, perm
+
+@njit(nogil=True)
+def random_borel(N, rng):
+    '''Sample a uniform random element of the Borel subgroup (the Clifford 
+    maps generated by CNOT gates from lower to higher qubits and phase gates).
+
+    Parameters:
+    N: int - number of qubits.
+    rng: uint64 (2) - random stream (see rng_stream).
+
+    Returns:
+    table: int (2*N, 2*N) - symplectic matrix in block form [[delta, 0], 
+        [gamma.delta, delta^(-T)]], rows (X0,..,Z0,..) and columns 
+        (x0,..,z0,..), gamma being symmetric and delta being unit lower 
+        triangular.'''
+    gamma = numpy.zeros((N, N), dtype=numpy.int_)
+    delta = numpy.eye(N, dtype=numpy.int_)
+    for i in range(N):
+        gamma[i, i] = rng_bit(rng)
+        for j in range(i):
+            gamma[i, j] = rng_bit(rng)
+            gamma[j, i] = gamma[i, j]
+            delta[i, j] = rng_bit(rng)
+    table = numpy.zeros((2*N, 2*N), dtype=numpy.int_)
+    table[:N, :N] = delta
+    table[N:, :N] = z2matmul(gamma, delta)
+    table[N:, N:] = z2inv(delta).T
+    return table
+
+@njit(nogil=True)
+def random_clifford_into(gs, rng):
+    '''Sample a uniform random Clifford map into a given buffer, based on the 
+    canonical form C = B1.H.S.B2 of Bravyi and Maslov, with B1, B2 uniform in 
+    the Borel subgroup and the Hadamard layer H and permutation S drawn from 
+    the quantum Mallows distribution. (https://arxiv.org/abs/2003.09412)
+
+    Parameters:
+    gs: int (2*N, 2*N) - buffer to hold the Clifford map matrix.
+    rng: uint64 (2) - random stream (see rng_stream).
+
+    Returns:
+    gs: int (2*N, 2*N) - random Clifford map matrix (phase not assigned).'''
+    N = gs.shape[0]//2
+    had, perm = random_hadamard_permutation(N, rng)
+    table1 = random_borel(N, rng)
+    table2 = random_borel(N, rng)
+    table = numpy.zeros((2*N, 2*N), dtype=numpy.int_)
+    for i in range(N): # apply permutation and Hadamard layer to table2
+        if had[i]:
+            table[i] = table2[N + perm[i]]
+            table[N + i] = table2[perm[i]]
+        else:
+            table[i] = table2[perm[i]]
+            table[N + i] = table2[N + perm[i]]
+    table = z2matmul(table1, table)
+    # convert block form to the interleaved map order
+    for i in range(N):
+        for j in range(N):
+            gs[2*i  , 2*j  ] = table[i    , j    ]
+            gs[2*i  , 2*j+1] = table[i    , N + j]
+            gs[2*i+1, 2*j  ] = table[N + i, j    ]
+            gs[2*i+1, 2*j+1] = table[N + i, N + j]
+    return gs
+
+@njit(nogil=True)
+def random_clifford_batch(gs, rng):
+    '''Sample a batch of uniform random Clifford maps into a given buffer.
+
+    Parameters:
+    gs: int (K, 2*N, 2*N) - buffer to hold K Clifford map matrices.
+    rng: uint64 (2) - random stream (see rng_stream).
+
+    Returns:
+    gs: int (K, 2*N, 2*N) - random Clifford map matrices (phase not assigned).'''
+    for k in range(gs.shape[0]):
+        random_clifford_into(gs[k], rng)
+    return gs
+
+def random_clifford(N, rng=None):
     '''Sample a random Clifford map: a binary matrix with elements specifying 
     how each single Pauli operator [X0,Z0,X1,Z1,...] should gets mapped to the 
-    corresponding Pauli strings. 
-        based on the algorithm in (https://arxiv.org/abs/2008.06011)
+    corresponding Pauli strings. (see random_clifford_into)
 
     Parameter:
     N: int - number of qubits.
+    rng: random stream or seed (see rng_stream).
 
     Returns:
     gs: int (2*N, 2*N) - random Clifford map matrix (phase not assigned).'''
-    def random_clifford_(gs):
-        '''Fill random anticommuting Pauli strings in an array.
-            (as recursive constructor called by random_clifford) 
-        Parameters:
-        gs: int (2*n, 2*n) - array to fill in with Pauli strings.'''
-        n = gs.shape[-1]//2
-        g1, g2 = random_pair(n)
-        if n == 1:
-            gs[0] = g1
-            gs[1] = g2
-        else:
-            gens, g1, g2 = pauli_diagonalize2(g1, g2)
-            gs[0] = g1
-            gs[1] = g2
-            random_clifford_(gs[2:,2:])
-            for g in reversed(gens):
-                gs = clifford_rotate_signless(g, gs)
-        return gs
-    return random_clifford_(numpy.zeros((2*N,2*N), dtype=numpy.int_))
+    return random_clifford_into(numpy.zeros((2*N,2*N), dtype=DTYPE), rng_stream(rng))
 
 # ---- map/state conversion ----
-@njit
+@njit(nogil=True)
 def map_to_state(gs_in, ps_in):
     '''Convert Clifford map to stabilizer state.
 
@@ -511,7 +854,7 @@ def map_to_state(gs_in, ps_in):
         ps_out[i] = ps_in[2*i+1]
     return gs_out, ps_out
 
-@njit
+@njit(nogil=True)
 def state_to_map(gs_in, ps_in):
     '''Convert stabilizer state to Clifford map.
 
@@ -600,8 +943,8 @@ Same as measure, but:
 --- project ---
 Same as measure, but lines [1-6] are omitted.
 '''
-@njit
-def stabilizer_measure(gs_stb, ps_stb, gs_obs, ps_obs, r):
+@njit(nogil=True)
+def stabilizer_measure(gs_stb, ps_stb, gs_obs, ps_obs, r, rng):
     '''Measure a set of commuting Pauli observables on a stabilizer state.
 
     Given the prior state rho = sum_{i=1}^{N-r} 2^{-r} (1 + S_i)/2,
@@ -620,6 +963,7 @@ def stabilizer_measure(gs_stb, ps_stb, gs_obs, ps_obs, r):
     gs_obs: int (L, 2*N) - strings of Pauli operators to be measured.
     ps_obs: int (L) - phase indicators of Pauli operators to be measured.
     r: int - log2 rank of density matrix (num of standby stablizers).
+    rng: uint64 (2) - random stream (see rng_stream).
 
     Returns:
     gs_stb: int (2*N, 2*N) - Pauli strings in updated stabilizer tableau.
@@ -645,7 +989,7 @@ def stabilizer_measure(gs_stb, ps_stb, gs_obs, ps_obs, r):
                 if update: # if gs_stb[j] is not the first anticommuting operator
                     # update gs_stb[j] to commute with gs_obs[k]
                     if j < N: # if gs_stb[j] is a stablizer, phase matters
-                        ps_stb[j] = (ps_stb[j] + ps_stb[p] + ipow(gs_stb[j], gs_stb[p]))%4
+                        ps_stb[j] = (numpy.int64(ps_stb[j]) + ps_stb[p] + ipow(gs_stb[j], gs_stb[p]))%4
                     gs_stb[j] = (gs_stb[j] + gs_stb[p])%2
                 else: # if gs_stb[j] is the first anticommuting operator
                     if j < N + r: # if gs_stb[j] is not an active destabilizer
@@ -675,15 +1019,15 @@ def stabilizer_measure(gs_stb, ps_stb, gs_obs, ps_obs, r):
                     gs_stb[numpy.array([q,s])] = gs_stb[numpy.array([s,q])] # swap q,s
                 p = r
             # as long as gs_obs[k] is not eigen, outcome will be half-to-half
-            ps_stb[p] = 2 * numpy.random.randint(2)
-            out[k] = ((ps_stb[p] - ps_obs[k])%4)//2 #0->0(+1 eigenvalue), 2->1(-1 eigenvalue)
+            ps_stb[p] = 2 * rng_bit(rng)
+            out[k] = ((numpy.int64(ps_stb[p]) - ps_obs[k])%4)//2 #0->0(+1 eigenvalue), 2->1(-1 eigenvalue)
             log2prob -= 1.
         else: # no update, gs_obs[k] is eigen, result is in pa
             assert((ga == gs_obs[k]).all())
             out[k] = ((pa - ps_obs[k])%4)//2
     return gs_stb, ps_stb, r, out, log2prob
 
-@njit
+@njit(nogil=True)
 def stabilizer_postselect(gs_stb, ps_stb, gs_obs, ps_obs, r):
     '''Postselect stabilizer state given a set of Pauli observations.
 
@@ -723,7 +1067,7 @@ def stabilizer_postselect(gs_stb, ps_stb, gs_obs, ps_obs, r):
                 if update: # if gs_stb[j] is not the first anticommuting operator
                     # update gs_stb[j] to commute with gs_obs[k]
                     if j < N: # if gs_stb[j] is a stablizer, phase matters
-                        ps_stb[j] = (ps_stb[j] + ps_stb[p] + ipow(gs_stb[j], gs_stb[p]))%4
+                        ps_stb[j] = (numpy.int64(ps_stb[j]) + ps_stb[p] + ipow(gs_stb[j], gs_stb[p]))%4
                     gs_stb[j] = (gs_stb[j] + gs_stb[p])%2
                 else: # if gs_stb[j] is the first anticommuting operator
                     if j < N + r: # if gs_stb[j] is not an active destabilizer
@@ -761,7 +1105,7 @@ def stabilizer_postselect(gs_stb, ps_stb, gs_obs, ps_obs, r):
                 log2prob -= numpy.inf # log likelihood -inf
     return gs_stb, ps_stb, r, log2prob
 
-@njit
+@njit(nogil=True)
 def stabilizer_project(gs_stb, gs_obs, r):
     '''Project stabilizer tableau to a new stabilizer basis.
 
@@ -809,7 +1153,7 @@ def stabilizer_project(gs_stb, gs_obs, r):
                     gs_stb[numpy.array([q,s])] = gs_stb[numpy.array([s,q])] # swap q,s
     return gs_stb, r
 
-@njit
+@njit(nogil=True)
 def stabilizer_expect(gs_stb, ps_stb, gs_obs, ps_obs, r):
     '''Evaluate the expectation values of Pauli operators on a stabilizer state.
 
@@ -826,11 +1170,9 @@ def stabilizer_expect(gs_stb, ps_stb, gs_obs, ps_obs, r):
     N = Ng//2
     assert 0<=r<=N
     xs = numpy.empty(L, dtype=numpy.int_) # expectation values
-    ga = numpy.empty(2*N, dtype=numpy.int_) # workspace for stabilizer accumulation
-    pa = 0 # workspace for sign accumulation
-    for k in range(L): # for each observable gs_obs[k] 
-        ga[:] = 0
-        pa = 0
+    for k in prange(L): # for each observable gs_obs[k] 
+        ga = numpy.zeros(2*N, dtype=numpy.int_) # workspace for stabilizer accumulation
+        pa = 0 # workspace for sign accumulation
         trivial = True # assuming gs_obs[k] is trivial in code subspace
         for j in range(2*N):
             if acq(gs_stb[j], gs_obs[k]): 
@@ -845,7 +1187,7 @@ def stabilizer_expect(gs_stb, ps_stb, gs_obs, ps_obs, r):
             xs[k] = (-1)**(((pa - ps_obs[k])%4)//2)
     return xs
     
-@njit
+@njit(nogil=True)
 def stabilizer_entropy(gs, mask):
     '''Entanglement entropy of the stabilizer state in a given region.
 
@@ -857,10 +1199,12 @@ def stabilizer_entropy(gs, mask):
     entropy: int - entanglement entropy in unit of bit (log2 based).
 
     Algorithm: 
-        general case:
-        entropy = # of subsystem qubits 
-                - # of strictly inside stabilizers
-                - # of hidden stabilizers (= nullity of gs across restricted to subsystem)
+        general case (von Neumann entropy of the reduced density matrix, 
+        as in stabilizer_entropy_profile):
+        entropy = # of subsystem qubits - dim G_A
+        where G_A is the subgroup of stabilizers supported in the subsystem, 
+        the kernel of gs restricted to the complement:
+        dim G_A = L - rank of (gs restricted to complement)
 
         pure state:
         entropy = 1/2 rank of (acq of gs across restricted to subsystem)
@@ -868,93 +1212,1390 @@ def stabilizer_entropy(gs, mask):
     (L, Ng) = gs.shape
     N = Ng//2
     mask2 = numpy.repeat(mask, 2)
-    inside  = numpy.sum(gs[:,  mask2], -1) != 0
-    outside = numpy.sum(gs[:, ~mask2], -1) != 0
-    across = numpy.logical_and(inside, outside)
-    gs_across_sub = gs[across][:, mask2]
     if L == N: # state is pure
+        inside  = numpy.sum(gs[:,  mask2], -1) != 0
+        outside = numpy.sum(gs[:, ~mask2], -1) != 0
+        across = numpy.logical_and(inside, outside)
+        gs_across_sub = gs[across][:, mask2]
         entropy = z2rank(acq_mat(gs_across_sub))//2
     else:
-        strict = numpy.sum(inside) - numpy.sum(across)
-        hidden = z2rank(gs_across_sub) - z2rank(acq_mat(gs_across_sub))
-        entropy = numpy.sum(mask) - strict - hidden
+        entropy = numpy.sum(mask) - L + z2rank(gs[:, ~mask2])
+    return entropy
+
+@njit(nogil=True)
+def stabilizer_entropy_profile(gs, order):
+    '''Entanglement entropies of all the regions formed by the first l qubits
+    of a given qubit order, for l = 0, 1, ..., N.
+
+    Parameters:
+    gs: int (L,2*N) - input stabilizers.
+    order: int (N) - order of the qubits.
+
+    Returns:
+    entropy: int (N+1) - entanglement entropy of region order[:l] in unit 
+        of bit (log2 based).
+
+    Algorithm:
+        The entropy of region A is |A| - dim G_A, where G_A is the subgroup 
+        of stabilizers supported in A. The stabilizers are brought to row 
+        echelon form with columns in reversed qubit order (a gauge where the
+        right endpoints of stabilizers along the order are distinct, as in 
+        the clipped gauge), such that G_A of region order[:l] is spanned by 
+        the stabilizers whose right endpoint is before l: any combination of
+        stabilizers ends at the right endpoint of one of them, as the 
+        endpoints can not cancel. Counting endpoints gives all entropies in
+        a single elimination.'''
+    (L, Ng) = gs.shape
+    N = Ng//2
+    mat = numpy.zeros((L, Ng), dtype=numpy.int_)
+    for k in range(N):
+        i = order[N-1-k] # qubit at column pair k (reversed order)
+        for j in range(L):
+            mat[j, 2*k] = gs[j, 2*i]
+            mat[j, 2*k+1] = gs[j, 2*i+1]
+    r, pivots = z2eliminate(pack_rows(mat), Ng, False)
+    count = numpy.zeros(N, dtype=numpy.int_) # number of right endpoints at each position
+    for a in range(r):
+        count[N-1-pivots[a]//2] += 1
+    entropy = numpy.zeros(N+1, dtype=numpy.int_)
+    dim = 0
+    for l in range(1, N+1):
+        dim += count[l-1]
+        entropy[l] = l - dim
     return entropy
 
-# ---- Z2 linear algebra ----
-@njit
-def z2rank(mat):
-    '''Calculate Z2 rank of a binary matrix.
+# ---- batched stabilizer states ----
+''' A batch of B stabilizer states (e.g. trajectories of the same circuit) 
+is stored as stacked tableaux gs_stb (B, 2*N, 2*N), ps_stb (B, 2*N) and ranks 
+rs (B). The kernels below apply the single-state kernels to all tableaux in 
+lockstep (prange over the batch), such that a layer of measurements costs a 
+single kernel call. Unitary gates need no batched kernel: the same map acts 
+on every row of every tableau.
+'''
+@njit(nogil=True)
+def stabilizer_measure_batch(gs_stb, ps_stb, gs_obs, ps_obs, rs, rngs):
+    '''Measure a set of commuting Pauli observables on a batch of stabilizer 
+    states (in-place, see stabilizer_measure).
+
+    Parameters:
+    gs_stb: int (B, 2*N, 2*N) - Pauli strings in stabilizer tableaux.
+    ps_stb: int (B, 2*N) - phase indicators of (de)stabilizers.
+    gs_obs: int (L, 2*N) - strings of Pauli operators to be measured.
+    ps_obs: int (L) - phase indicators of Pauli operators to be measured.
+    rs: int (B) - log2 ranks of density matrices.
+    rngs: uint64 (B, 2) - random streams of the states (see rng_streams).
+
+    Returns:
+    gs_stb, ps_stb, rs - updated stabilizer tableaux and ranks.
+    out: int (B, L) - measurment outcomes (0 or 1 binaries).
+    log2prob: real (B) - log2 probabilities of the outcomes.'''
+    B = gs_stb.shape[0]
+    L = gs_obs.shape[0]
+    out = numpy.empty((B, L), dtype=numpy.int_)
+    log2prob = numpy.empty(B)
+    for b in prange(B):
+        _, _, rs[b], out[b], log2prob[b] = stabilizer_measure(
+            gs_stb[b], ps_stb[b], gs_obs, ps_obs, rs[b], rngs[b])
+    return gs_stb, ps_stb, rs, out, log2prob
+
+@njit(nogil=True)
+def stabilizer_postselect_batch(gs_stb, ps_stb, gs_obs, ps_obs, rs):
+    '''Postselect a batch of stabilizer states given Pauli observations 
+    (in-place, see stabilizer_postselect).
+
+    Parameters:
+    gs_stb: int (B, 2*N, 2*N) - Pauli strings in stabilizer tableaux.
+    ps_stb: int (B, 2*N) - phase indicators of (de)stabilizers.
+    gs_obs: int (L, 2*N) - strings of Pauli operators to be postselected.
+    ps_obs: int (B, L) - phase indicators of Pauli operators to be postselected
+        (for each state in the batch).
+    rs: int (B) - log2 ranks of density matrices.
+
+    Returns:
+    gs_stb, ps_stb, rs - updated stabilizer tableaux and ranks.
+    log2prob: real (B) - log2 probabilities of successful postselection.'''
+    B = gs_stb.shape[0]
+    log2prob = numpy.empty(B)
+    for b in prange(B):
+        _, _, rs[b], log2prob[b] = stabilizer_postselect(
+            gs_stb[b], ps_stb[b], gs_obs, ps_obs[b], rs[b])
+    return gs_stb, ps_stb, rs, log2prob
+
+@njit(nogil=True)
+def stabilizer_expect_batch(gs_stb, ps_stb, gs_obs, ps_obs, rs):
+    '''Evaluate the expectation values of Pauli operators on a batch of 
+    stabilizer states (see stabilizer_expect).
+
+    Returns:
+    xs: int (B, L) - expectation values of Pauli operators.'''
+    B = gs_stb.shape[0]
+    L = gs_obs.shape[0]
+    xs = numpy.empty((B, L), dtype=numpy.int_)
+    for b in prange(B):
+        xs[b] = stabilizer_expect(gs_stb[b], ps_stb[b], gs_obs, ps_obs, rs[b])
+    return xs
+
+@njit(nogil=True)
+def stabilizer_entropy_batch(gs_stb, rs, mask):
+    '''Entanglement entropies of a batch of stabilizer states in a given 
+    region (see stabilizer_entropy).
+
+    Parameters:
+    gs_stb: int (B, 2*N, 2*N) - Pauli strings in stabilizer tableaux.
+    rs: int (B) - log2 ranks of density matrices.
+    mask: bool (N) - boolean vector specifying a subsystem.
+
+    Returns:
+    entropy: int (B) - entanglement entropies in unit of bit.'''
+    B = gs_stb.shape[0]
+    N = gs_stb.shape[1]//2
+    entropy = numpy.empty(B, dtype=numpy.int_)
+    for b in prange(B):
+        entropy[b] = stabilizer_entropy(gs_stb[b, rs[b]:N], mask)
+    return entropy
+
+@njit(nogil=True)
+def stabilizer_entropy_profile_batch(gs_stb, rs, order):
+    '''Entanglement entropy profiles of a batch of stabilizer states (see 
+    stabilizer_entropy_profile).
+
+    Parameters:
+    gs_stb: int (B, 2*N, 2*N) - Pauli strings in stabilizer tableaux.
+    rs: int (B) - log2 ranks of density matrices.
+    order: int (N) - order of the qubits.
+
+    Returns:
+    entropy: int (B, N+1) - entanglement entropies of the regions order[:l].'''
+    B = gs_stb.shape[0]
+    N = gs_stb.shape[1]//2
+    entropy = numpy.empty((B, N+1), dtype=numpy.int_)
+    for b in prange(B):
+        entropy[b] = stabilizer_entropy_profile(gs_stb[b, rs[b]:N], order)
+    return entropy
+
+# ---- bit-packed representation ----
+''' Packed representation of Pauli strings:
+The x and z bits of a N-qubit Pauli string can be stored separately in
+W = ceil(N/64) words of uint64,
+    xs[w] bit b = x(64*w+b),  zs[w] bit b = z(64*w+b)
+such that 64 qubits are processed by a single word-level instruction. 
+The commutation and product relations then follow from (pc = popcount, 
+summed over words):
+    acq  = pc(x1&z2 ^ z1&x2) % 2
+    ipow = pc(z1&x2) - pc(x1&z2) + 2*pc(x1&x2&(z1^z2) ^ (x1^x2)&z1&z2) % 4
+The kernels below mirror their unpacked counterparts above, with (gs) 
+replaced by (xs, zs).
+'''
+ONE = numpy.uint64(1)
+M1 = numpy.uint64(0x5555555555555555)
+M2 = numpy.uint64(0x3333333333333333)
+M4 = numpy.uint64(0x0f0f0f0f0f0f0f0f)
+H01 = numpy.uint64(0x0101010101010101)
+
+@njit(nogil=True)
+def popcount(w):
+    '''Number of set bits in a uint64 word.'''
+    w = w - ((w >> ONE) & M1)
+    w = (w & M2) + ((w >> numpy.uint64(2)) & M2)
+    w = (w + (w >> numpy.uint64(4))) & M4
+    return numpy.int64((w * H01) >> numpy.uint64(56))
+
+@njit(nogil=True)
+def pack_bits(gs):
+    '''Pack Pauli strings into uint64 words.
+
+    Parameters:
+    gs: int (L, 2*N) - Pauli strings in binary representation.
+
+    Returns:
+    xs: uint64 (L, W) - packed x bits, W = ceil(N/64).
+    zs: uint64 (L, W) - packed z bits.'''
+    (L, N2) = gs.shape
+    N = N2//2
+    W = (N + 63)//64
+    xs = numpy.zeros((L, W), dtype=numpy.uint64)
+    zs = numpy.zeros((L, W), dtype=numpy.uint64)
+    for j in range(L):
+        for i in range(N):
+            b = ONE << numpy.uint64(i % 64)
+            if gs[j,2*i] != 0:
+                xs[j,i//64] |= b
+            if gs[j,2*i+1] != 0:
+                zs[j,i//64] |= b
+    return xs, zs
+
+@njit(nogil=True)
+def unpack_bits(xs, zs, N):
+    '''Unpack Pauli strings from uint64 words.
+
+    Parameters:
+    xs: uint64 (L, W) - packed x bits.
+    zs: uint64 (L, W) - packed z bits.
+    N: int - number of qubits.
+
+    Returns:
+    gs: int (L, 2*N) - Pauli strings in binary representation.'''
+    L = xs.shape[0]
+    gs = numpy.zeros((L, 2*N), dtype=DTYPE)
+    for j in range(L):
+        for i in range(N):
+            s = numpy.uint64(i % 64)
+            gs[j,2*i] = (xs[j,i//64] >> s) & ONE
+            gs[j,2*i+1] = (zs[j,i//64] >> s) & ONE
+    return gs
+
+@njit(nogil=True)
+def acq_packed(x1, z1, x2, z2):
+    '''Anticommutation indicator of two packed Pauli strings (see acq).'''
+    acq = 0
+    for w in range(x1.shape[0]):
+        acq += popcount((x1[w] & z2[w]) ^ (z1[w] & x2[w]))
+    return acq % 2
+
+@njit(nogil=True)
+def ipow_packed(x1, z1, x2, z2):
+    '''Phase indicator for the product of two packed Pauli strings (see ipow).'''
+    ipow = 0
+    for w in range(x1.shape[0]):
+        ipow += popcount(z1[w] & x2[w]) - popcount(x1[w] & z2[w])
+        ipow += 2 * popcount((x1[w] & x2[w] & (z1[w] ^ z2[w])) 
+                           ^ ((x1[w] ^ x2[w]) & z1[w] & z2[w]))
+    return ipow % 4
+
+@njit(nogil=True)
+def ps0_packed(xs, zs):
+    '''Bare phase factor due to x.z for packed Pauli strings (see ps0).'''
+    (L, W) = xs.shape
+    ps0 = numpy.zeros(L, dtype=numpy.int_)
+    for j in prange(L):
+        for w in range(W):
+            ps0[j] += popcount(xs[j,w] & zs[j,w])
+    return ps0 % 4
+
+ACQ_TILE = 64 # rows per tile in acq_mat_packed
+
+@njit(nogil=True)
+def acq_mat_packed(xs, zs):
+    '''Anticommutation indicator matrix for packed Pauli strings (see acq_mat).
+
+    Parameters:
+    xs, zs: uint64 (L, W) - packed Pauli strings.
+
+    Returns:
+    mat: uint8 (L,L) - anticommutation indicator matrix.
+
+    Algorithm:
+    Rows are grouped into tiles of ACQ_TILE strings, such that a pair of 
+    tiles stays in cache while all their pairs are evaluated. Only tiles in 
+    the upper triangle are computed, with tile rows t and nt-1-t assigned to
+    the same (parallel) iteration to balance the triangular workload. The 
+    lower triangle is filled by symmetry.'''
+    (L, W) = xs.shape
+    mat = numpy.zeros((L,L), dtype=numpy.uint8)
+    nt = (L + ACQ_TILE - 1)//ACQ_TILE # number of tiles
+    for t in prange((nt + 1)//2):
+        for k in range(2):
+            bi = numpy.int64(t) if k == 0 else nt - 1 - numpy.int64(t)
+            if k == 1 and bi == t: # middle tile row visited once
+                break
+            for bj in range(bi, nt):
+                for j1 in range(bi*ACQ_TILE, min((bi+1)*ACQ_TILE, L)):
+                    for j2 in range(max(j1+1, bj*ACQ_TILE), min((bj+1)*ACQ_TILE, L)):
+                        a = numpy.uint64(0)
+                        for w in range(W):
+                            a ^= (xs[j1,w] & zs[j2,w]) ^ (zs[j1,w] & xs[j2,w])
+                        if popcount(a) % 2:
+                            mat[j1,j2] = 1
+                            mat[j2,j1] = 1
+    return mat
+
+@njit(nogil=True)
+def pauli_combine_packed(C, xs_in, zs_in, ps_in):
+    '''Combine packed Pauli operators by operator product (see pauli_combine).'''
+    (L_out, L_in) = C.shape
+    W = xs_in.shape[-1]
+    xs_out = numpy.zeros((L_out, W), dtype=numpy.uint64) # identity
+    zs_out = numpy.zeros((L_out, W), dtype=numpy.uint64)
+    ps_out = numpy.zeros((L_out,), dtype=ps_in.dtype)
+    for j_out in prange(L_out):
+        for j_in in range(L_in):
+            if C[j_out, j_in]:
+                ps_out[j_out] = (numpy.int64(ps_out[j_out]) + ps_in[j_in] + ipow_packed(
+                    xs_out[j_out], zs_out[j_out], xs_in[j_in], zs_in[j_in]))%4
+                xs_out[j_out] ^= xs_in[j_in]
+                zs_out[j_out] ^= zs_in[j_in]
+    return xs_out, zs_out, ps_out
+
+@njit(nogil=True)
+def pauli_transform_packed(xs_in, zs_in, ps_in, xs_map, zs_map, ps_map):
+    '''Transform packed Pauli operators by a packed Clifford map 
+    (see pauli_transform).
+
+    Parameters:
+    xs_in, zs_in: uint64 (L, W) - input Pauli strings.
+    ps_in: int (L) - phase indicators of input operators.
+    xs_map, zs_map: uint64 (2*N, W) - operator map (rows in map order).
+    ps_map: int (2*N) - phase indicators associated to target operators.
+
+    Returns:
+    xs_out, zs_out: uint64 (L, W) - output Pauli strings.
+    ps_out: int (L) - phase indicators of output operators.'''
+    (L, W) = xs_in.shape
+    N = xs_map.shape[0]//2
+    xs_out = numpy.zeros((L, W), dtype=numpy.uint64)
+    zs_out = numpy.zeros((L, W), dtype=numpy.uint64)
+    ps_out = numpy.zeros((L,), dtype=ps_in.dtype)
+    for j in prange(L):
+        p = numpy.int64(ps_in[j])
+        for i in range(N):
+            s = numpy.uint64(i % 64)
+            x = (xs_in[j,i//64] >> s) & ONE
+            z = (zs_in[j,i//64] >> s) & ONE
+            if x: # map X_i
+                p += ps_map[2*i] + ipow_packed(xs_out[j], zs_out[j], xs_map[2*i], zs_map[2*i])
+                xs_out[j] ^= xs_map[2*i]
+                zs_out[j] ^= zs_map[2*i]
+            if z: # map Z_i
+                p += ps_map[2*i+1] + ipow_packed(xs_out[j], zs_out[j], xs_map[2*i+1], zs_map[2*i+1])
+                xs_out[j] ^= xs_map[2*i+1]
+                zs_out[j] ^= zs_map[2*i+1]
+            if x and z: # bare phase x.z
+                p += 1
+        ps_out[j] = p % 4
+    return xs_out, zs_out, ps_out
+
+@njit(nogil=True)
+def pauli_transform_packed_local(xs, zs, ps, qubits, gs_map, ps_map):
+    '''Transform packed Pauli operators by a Clifford map acting on a subset 
+    of qubits. (in-place)
+
+    Parameters:
+    xs, zs: uint64 (L, W) - packed Pauli strings.
+    ps: int (L) - phase indicators.
+    qubits: int (n) - qubits that the map acts on.
+    gs_map: int (2*n, 2*n) - local operator map in binary representation.
+    ps_map: int (2*n) - phase indicators associated to target operators.
+
+    Returns: xs, zs, ps in-place modified.'''
+    L = xs.shape[0]
+    n = qubits.shape[0]
+    g_in = numpy.zeros(2*n, dtype=numpy.int_)
+    g_out = numpy.zeros(2*n, dtype=numpy.int_)
+    for j in range(L):
+        # gather local bits
+        for a in range(n):
+            w = qubits[a]//64
+            s = numpy.uint64(qubits[a] % 64)
+            g_in[2*a] = (xs[j,w] >> s) & ONE
+            g_in[2*a+1] = (zs[j,w] >> s) & ONE
+        # transform local string
+        g_out[:] = 0
+        p = ps[j] + p0(g_in)
+        for k in range(2*n):
+            if g_in[k]:
+                p += ps_map[k] + ipow(g_out, gs_map[k])
+                for l in range(2*n):
+                    g_out[l] = (g_out[l] + gs_map[k,l])%2
+        ps[j] = p % 4
+        # scatter local bits
+        for a in range(n):
+            w = qubits[a]//64
+            b = ONE << numpy.uint64(qubits[a] % 64)
+            xs[j,w] &= ~b
+            zs[j,w] &= ~b
+            if g_out[2*a]:
+                xs[j,w] |= b
+            if g_out[2*a+1]:
+                zs[j,w] |= b
+    return xs, zs, ps
+
+@njit(nogil=True)
+def pauli_transform_packed_table(xs, zs, ps, qubits, table_gs, table_ps):
+    '''Transform packed Pauli operators by a local Clifford map given as a 
+    lookup table (in-place, see pauli_transform_table).
+
+    Parameters:
+    xs, zs: uint64 (L, W) - packed Pauli strings.
+    ps: int (L) - phase indicators.
+    qubits: int (n) - qubits that the map acts on (in the order of the map).
+    table_gs: int (4^n, 2*n) - images of local Pauli strings.
+    table_ps: int (4^n) - phase indicator increments of local Pauli strings.
+
+    Returns: xs, zs, ps in-place modified.'''
+    L = xs.shape[0]
+    n = qubits.shape[0]
+    for j in prange(L):
+        k = 0 # index of local Pauli string
+        for a in range(n):
+            w = qubits[a]//64
+            s = numpy.uint64(qubits[a] % 64)
+            k = (k << 2) | numpy.int64(((xs[j,w] >> s) & ONE) << ONE | ((zs[j,w] >> s) & ONE))
+        ps[j] = (numpy.int64(ps[j]) + table_ps[k])%4
+        for a in range(n):
+            w = qubits[a]//64
+            b = ONE << numpy.uint64(qubits[a] % 64)
+            xs[j,w] &= ~b
+            zs[j,w] &= ~b
+            if table_gs[k,2*a]:
+                xs[j,w] |= b
+            if table_gs[k,2*a+1]:
+                zs[j,w] |= b
+    return xs, zs, ps
+
+@njit(nogil=True)
+def clifford_rotate_packed(gx, gz, p, xs, zs, ps):
+    '''Apply Clifford rotation to packed Pauli operators (see clifford_rotate).
+
+    Returns: xs, zs, ps in-place modified.'''
+    L = xs.shape[0]
+    for j in range(L):
+        if acq_packed(gx, gz, xs[j], zs[j]):
+            ps[j] = (numpy.int64(ps[j]) + p + 1 + ipow_packed(xs[j], zs[j], gx, gz))%4
+            xs[j] ^= gx
+            zs[j] ^= gz
+    return xs, zs, ps
+
+@njit(nogil=True)
+def swap_rows_packed(xs, zs, a, b):
+    '''Swap two rows of a packed tableau. (in-place)'''
+    for w in range(xs.shape[1]):
+        tmp = xs[a,w]
+        xs[a,w] = xs[b,w]
+        xs[b,w] = tmp
+        tmp = zs[a,w]
+        zs[a,w] = zs[b,w]
+        zs[b,w] = tmp
+
+@njit(nogil=True)
+def stabilizer_measure_packed(xs_stb, zs_stb, ps_stb, xs_obs, zs_obs, ps_obs, r, rng):
+    '''Measure a set of commuting Pauli observables on a packed stabilizer 
+    tableau (see stabilizer_measure).
+
+    Returns:
+    xs_stb, zs_stb, ps_stb: updated packed stabilizer tableau.
+    r: int - updated log2 rank of density matrix.
+    out: int (L) - measurment outcomes (0 or 1 binaries).
+    log2prob: real - log2 probability of this outcome.'''
+    L = xs_obs.shape[0]
+    N = xs_stb.shape[0]//2
+    W = xs_stb.shape[1]
+    assert 0<=r<=N
+    out = numpy.empty(L, dtype=numpy.int_)
+    xa = numpy.empty(W, dtype=numpy.uint64) # workspace for stabilizer accumulation
+    za = numpy.empty(W, dtype=numpy.uint64)
+    pa = 0 # workspace for phase accumulation
+    log2prob = 0.
+    for k in range(L): # for each observable
+        update = False
+        extend = False
+        p = 0 # pointer to the first anticommuting operator
+        xa[:] = 0
+        za[:] = 0
+        pa = 0
+        for j in range(2*N):
+            if acq_packed(xs_stb[j], zs_stb[j], xs_obs[k], zs_obs[k]):
+                if update: # update row j to commute with the observable
+                    if j < N: # stabilizer, phase matters
+                        ps_stb[j] = (numpy.int64(ps_stb[j]) + ps_stb[p] + ipow_packed(
+                            xs_stb[j], zs_stb[j], xs_stb[p], zs_stb[p]))%4
+                    xs_stb[j] ^= xs_stb[p]
+                    zs_stb[j] ^= zs_stb[p]
+                else: # first anticommuting operator
+                    if j < N + r: # not an active destabilizer
+                        p = j
+                        update = True
+                        if not r <= j < N: # standby operator
+                            extend = True
+                    else: # active destabilizer, collect stabilizer component
+                        pa = (pa + ps_stb[j-N] + ipow_packed(xa, za, xs_stb[j-N], zs_stb[j-N]))%4
+                        xa ^= xs_stb[j-N]
+                        za ^= zs_stb[j-N]
+        if update:
+            q = (p+N)%(2*N) # get q as dual of p 
+            xs_stb[q] = xs_stb[p]
+            zs_stb[q] = zs_stb[p]
+            xs_stb[p] = xs_obs[k]
+            zs_stb[p] = zs_obs[k]
+            if extend:
+                r -= 1 # rank will reduce under extension
+                # bring new stabilizer from p to r
+                if p == r:
+                    pass
+                elif q == r:
+                    swap_rows_packed(xs_stb, zs_stb, p, q)
+                else:
+                    s = (r+N)%(2*N) # get s as dual of r
+                    swap_rows_packed(xs_stb, zs_stb, p, r)
+                    swap_rows_packed(xs_stb, zs_stb, q, s)
+                p = r
+            ps_stb[p] = 2 * rng_bit(rng)
+            out[k] = ((numpy.int64(ps_stb[p]) - ps_obs[k])%4)//2
+            log2prob -= 1.
+        else: # observable is eigen, result is in pa
+            assert (xa == xs_obs[k]).all() and (za == zs_obs[k]).all()
+            out[k] = ((pa - ps_obs[k])%4)//2
+    return xs_stb, zs_stb, ps_stb, r, out, log2prob
+
+@njit(nogil=True)
+def stabilizer_postselect_packed(xs_stb, zs_stb, ps_stb, xs_obs, zs_obs, ps_obs, r):
+    '''Postselect packed stabilizer tableau given a set of Pauli observations
+    (see stabilizer_postselect).
+
+    Returns:
+    xs_stb, zs_stb, ps_stb: updated packed stabilizer tableau.
+    r: int - updated log2 rank of density matrix.
+    log2prob: real - log2 probability of successful postselection.'''
+    L = xs_obs.shape[0]
+    N = xs_stb.shape[0]//2
+    W = xs_stb.shape[1]
+    assert 0<=r<=N
+    xa = numpy.empty(W, dtype=numpy.uint64) # workspace for stabilizer accumulation
+    za = numpy.empty(W, dtype=numpy.uint64)
+    pa = 0 # workspace for phase accumulation
+    log2prob = 0.
+    for k in range(L): # for each observable
+        update = False
+        extend = False
+        p = 0 # pointer to the first anticommuting operator
+        xa[:] = 0
+        za[:] = 0
+        pa = 0
+        for j in range(2*N):
+            if acq_packed(xs_stb[j], zs_stb[j], xs_obs[k], zs_obs[k]):
+                if update: # update row j to commute with the observable
+                    if j < N: # stabilizer, phase matters
+                        ps_stb[j] = (numpy.int64(ps_stb[j]) + ps_stb[p] + ipow_packed(
+                            xs_stb[j], zs_stb[j], xs_stb[p], zs_stb[p]))%4
+                    xs_stb[j] ^= xs_stb[p]
+                    zs_stb[j] ^= zs_stb[p]
+                else: # first anticommuting operator
+                    if j < N + r: # not an active destabilizer
+                        p = j
+                        update = True
+                        if not r <= j < N: # standby operator
+                            extend = True
+                    else: # active destabilizer, collect stabilizer component
+                        pa = (pa + ps_stb[j-N] + ipow_packed(xa, za, xs_stb[j-N], zs_stb[j-N]))%4
+                        xa ^= xs_stb[j-N]
+                        za ^= zs_stb[j-N]
+        if update:
+            q = (p+N)%(2*N) # get q as dual of p 
+            xs_stb[q] = xs_stb[p]
+            zs_stb[q] = zs_stb[p]
+            xs_stb[p] = xs_obs[k]
+            zs_stb[p] = zs_obs[k]
+            if extend:
+                r -= 1 # rank will reduce under extension
+                # bring new stabilizer from p to r
+                if p == r:
+                    pass
+                elif q == r:
+                    swap_rows_packed(xs_stb, zs_stb, p, q)
+                else:
+                    s = (r+N)%(2*N) # get s as dual of r
+                    swap_rows_packed(xs_stb, zs_stb, p, r)
+                    swap_rows_packed(xs_stb, zs_stb, q, s)
+                p = r
+            ps_stb[p] = ps_obs[k]
+            log2prob -= 1.
+        else: # observable is eigen, result is in pa
+            assert (xa == xs_obs[k]).all() and (za == zs_obs[k]).all()
+            if (pa - ps_obs[k])%4 != 0: # if result not match observation
+                log2prob -= numpy.inf
+    return xs_stb, zs_stb, ps_stb, r, log2prob
+
+@njit(nogil=True)
+def stabilizer_project_packed(xs_stb, zs_stb, xs_obs, zs_obs, r):
+    '''Project packed stabilizer tableau to a new stabilizer basis 
+    (see stabilizer_project).
+
+    Returns:
+    xs_stb, zs_stb: updated packed stabilizer tableau.
+    r: int - updated log2 rank of density matrix.'''
+    L = xs_obs.shape[0]
+    N = xs_stb.shape[0]//2
+    assert 0<=r<=N
+    for k in range(L): # loop over incoming projections
+        update = False
+        extend = False
+        p = 0 # pointer to the first anticommuting operator
+        for j in range(2*N):
+            if acq_packed(xs_stb[j], zs_stb[j], xs_obs[k], zs_obs[k]):
+                if update: # update row j to commute with the observable
+                    xs_stb[j] ^= xs_stb[p]
+                    zs_stb[j] ^= zs_stb[p]
+                else: # first anticommuting operator
+                    if j < N + r: # not an active destabilizer
+                        p = j
+                        update = True
+                        if not r <= j < N: # standby operator
+                            extend = True
+        if update:
+            q = (p+N)%(2*N) # get q as dual of p 
+            xs_stb[q] = xs_stb[p]
+            zs_stb[q] = zs_stb[p]
+            xs_stb[p] = xs_obs[k]
+            zs_stb[p] = zs_obs[k]
+            if extend:
+                r -= 1 # rank will reduce under extension
+                # bring new stabilizer from p to r
+                if p == r:
+                    pass
+                elif q == r:
+                    swap_rows_packed(xs_stb, zs_stb, p, q)
+                else:
+                    s = (r+N)%(2*N) # get s as dual of r
+                    swap_rows_packed(xs_stb, zs_stb, p, r)
+                    swap_rows_packed(xs_stb, zs_stb, q, s)
+    return xs_stb, zs_stb, r
+
+@njit(nogil=True)
+def stabilizer_expect_packed(xs_stb, zs_stb, ps_stb, xs_obs, zs_obs, ps_obs, r):
+    '''Evaluate the expectation values of Pauli operators on a packed 
+    stabilizer tableau (see stabilizer_expect).
+
+    Returns:
+    xs: int (L) - expectation values of Pauli operators.'''
+    L = xs_obs.shape[0]
+    N = xs_stb.shape[0]//2
+    W = xs_stb.shape[1]
+    assert 0<=r<=N
+    xs = numpy.empty(L, dtype=numpy.int_) # expectation values
+    for k in prange(L): # for each observable
+        xa = numpy.zeros(W, dtype=numpy.uint64) # workspace for stabilizer accumulation
+        za = numpy.zeros(W, dtype=numpy.uint64)
+        pa = 0 # workspace for sign accumulation
+        trivial = True # assuming observable is trivial in code subspace
+        for j in range(2*N):
+            if acq_packed(xs_stb[j], zs_stb[j], xs_obs[k], zs_obs[k]):
+                if j < N + r: # active stablizer or standby
+                    xs[k] = 0 # logical or error operator
+                    trivial = False
+                    break
+                else: # accumulate stablizer components
+                    pa = (pa + ps_stb[j-N] + ipow_packed(xa, za, xs_stb[j-N], zs_stb[j-N]))%4
+                    xa ^= xs_stb[j-N]
+                    za ^= zs_stb[j-N]
+        if trivial:
+            xs[k] = (-1)**(((pa - ps_obs[k])%4)//2)
+    return xs
+
+@njit(nogil=True)
+def trailing_zeros(w):
+    '''Index of the lowest set bit in a nonzero uint64 word.'''
+    return popcount((w & (~w + ONE)) - ONE)
+
+@njit(nogil=True)
+def stabilizer_index_packed(xs_stb, zs_stb):
+    '''Build the decomposition index of a packed stabilizer tableau.
+
+    Since stabilizer i only anticommutes with destabilizer i (and vice versa),
+    the symplectic inverse of the tableau is the tableau itself with the 
+    stabilizer/destabilizer partners exchanged. A Pauli string g decomposes 
+    into tableau rows as g = sum_j a_j T_j with a_j = acq(g, partner of T_j), 
+    which is the XOR of the index rows over the x and z bits of g.
 
     Parameters:
-    mat: int matrix - input binary matrix.
-        caller must ensure that mat contains only 0 and 1.
-        mat is destroyed upon output! 
+    xs_stb: uint64 (2*N, W) - packed x bits of the stabilizer tableau.
+    zs_stb: uint64 (2*N, W) - packed z bits of the stabilizer tableau.
+
+    Returns:
+    ix: uint64 (N, ceil(2*N/64)) - tableau rows that X_q decomposes into.
+    iz: uint64 (N, ceil(2*N/64)) - tableau rows that Z_q decomposes into.'''
+    N = xs_stb.shape[0]//2
+    V = (2*N + 63)//64
+    ix = numpy.zeros((N, V), dtype=numpy.uint64)
+    iz = numpy.zeros((N, V), dtype=numpy.uint64)
+    for j in range(2*N):
+        k = (j + N)%(2*N) # partner of row j
+        b = ONE << numpy.uint64(j % 64)
+        for q in range(N):
+            s = numpy.uint64(q % 64)
+            if (zs_stb[k, q//64] >> s) & ONE:
+                ix[q, j//64] |= b
+            if (xs_stb[k, q//64] >> s) & ONE:
+                iz[q, j//64] |= b
+    return ix, iz
+
+@njit(nogil=True)
+def stabilizer_expect_indexed(xs_stb, zs_stb, ps_stb, ix, iz, xs_obs, zs_obs, ps_obs, r):
+    '''Evaluate the expectation values of Pauli operators on a packed 
+    stabilizer tableau using its decomposition index (see stabilizer_expect,
+    stabilizer_index_packed). The cost per observable scales with its weight, 
+    instead of with the tableau size.
 
     Returns:
-    r: int - rank of the matrix under Z2 algebra.'''
-    nr, nc = mat.shape # get num of rows and cols
-    r = 0 # current row index
-    for i in range(nc): # run through cols
-        if r == nr: # row exhausted first
-            return r # row rank is full, early return
-        if mat[r, i] == 0: # need to find pivot
-            found = False # set a flag
-            for k in range(r + 1, nr):
-                if mat[k, i]: # mat[k, i] nonzero
-                    found = True # pivot found in k
+    xs: int (L) - expectation values of Pauli operators.'''
+    L, W = xs_obs.shape
+    N = xs_stb.shape[0]//2
+    V = ix.shape[1]
+    assert 0<=r<=N
+    # observable must decompose into active stabilizers [r,N) only
+    active = numpy.zeros(V, dtype=numpy.uint64)
+    for j in range(r, N):
+        active[j//64] |= ONE << numpy.uint64(j % 64)
+    xs = numpy.empty(L, dtype=numpy.int_) # expectation values
+    for k in prange(L): # for each observable
+        a = numpy.zeros(V, dtype=numpy.uint64) # decomposition coefficients
+        for w in range(W):
+            word = xs_obs[k, w]
+            while word:
+                a ^= ix[64*w + trailing_zeros(word)]
+                word &= word - ONE
+            word = zs_obs[k, w]
+            while word:
+                a ^= iz[64*w + trailing_zeros(word)]
+                word &= word - ONE
+        trivial = True # assuming observable is trivial in code subspace
+        for v in range(V):
+            if a[v] & ~active[v]: # logical or error operator
+                trivial = False
+                break
+        if not trivial:
+            xs[k] = 0
+            continue
+        xa = numpy.zeros(W, dtype=numpy.uint64) # workspace for stabilizer accumulation
+        za = numpy.zeros(W, dtype=numpy.uint64)
+        pa = 0 # workspace for sign accumulation
+        for v in range(V):
+            word = a[v]
+            while word:
+                j = 64*v + trailing_zeros(word)
+                pa = (pa + ps_stb[j] + ipow_packed(xa, za, xs_stb[j], zs_stb[j]))%4
+                xa ^= xs_stb[j]
+                za ^= zs_stb[j]
+                word &= word - ONE
+        xs[k] = (-1)**(((pa - ps_obs[k])%4)//2)
+    return xs
+
+# ---- hashing ----
+''' Like terms are combined by an open-addressing hash table keyed on 64-bit 
+fingerprints of packed Pauli strings (linear probing, load factor <= 1/2). 
+Strings with equal fingerprints are compared word by word, such that a 
+fingerprint collision never merges different strings. Unique strings are 
+reported in the order of their first occurrence.
+'''
+MIX1 = numpy.uint64(0xbf58476d1ce4e5b9)
+MIX2 = numpy.uint64(0x94d049bb133111eb)
+SEED = numpy.uint64(0x9e3779b97f4a7c15)
+
+@njit(nogil=True)
+def mix64(h):
+    '''Scramble the bits of a uint64 word (splitmix64 finalizer).'''
+    h = (h ^ (h >> numpy.uint64(30))) * MIX1
+    h = (h ^ (h >> numpy.uint64(27))) * MIX2
+    return h ^ (h >> numpy.uint64(31))
+
+@njit(nogil=True)
+def fingerprint(x, z):
+    '''64-bit fingerprint of a packed Pauli string.
+
+    Parameters:
+    x, z: uint64 (W) - packed x and z bits.
+
+    Returns:
+    h: uint64 - fingerprint of the string.'''
+    h = SEED
+    for w in range(x.shape[0]):
+        h = mix64(h ^ x[w])
+        h = mix64(h ^ z[w])
+    return h
+
+@njit(nogil=True)
+def hash_table(n):
+    '''Allocate an empty hash table for up to n keys.
+
+    Returns:
+    keys: uint64 (M) - fingerprints in each slot.
+    slots: int (M) - index of the unique string in each slot (-1 if empty).'''
+    M = 2
+    while M < 2*n:
+        M *= 2
+    return numpy.zeros(M, dtype=numpy.uint64), numpy.full(M, -1, dtype=numpy.int_)
+
+@njit(nogil=True)
+def hash_lookup(keys, slots, refs, xs, zs, h, x, z):
+    '''Find a packed Pauli string in a hash table.
+
+    Parameters:
+    keys, slots: hash table (see hash_table).
+    refs: int (u) - row in (xs, zs) of each unique string in the table.
+    xs, zs: uint64 (L, W) - storage of packed Pauli strings.
+    h: uint64 - fingerprint of the string.
+    x, z: uint64 (W) - packed string to look up.
+
+    Returns:
+    k: int - slot of the string, or of the empty slot where it belongs.'''
+    mask = keys.shape[0] - 1
+    k = numpy.int64(h & numpy.uint64(mask))
+    while slots[k] >= 0:
+        if keys[k] == h:
+            i = refs[slots[k]]
+            same = True
+            for w in range(x.shape[0]): # exact comparison
+                if xs[i, w] != x[w] or zs[i, w] != z[w]:
+                    same = False
                     break
-            if found: # if pivot found in k
-                # swap rows r, k
-                for j in range(i, nc):
-                    tmp = mat[k,j]
-                    mat[k,j] = mat[r, j]
-                    mat[r,j] = tmp
-            else: # if pivot not found
-                continue # done with this col
-        # pivot has moved to mat[r, i], perform GE
-        for j in range(r + 1, nr):
-            if mat[j, i]: # mat[j, i] nonzero
-                mat[j, i:] = (mat[j, i:] + mat[r, i:])%2
-        r = r + 1 # rank inc
-    # col exhausted, last nonvanishing row indexed by r
-    return r
-
-@njit
-def z2inv(mat):
-    '''Calculate Z2 inversion of a binary matrix.'''
-    assert mat.shape[0] == mat.shape[1] # assuming matrix is square
-    n = mat.shape[0] # get matrix dimension
-    a = numpy.zeros((n,2*n), dtype=mat.dtype) # prepare a workspace
-    a[:,:n] = mat # copy matrix to the left part
-    # create a diagonal matrix on the right part
-    for i in range(n):
-        a[i, i+n] = 1
-    # forward pass
-    for i in range(n): # run through cols
-        if a[i, i] == 0: # need to find pivot
-            found = False # set a flag
-            for k in range(i + 1, n):
-                if a[k, i]: # a[k, i] nonzero
-                    found  = True # pivot found at k
+            if same:
+                break
+        k = (k + 1) & mask
+    return k
+
+@njit(nogil=True)
+def pauli_unique_packed(xs, zs):
+    '''Find unique packed Pauli strings.
+
+    Parameters:
+    xs, zs: uint64 (L, W) - packed Pauli strings.
+
+    Returns:
+    first: int (u) - index of the first occurrence of each unique string.
+    inds: int (L) - index of the unique string that each string maps to.'''
+    L = xs.shape[0]
+    keys, slots = hash_table(L)
+    first = numpy.empty(L, dtype=numpy.int_)
+    inds = numpy.empty(L, dtype=numpy.int_)
+    u = 0 # number of unique strings
+    for j in range(L):
+        h = fingerprint(xs[j], zs[j])
+        k = hash_lookup(keys, slots, first, xs, zs, h, xs[j], zs[j])
+        if slots[k] < 0: # new string
+            keys[k] = h
+            slots[k] = u
+            first[u] = j
+            u += 1
+        inds[j] = slots[k]
+    return first[:u], inds
+
+@njit(nogil=True)
+def pauli_unique(gs):
+    '''Find unique Pauli strings (see pauli_unique_packed).
+
+    Parameters:
+    gs: int (L, 2*N) - Pauli strings in binary representation.
+
+    Returns:
+    first: int (u) - index of the first occurrence of each unique string.
+    inds: int (L) - index of the unique string that each string maps to.'''
+    xs, zs = pack_bits(gs)
+    return pauli_unique_packed(xs, zs)
+
+@njit(nogil=True)
+def top_k(a, k):
+    '''Select the k largest elements by a bounded min-heap.
+
+    Parameters:
+    a: real (L) - values to select from.
+    k: int - number of elements to keep.
+
+    Returns:
+    inds: int (min(k, L)) - indices of the selected elements (ascending).'''
+    heap = numpy.empty(min(k, a.shape[0]), dtype=numpy.int_) # min-heap of indices
+    n = 0
+    for i in range(a.shape[0]):
+        if n < heap.shape[0]: # heap not full, sift up
+            c = n
+            n += 1
+            while c > 0 and a[heap[(c-1)//2]] > a[i]:
+                heap[c] = heap[(c-1)//2]
+                c = (c-1)//2
+            heap[c] = i
+        elif n > 0 and a[i] > a[heap[0]]: # replace the smallest, sift down
+            c = 0
+            while True:
+                l = 2*c + 1
+                if l >= n:
                     break
-            if found: # if pivot found at k
-                # swap rows i, k
-                for j in range(i, 2*n):
-                    tmp = a[k, j]
-                    a[k, j] = a[i, j]
-                    a[i, j] = tmp
-            else: # if pivot not found, matrix not invertable
-                raise ValueError('binary matrix not invertable.')
-        # pivot has moved to a[i, i], perform GE
-        for j in range(i + 1, n):
-            if a[j, i]: # a[j, i] nonzero
-                a[j, i:] = (a[j, i:] + a[i, i:])%2
-    # backward pass
-    for i in range(n-1,0,-1):
-        for j in range(i):
-            if a[j, i]: # a[j, i] nonzero
-                a[j, i:] = (a[j, i:] + a[i, i:])%2
-    return a[:,n:]
+                if l + 1 < n and a[heap[l+1]] < a[heap[l]]:
+                    l += 1
+                if a[heap[l]] >= a[i]:
+                    break
+                heap[c] = heap[l]
+                c = l
+            heap[c] = i
+    return numpy.sort(heap[:n])
+
+@njit(nogil=True)
+def pauli_product_packed(xs1, zs1, ps1, cs1, xs2, zs2, ps2, cs2, tol, k):
+    '''Product of two packed Pauli polynomials with like terms combined on
+    the fly, small terms dropped and optionally only the k largest kept.
+    Memory scales with the number of distinct products, instead of L1*L2.
+
+    Parameters:
+    xs1, zs1: uint64 (L1, W) - Pauli strings in the first polynomial.
+    ps1: int (L1) - phase indicators in the first polynomial.
+    cs1: complex (L1) - coefficients in the first polynomial.
+    xs2, zs2, ps2, cs2 - same for the second polynomial (L2 terms).
+    tol: real - terms with |coefficient| <= tol are dropped.
+    k: int - max number of terms to keep (by magnitude), k < 0 for no limit.
+
+    Returns:
+    xs, zs: uint64 (L, W) - Pauli strings of the product (first occurrence 
+        order, phases moved to coefficients).
+    cs: complex (L) - coefficients of the product.'''
+    (L1, W) = xs1.shape
+    L2 = xs2.shape[0]
+    phase = numpy.array([1., 1.j, -1., -1.j])
+    cap = max(16, L1 + L2) # initial capacity
+    xs = numpy.empty((cap, W), dtype=numpy.uint64)
+    zs = numpy.empty((cap, W), dtype=numpy.uint64)
+    cs = numpy.zeros(cap, dtype=numpy.complex128)
+    hs = numpy.empty(cap, dtype=numpy.uint64) # fingerprints
+    refs = numpy.arange(cap)
+    keys, slots = hash_table(cap)
+    x = numpy.empty(W, dtype=numpy.uint64)
+    z = numpy.empty(W, dtype=numpy.uint64)
+    u = 0 # number of distinct products
+    for j1 in range(L1):
+        for j2 in range(L2):
+            for w in range(W):
+                x[w] = xs1[j1,w] ^ xs2[j2,w]
+                z[w] = zs1[j1,w] ^ zs2[j2,w]
+            p = (numpy.int64(ps1[j1]) + ps2[j2] + ipow_packed(xs1[j1], zs1[j1], xs2[j2], zs2[j2]))%4
+            h = fingerprint(x, z)
+            s = hash_lookup(keys, slots, refs, xs, zs, h, x, z)
+            if slots[s] < 0: # new string
+                if u == cap: # grow storage and rebuild table
+                    cap *= 2
+                    xs_new = numpy.empty((cap, W), dtype=numpy.uint64)
+                    zs_new = numpy.empty((cap, W), dtype=numpy.uint64)
+                    cs_new = numpy.zeros(cap, dtype=numpy.complex128)
+                    hs_new = numpy.empty(cap, dtype=numpy.uint64)
+                    xs_new[:u], zs_new[:u], cs_new[:u], hs_new[:u] = xs, zs, cs, hs
+                    xs, zs, cs, hs = xs_new, zs_new, cs_new, hs_new
+                    refs = numpy.arange(cap)
+                    keys, slots = hash_table(cap)
+                    for i in range(u):
+                        t = hash_lookup(keys, slots, refs, xs, zs, hs[i], xs[i], zs[i])
+                        keys[t] = hs[i]
+                        slots[t] = i
+                    s = hash_lookup(keys, slots, refs, xs, zs, h, x, z)
+                xs[u] = x
+                zs[u] = z
+                hs[u] = h
+                keys[s] = h
+                slots[s] = u
+                u += 1
+            cs[slots[s]] += cs1[j1] * cs2[j2] * phase[p]
+    mags = numpy.abs(cs[:u])
+    inds = numpy.flatnonzero(mags > tol)
+    if 0 <= k < inds.shape[0]:
+        inds = inds[top_k(mags[inds], k)]
+    return xs[inds], zs[inds], cs[inds]
+
+# ---- classical shadows ----
+''' A snapshot of the classical shadow with random Pauli measurements (local 
+Clifford circuit) is a product state sigma = prod_i (1 + (-)^o_i P_i)/2, 
+stored by the basis index b_i of P_i in (X, Y, Z) = (0, 1, 2) and the outcome 
+bit o_i of each qubit.
+'''
+@njit(nogil=True)
+def shadow_measure_local(gs_stb, ps_stb, r, bases, rng):
+    '''Sample the outcomes of random Pauli basis measurements on copies of a
+    stabilizer state.
+
+    Parameters:
+    gs_stb: int (2*N, 2*N) - Pauli strings in stabilizer tableau.
+    ps_stb: int (2*N) - phase indicators of (de)stabilizers.
+    r: int - log2 rank of density matrix (num of standby stablizers).
+    bases: int (S, N) - basis index (X, Y, Z) = (0, 1, 2) of each qubit in 
+        each snapshot.
+    rng: uint64 (2) - random stream (see rng_stream).
+
+    Returns:
+    outs: int (S, N) - outcome bits of each qubit in each snapshot.'''
+    S, N = bases.shape
+    outs = numpy.zeros((S, N), dtype=bases.dtype)
+    gs_obs = numpy.zeros((N, 2*N), dtype=gs_stb.dtype)
+    ps_obs = numpy.zeros(N, dtype=ps_stb.dtype)
+    for s in range(S):
+        for i in range(N):
+            b = numpy.int64(bases[s, i])
+            gs_obs[i, 2*i] = 1 if b != 2 else 0 # X or Y
+            gs_obs[i, 2*i+1] = 1 if b != 0 else 0 # Y or Z
+        _, _, _, out, _ = stabilizer_measure(gs_stb.copy(), ps_stb.copy(), 
+            gs_obs, ps_obs, r, rng)
+        for i in range(N):
+            outs[s, i] = out[i]
+    return outs
+
+@njit(nogil=True)
+def shadow_expect_local(bases, outs, gs_obs, ps_obs, G):
+    '''Evaluate the expectation values Tr(sigma O) of Pauli operators on 
+    local shadow snapshots, averaged within G groups of consecutive snapshots.
+
+    Parameters:
+    bases: int (S, N) - basis index of each qubit in each snapshot.
+    outs: int (S, N) - outcome bits of each qubit in each snapshot.
+    gs_obs: int (L, 2*N) - strings of Pauli operators.
+    ps_obs: int (L) - phase indicators of Pauli operators.
+    G: int - number of groups (snapshot s in group s*G//S).
+
+    Returns:
+    xs: real (G, L) - group means of the expectation values.'''
+    S, N = bases.shape
+    L = gs_obs.shape[0]
+    counts = numpy.zeros(G)
+    for s in range(S):
+        counts[s*G//S] += 1.
+    xs = numpy.zeros((G, L))
+    for k in prange(L): # for each observable gs_obs[k]
+        qs = numpy.empty(N, dtype=numpy.int_) # support of gs_obs[k]
+        bs = numpy.empty(N, dtype=numpy.int_) # basis required on support
+        w = 0
+        for i in range(N):
+            x = numpy.int64(gs_obs[k, 2*i])
+            z = numpy.int64(gs_obs[k, 2*i+1])
+            if x or z:
+                qs[w] = i
+                bs[w] = 2 if x == 0 else z
+                w += 1
+        p = numpy.int64(ps_obs[k])
+        for s in range(S):
+            match = True # all qubits on support measured in the right basis
+            o = 0
+            for a in range(w):
+                if bases[s, qs[a]] != bs[a]:
+                    match = False
+                    break
+                o += numpy.int64(outs[s, qs[a]])
+            if match:
+                xs[s*G//S, k] += 1 - 2*(((2*o - p)%4)//2)
+        for g in range(G):
+            xs[g, k] /= counts[g]
+    return xs
+
+# ---- Pauli frames ----
+''' Shots of a Clifford circuit are sampled relative to a reference shot: 
+each shot carries a Pauli frame F (a Pauli string, phase ignored), such that 
+its state is F rho_ref F^H, where rho_ref is the state of the reference shot.
+Frames of 64 shots are bit-packed into uint64 words along the shot axis,
+    xs[i, w] bit b = x-component on qubit i of the frame of shot 64*w+b,
+(zs likewise), so a gate or measurement updates 64 shots per word operation.
+    - initial frames are random elements of the group generated by the 
+      stabilizers and the standby destabilizers, which leave the initial
+      state invariant but randomize the outcomes of random measurements;
+    - a gate U maps the frame F -> U F U^H (phase ignored);
+    - a Z measurement on qubit i flips the reference outcome where the frame
+      has xs[i] set, then randomizes zs[i] (Z_i leaves the post-measurement 
+      state invariant).
+'''
+@njit(nogil=True)
+def frame_combine(gs_gen, rand):
+    '''Combine generators into packed Pauli frames (phase ignored).
+
+    Parameters:
+    gs_gen: int (L, 2*N) - Pauli strings of the generators.
+    rand: uint64 (L, W) - packed random bits, bit b of rand[j, w] selects 
+        generator j in the frame of shot 64*w+b.
+
+    Returns:
+    xs, zs: uint64 (N, W) - packed x and z components of the frames.'''
+    (L, N2) = gs_gen.shape
+    N = N2//2
+    W = rand.shape[1]
+    xs = numpy.zeros((N, W), dtype=numpy.uint64)
+    zs = numpy.zeros((N, W), dtype=numpy.uint64)
+    for j in range(L):
+        for i in range(N):
+            if gs_gen[j,2*i]:
+                for w in range(W):
+                    xs[i,w] ^= rand[j,w]
+            if gs_gen[j,2*i+1]:
+                for w in range(W):
+                    zs[i,w] ^= rand[j,w]
+    return xs, zs
+
+@njit(nogil=True)
+def frame_transform(xs, zs, gs_map, qubits):
+    '''Transform packed Pauli frames by a local Clifford map (in-place).
+
+    Parameters:
+    xs, zs: uint64 (N, W) - packed x and z components of the frames.
+    gs_map: int (2*n, 2*n) - Clifford map on the local qubits.
+    qubits: int (n) - qubits that the map acts on (in the order of the map).
+
+    Returns:
+    xs, zs: uint64 (N, W) - transformed frames.'''
+    n = qubits.shape[0]
+    W = xs.shape[1]
+    bits = numpy.empty(2*n, dtype=numpy.uint64) # local frame components
+    for w in range(W):
+        for a in range(n):
+            bits[2*a] = xs[qubits[a],w]
+            bits[2*a+1] = zs[qubits[a],w]
+        for a in range(n):
+            x = numpy.uint64(0)
+            z = numpy.uint64(0)
+            for b in range(2*n):
+                if gs_map[b,2*a]:
+                    x ^= bits[b]
+                if gs_map[b,2*a+1]:
+                    z ^= bits[b]
+            xs[qubits[a],w] = x
+            zs[qubits[a],w] = z
+    return xs, zs
+
+@njit(nogil=True)
+def frame_measure(xs, zs, qubits, ref, rand, out):
+    '''Measure packed Pauli frames in the Z basis (in-place).
+
+    Parameters:
+    xs, zs: uint64 (N, W) - packed x and z components of the frames.
+    qubits: int (n) - qubits to be measured.
+    ref: int (n) - measurement outcomes of the reference shot.
+    rand: uint64 (n, W) - packed random bits to randomize the frames.
+    out: uint64 (n, W) - buffer for the packed outcomes of all shots.
+
+    Returns:
+    out: uint64 (n, W) - packed measurement outcomes.'''
+    n = qubits.shape[0]
+    W = xs.shape[1]
+    for a in range(n):
+        flip = ~numpy.uint64(0) if ref[a] else numpy.uint64(0)
+        for w in range(W):
+            out[a,w] = xs[qubits[a],w] ^ flip
+            zs[qubits[a],w] ^= rand[a,w]
+    return out
+
+# ---- instruction tape ----
+''' A circuit compiled to a tape (see Circuit.to_tape) is a flat list of 
+instructions, run on a stabilizer tableau by the single compiled loop of 
+tape_run. Instruction k has the opcode ops[k], and acts on the qubits
+qubits[qoff[k]:qoff[k+1]]:
+    TAPE_TABLE - gate given by a lookup table (see pauli_transform_table), 
+        table_gs (4^n, 2*n) at pool_gs[goff[k]:] and table_ps (4^n) at 
+        pool_ps[poff[k]:];
+    TAPE_MAP - gate given by a local map (see pauli_transform_local), 
+        gs_map (2*n, 2*n) at pool_gs[goff[k]:] and ps_map (2*n) at 
+        pool_ps[poff[k]:];
+    TAPE_MEASURE - Z measurement, outcomes written to out[slots[k]:slots[k]+n];
+    TAPE_POSTSELECT - Z postselection on outcomes read from out[slots[k]:slots[k]+n].
+'''
+TAPE_TABLE = 0
+TAPE_MAP = 1
+TAPE_MEASURE = 2
+TAPE_POSTSELECT = 3
+
+@njit(nogil=True)
+def tape_run(gs_stb, ps_stb, r, ops, qoff, qubits, goff, poff, pool_gs, pool_ps, slots, out, rng):
+    '''Run an instruction tape on a stabilizer state (in-place).
+
+    Parameters:
+    gs_stb: int (2*N, 2*N) - Pauli strings in stabilizer tableau.
+    ps_stb: int (2*N) - phase indicators of (de)stabilizers.
+    r: int - log2 rank of density matrix.
+    ops, qoff, qubits, goff, poff, pool_gs, pool_ps, slots - instruction tape.
+    out: int (M) - measurement record, written by measurements and read by 
+        postselections.
+    rng: uint64 (2) - random stream of measurements (see rng_stream).
+
+    Returns:
+    gs_stb, ps_stb, r - updated stabilizer tableau and rank.
+    log2prob: real - total log2 probability of measurements and postselections.'''
+    N = gs_stb.shape[1]//2
+    log2prob = 0.
+    for k in range(ops.shape[0]):
+        qs = qubits[qoff[k]:qoff[k+1]]
+        n = qs.shape[0]
+        if ops[k] == TAPE_TABLE:
+            m = 1 << (2*n)
+            table_gs = pool_gs[goff[k]:goff[k]+2*n*m].reshape((m, 2*n))
+            table_ps = pool_ps[poff[k]:poff[k]+m]
+            pauli_transform_table(gs_stb, ps_stb, qs, table_gs, table_ps)
+        elif ops[k] == TAPE_MAP:
+            gs_map = pool_gs[goff[k]:goff[k]+4*n*n].reshape((2*n, 2*n))
+            ps_map = pool_ps[poff[k]:poff[k]+2*n]
+            pauli_transform_local(gs_stb, ps_stb, qs, gs_map, ps_map)
+        else: # Z observables on measured qubits
+            gs_obs = numpy.zeros((n, 2*N), dtype=gs_stb.dtype)
+            ps_obs = numpy.zeros(n, dtype=ps_stb.dtype)
+            for a in range(n):
+                gs_obs[a,2*qs[a]+1] = 1
+            if ops[k] == TAPE_MEASURE:
+                gs_stb, ps_stb, r, o, lp = stabilizer_measure(gs_stb, ps_stb, gs_obs, ps_obs, r, rng)
+                out[slots[k]:slots[k]+n] = o
+            else:
+                for a in range(n):
+                    ps_obs[a] = 2*out[slots[k]+a]
+                gs_stb, ps_stb, r, lp = stabilizer_postselect(gs_stb, ps_stb, gs_obs, ps_obs, r)
+            log2prob += lp
+    return gs_stb, ps_stb, r, log2prob
+
+# ---- dense state vectors ----
+''' A state vector of N qubits is an array of 2^N amplitudes v[b] indexed by
+basis states b, with qubit 0 as the most significant bit (matching the kron
+order of to_numpy). A Pauli string acts on basis states by a bit flip on its
+x-mask and a sign from its z-mask,
+    sigma[g] |b> = i^(x.z) (-)^popcount(z & b) |b ^ x>,
+such that it is applied to a state vector in O(2^N) time, without building
+its 2^N x 2^N matrix. Batches of vectors are stored as columns (2^N, B).
+'''
+@njit(nogil=True)
+def pauli_masks(g):
+    '''Convert a Pauli string to bit masks over basis states.
+
+    Parameters:
+    g: int (2*N) - a Pauli string in binary representation (N < 63).
+
+    Returns:
+    xm: int - x-mask (qubit 0 as the most significant bit).
+    zm: int - z-mask (qubit 0 as the most significant bit).
+    q: int - x.z, number of Y's in the Pauli string.'''
+    N = g.shape[0]//2
+    xm = 0
+    zm = 0
+    q = 0
+    for i in range(N):
+        x = numpy.int64(g[2*i])
+        z = numpy.int64(g[2*i+1])
+        xm |= x << (N-1-i)
+        zm |= z << (N-1-i)
+        q += x * z
+    return xm, zm, q
+
+@njit(nogil=True)
+def parity(b):
+    '''Parity of the number of set bits of a non-negative integer.'''
+    b ^= b >> 32
+    b ^= b >> 16
+    b ^= b >> 8
+    b ^= b >> 4
+    b ^= b >> 2
+    b ^= b >> 1
+    return b & 1
+
+@njit(nogil=True)
+def pauli_apply(gs, ps, cs, vs):
+    '''Apply a Pauli polynomial to a batch of state vectors.
+
+    Parameters:
+    gs: int (L, 2*N) - Pauli strings of the polynomial.
+    ps: int (L) - phase indicators.
+    cs: complex (L) - coefficients.
+    vs: complex (2^N, B) - state vectors (as columns).
+
+    Returns:
+    ws: complex (2^N, B) - sum_j cs[j] i^ps[j] sigma[gs[j]] vs.'''
+    L = gs.shape[0]
+    (D, B) = vs.shape
+    phase = numpy.array([1., 1.j, -1., -1.j])
+    ws = numpy.zeros((D, B), dtype=numpy.complex128)
+    for j in range(L):
+        xm, zm, q = pauli_masks(gs[j])
+        c = cs[j] * phase[(numpy.int64(ps[j]) + q)%4]
+        # b -> b ^ xm is a permutation, distinct b write distinct rows
+        for b in prange(D):
+            s = -c if parity(zm & b) else c
+            for k in range(B):
+                ws[b ^ xm, k] += s * vs[b, k]
+    return ws
+
+@njit(nogil=True)
+def pauli_expect_dense(gs, ps, vs):
+    '''Expectation values of Pauli operators on a batch of state vectors.
+
+    Parameters:
+    gs: int (L, 2*N) - Pauli strings.
+    ps: int (L) - phase indicators.
+    vs: complex (2^N, B) - state vectors (as columns).
+
+    Returns:
+    es: complex (L, B) - <v| i^ps[j] sigma[gs[j]] |v> for each operator j 
+        and vector v.'''
+    L = gs.shape[0]
+    (D, B) = vs.shape
+    phase = numpy.array([1., 1.j, -1., -1.j])
+    es = numpy.zeros((L, B), dtype=numpy.complex128)
+    for j in prange(L):
+        xm, zm, q = pauli_masks(gs[j])
+        c = phase[(numpy.int64(ps[j]) + q)%4]
+        for b in range(D):
+            s = -c if parity(zm & b) else c
+            for k in range(B):
+                es[j, k] += s * numpy.conj(vs[b ^ xm, k]) * vs[b, k]
+    return es
+
+@njit(nogil=True)
+def stabilizer_statevector(gs_stb, ps_stb, out):
+    '''Amplitudes of a pure stabilizer state.
+
+    Writing each stabilizer as i^q X^xm Z^zm, the generators are reduced 
+    to k generators with independent x-masks and N-k diagonal ones. The 
+    diagonal generators fix a basis state b0 in the support of the state, 
+    and the amplitudes on the support b0 ^ span(x-masks) follow from the 
+    orbit of b0 under the 2^k group elements generated by the first k, 
+    enumerated in Gray code order (one generator multiplied per element).
+
+    Parameters:
+    gs_stb: int (N, 2*N) - Pauli strings of the stabilizers (N < 63).
+    ps_stb: int (N) - phase indicators of the stabilizers.
+    out: complex (2^N) - buffer to write the state vector to (qubit 0 as 
+        the most significant bit of the basis index).
+
+    Returns:
+    out: complex (2^N) - the state vector (up to a global phase).'''
+    N = gs_stb.shape[0]
+    xm = numpy.zeros(N, dtype=numpy.int64)
+    zm = numpy.zeros(N, dtype=numpy.int64)
+    qs = numpy.zeros(N, dtype=numpy.int64)
+    for i in range(N):
+        xm[i], zm[i], q = pauli_masks(gs_stb[i])
+        qs[i] = (numpy.int64(ps_stb[i]) + q)%4
+    # row reduce x-masks, multiplying stabilizers as (i^q1 X^x1 Z^z1)(i^q2 X^x2 Z^z2)
+    # = i^(q1+q2) (-)^popcount(z1 & x2) X^(x1^x2) Z^(z1^z2)
+    k = 0
+    for bit in range(N-1, -1, -1):
+        for i in range(k, N):
+            if (xm[i] >> bit) & 1:
+                break
+        else:
+            continue
+        xm[i], xm[k] = xm[k], xm[i]
+        zm[i], zm[k] = zm[k], zm[i]
+        qs[i], qs[k] = qs[k], qs[i]
+        for j in range(N):
+            if j != k and (xm[j] >> bit) & 1:
+                qs[j] = (qs[j] + qs[k] + 2*parity(zm[j] & xm[k]))%4
+                xm[j] ^= xm[k]
+                zm[j] ^= zm[k]
+        k += 1
+    # diagonal stabilizers i^q Z^z require parity(z & b0) = q/2,
+    # solve by reduced row echelon form, setting free bits to 0
+    b0 = 0
+    m = k
+    piv = numpy.zeros(N, dtype=numpy.int64) # pivot bits
+    for bit in range(N-1, -1, -1):
+        for i in range(m, N):
+            if (zm[i] >> bit) & 1:
+                break
+        else:
+            continue
+        zm[i], zm[m] = zm[m], zm[i]
+        qs[i], qs[m] = qs[m], qs[i]
+        for j in range(k, N):
+            if j != m and (zm[j] >> bit) & 1:
+                zm[j] ^= zm[m]
+                qs[j] = (qs[j] + qs[m])%4
+        piv[m] = bit
+        m += 1
+    for i in range(k, N):
+        b0 |= (qs[i]//2) << piv[i]
+    # walk the orbit of b0
+    phase = numpy.array([1., 1.j, -1., -1.j])
+    out[:] = 0.
+    a = 2.**(-k/2)
+    x, z, q = 0, 0, 0 # current group element i^q X^x Z^z
+    for t in range(1 << k):
+        out[b0 ^ x] = a * phase[(q + 2*parity(z & b0))%4]
+        if t + 1 < (1 << k):
+            j = 0 # generator to multiply, by Gray code
+            while not ((t + 1) >> j) & 1:
+                j += 1
+            q = (q + qs[j] + 2*parity(z & xm[j]))%4
+            x ^= xm[j]
+            z ^= zm[j]
+    return out
 
 # ---- auxilary functions ----
 def mask(qubits, N):
@@ -989,7 +2630,7 @@ def binary_repr(ints, width = None):
     bins = numpy.unpackbits(ints.view(dtype=dt1)['bytes'], axis=-1, bitorder='little')
     return numpy.flip(bins, axis=-1)[...,-width:]
 
-@njit
+@njit(nogil=True)
 def aggregate(data_in, inds, l):
     '''Aggregate data (1d array) by unique inversion indices.
 
@@ -1006,7 +2647,7 @@ def aggregate(data_in, inds, l):
     return data_out
 
 # ---- generalized stabilizer utilities ----
-@njit
+@njit(nogil=True)
 def calculate_chi(chi_old, phi, fusion_map, fusion_p, L_new):
     L_old, L_add = fusion_map.shape
     chi_new = numpy.zeros((L_new,L_new), dtype=numpy.complex128)
@@ -1018,3 +2659,99 @@ def calculate_chi(chi_old, phi, fusion_map, fusion_p, L_new):
                     k2 = fusion_map[i2,j2]
                     chi_new[k1,k2] += chi_old[i1,i2] * phi[j1,j2] * 1j**(fusion_p[i1,j1] + fusion_p[i2,j2])
     return chi_new
+
+# ---- parallel execution ----
+''' Batch kernels loop over the L operators with prange, which runs as a 
+plain range in the (serial) kernels above. Their parallel variants are 
+compiled from the same source with parallel=True, so that the outer loop 
+is distributed over threads. All kernels are compiled with nogil=True, 
+such that Python threads driving independent objects run concurrently.
+
+The number of threads is a process-wide setting (set_num_threads), which 
+defaults to the environment variable PYCLIFFORD_NUM_THREADS, or 1 
+(serial execution) if not set. Object methods choose kernels via 
+parallel(kernel, L), which falls back to the serial kernel for batches 
+smaller than PARALLEL_MIN_SIZE, where threading overhead dominates.
+'''
+PARALLEL_MIN_SIZE = 256 # smallest batch size to run in parallel
+NUM_THREADS = int(os.environ.get('PYCLIFFORD_NUM_THREADS', 1))
+
+ps0_parallel = njit(parallel=True, nogil=True)(ps0.py_func)
+batch_dot_parallel = njit(parallel=True, nogil=True)(batch_dot.py_func)
+pauli_tokenize_parallel = njit(parallel=True, nogil=True)(pauli_tokenize.py_func)
+pauli_combine_parallel = njit(parallel=True, nogil=True)(pauli_combine.py_func)
+stabilizer_expect_parallel = njit(parallel=True, nogil=True)(stabilizer_expect.py_func)
+ps0_packed_parallel = njit(parallel=True, nogil=True)(ps0_packed.py_func)
+pauli_combine_packed_parallel = njit(parallel=True, nogil=True)(pauli_combine_packed.py_func)
+pauli_transform_packed_parallel = njit(parallel=True, nogil=True)(pauli_transform_packed.py_func)
+stabilizer_expect_packed_parallel = njit(parallel=True, nogil=True)(stabilizer_expect_packed.py_func)
+stabilizer_expect_indexed_parallel = njit(parallel=True, nogil=True)(stabilizer_expect_indexed.py_func)
+stabilizer_measure_batch_parallel = njit(parallel=True, nogil=True)(stabilizer_measure_batch.py_func)
+stabilizer_postselect_batch_parallel = njit(parallel=True, nogil=True)(stabilizer_postselect_batch.py_func)
+stabilizer_expect_batch_parallel = njit(parallel=True, nogil=True)(stabilizer_expect_batch.py_func)
+pauli_apply_parallel = njit(parallel=True, nogil=True)(pauli_apply.py_func)
+pauli_expect_dense_parallel = njit(parallel=True, nogil=True)(pauli_expect_dense.py_func)
+pauli_transform_table_parallel = njit(parallel=True, nogil=True)(pauli_transform_table.py_func)
+pauli_transform_packed_table_parallel = njit(parallel=True, nogil=True)(pauli_transform_packed_table.py_func)
+shadow_expect_local_parallel = njit(parallel=True, nogil=True)(shadow_expect_local.py_func)
+stabilizer_entropy_batch_parallel = njit(parallel=True, nogil=True)(stabilizer_entropy_batch.py_func)
+stabilizer_entropy_profile_batch_parallel = njit(parallel=True, nogil=True)(stabilizer_entropy_profile_batch.py_func)
+acq_mat_packed_parallel = njit(parallel=True, nogil=True)(acq_mat_packed.py_func)
+z2rank_batch_parallel = njit(parallel=True, nogil=True)(z2rank_batch.py_func)
+
+@njit(parallel=True, nogil=True)
+def pauli_transform_parallel(gs_in, ps_in, gs_map, ps_map):
+    '''Parallel variant of pauli_transform.'''
+    gs_out, ps_out = pauli_combine_parallel(gs_in, gs_map, ps_map)
+    ps_out = ((ps_in + ps0_parallel(gs_in) + ps_out)%4).astype(ps_in.dtype)
+    return gs_out.astype(gs_in.dtype), ps_out
+
+PARALLEL = {
+    ps0: ps0_parallel,
+    batch_dot: batch_dot_parallel,
+    pauli_tokenize: pauli_tokenize_parallel,
+    pauli_combine: pauli_combine_parallel,
+    pauli_transform: pauli_transform_parallel,
+    stabilizer_expect: stabilizer_expect_parallel,
+    ps0_packed: ps0_packed_parallel,
+    pauli_combine_packed: pauli_combine_packed_parallel,
+    pauli_transform_packed: pauli_transform_packed_parallel,
+    stabilizer_expect_packed: stabilizer_expect_packed_parallel,
+    stabilizer_expect_indexed: stabilizer_expect_indexed_parallel,
+    stabilizer_measure_batch: stabilizer_measure_batch_parallel,
+    stabilizer_postselect_batch: stabilizer_postselect_batch_parallel,
+    stabilizer_expect_batch: stabilizer_expect_batch_parallel,
+    pauli_apply: pauli_apply_parallel,
+    pauli_expect_dense: pauli_expect_dense_parallel,
+    pauli_transform_table: pauli_transform_table_parallel,
+    pauli_transform_packed_table: pauli_transform_packed_table_parallel,
+    shadow_expect_local: shadow_expect_local_parallel,
+    stabilizer_entropy_batch: stabilizer_entropy_batch_parallel,
+    stabilizer_entropy_profile_batch: stabilizer_entropy_profile_batch_parallel,
+    acq_mat_packed: acq_mat_packed_parallel,
+    z2rank_batch: z2rank_batch_parallel}
+
+def set_num_threads(n):
+    '''Set the number of threads used by parallel kernels (process-wide).
+
+    Parameters:
+    n: int - number of threads (n = 1 for serial execution), at most the 
+        number of threads numba is configured with (NUMBA_NUM_THREADS).'''
+    global NUM_THREADS
+    if not 1 <= n <= numba.config.NUMBA_NUM_THREADS:
+        raise ValueError('number of threads must be between 1 and {}.'.format(numba.config.NUMBA_NUM_THREADS))
+    NUM_THREADS = n
+
+def get_num_threads():
+    '''Get the number of threads used by parallel kernels.'''
+    return NUM_THREADS
+
+def parallel(kernel, L):
+    '''Select the kernel to process a batch of L operators: the parallel
+    variant if multi-threading is enabled and the batch is large enough, 
+    otherwise the serial kernel itself.'''
+    if NUM_THREADS > 1 and L >= PARALLEL_MIN_SIZE:
+        # numba thread count is thread-local, apply the setting to caller
+        numba.set_num_threads(min(NUM_THREADS, numba.config.NUMBA_NUM_THREADS))
+        return PARALLEL[kernel]
+    return kernel
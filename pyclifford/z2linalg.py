@@ -0,0 +1,268 @@
+import numpy
+from numba import njit, prange
+
+'''Z2 (GF(2)) linear algebra on bit-packed rows.
+
+A binary matrix of shape (nr, nc) is stored row-wise in uint64 words,
+    rows[i, w] bit b = mat[i, 64*w+b],
+such that adding two rows is a XOR of ceil(nc/64) words.
+
+Elimination follows the method of four Russians (M4RI): columns are
+processed in blocks of M4RI_K. Within a block, up to M4RI_K pivot rows are
+found and reduced against each other; all 2^k sums of the pivot rows are
+tabulated (in Gray code order, one XOR per entry); every other row is then
+cleared on the whole block by a single table lookup and XOR, instead of
+one row operation per pivot.
+'''
+M4RI_K = 8 # number of columns eliminated per table
+ONE = numpy.uint64(1)
+
+@njit(nogil=True)
+def pack_rows(mat):
+    '''Pack the rows of a binary matrix into uint64 words.
+
+    Parameters:
+    mat: int (nr, nc) - binary matrix.
+
+    Returns:
+    rows: uint64 (nr, ceil(nc/64)) - packed rows.'''
+    nr, nc = mat.shape
+    rows = numpy.zeros((nr, (nc + 63)//64), dtype=numpy.uint64)
+    for i in range(nr):
+        for j in range(nc):
+            if mat[i, j] % 2:
+                rows[i, j//64] |= ONE << numpy.uint64(j % 64)
+    return rows
+
+@njit(nogil=True)
+def unpack_rows(rows, nc):
+    '''Unpack uint64 rows to a binary matrix of nc columns.'''
+    nr = rows.shape[0]
+    mat = numpy.zeros((nr, nc), dtype=numpy.int_)
+    for i in range(nr):
+        for j in range(nc):
+            mat[i, j] = (rows[i, j//64] >> numpy.uint64(j % 64)) & ONE
+    return mat
+
+@njit(nogil=True)
+def getbit(rows, i, j):
+    '''Read bit (i, j) of packed rows.'''
+    return (rows[i, j//64] >> numpy.uint64(j % 64)) & ONE
+
+@njit(nogil=True)
+def z2eliminate(rows, nc, full):
+    '''Gaussian elimination of packed rows by the method of four Russians.
+    (in-place)
+
+    Parameters:
+    rows: uint64 (nr, W) - packed rows of the matrix.
+    nc: int - number of columns to eliminate (leading nc columns).
+    full: bool - True for reduced row echelon form, False for row echelon
+        form (rows above a pivot are left untouched).
+
+    Returns:
+    r: int - rank of the leading nc columns.
+    pivots: int (r) - pivot column of each of the first r rows.'''
+    nr, W = rows.shape
+    pivots = numpy.zeros(min(nr, nc), dtype=numpy.int_)
+    table = numpy.zeros((1 << M4RI_K, W), dtype=numpy.uint64)
+    cols = numpy.zeros(M4RI_K, dtype=numpy.int_) # pivot columns in block
+    r = 0 # current row index
+    c0 = 0 # first column of current block
+    while c0 < nc and r < nr:
+        c1 = min(c0 + M4RI_K, nc)
+        w0 = c0//64 # rows below r vanish before word w0
+        k = 0 # number of pivots found in block
+        for c in range(c0, c1): # find pivots in block
+            found = -1
+            for i in range(r + k, nr):
+                # reduce candidate row by the pivots found so far
+                for a in range(k):
+                    if getbit(rows, i, cols[a]):
+                        for w in range(w0, W):
+                            rows[i, w] ^= rows[r+a, w]
+                if getbit(rows, i, c):
+                    found = i
+                    break
+            if found < 0: # no pivot in column c
+                continue
+            if found != r + k: # swap pivot row to r + k
+                for w in range(w0, W):
+                    tmp = rows[found, w]
+                    rows[found, w] = rows[r+k, w]
+                    rows[r+k, w] = tmp
+            # clear column c from the other pivots in block
+            for a in range(k):
+                if getbit(rows, r+a, c):
+                    for w in range(w0, W):
+                        rows[r+a, w] ^= rows[r+k, w]
+            cols[k] = c
+            pivots[r+k] = c
+            k += 1
+            if r + k == nr: # rows exhausted
+                break
+        if k == 0:
+            c0 = c1
+            continue
+        # tabulate all combinations of pivot rows in Gray code order
+        for a in range(1, 1 << k):
+            low = a & -a # lowest set bit
+            b = 0
+            while (1 << b) != low:
+                b += 1
+            for w in range(w0, W):
+                table[a, w] = table[a ^ low, w] ^ rows[r+b, w]
+        # clear the pivot columns of all other rows by table lookup
+        start = 0 if full else r + k
+        for i in range(start, nr):
+            if r <= i < r + k:
+                continue
+            a = 0
+            for b in range(k):
+                if getbit(rows, i, cols[b]):
+                    a |= 1 << b
+            if a:
+                for w in range(w0, W):
+                    rows[i, w] ^= table[a, w]
+        r += k
+        c0 = c1
+    return r, pivots[:r]
+
+@njit(nogil=True)
+def z2rank(mat):
+    '''Calculate Z2 rank of a binary matrix.
+
+    Parameters:
+    mat: int matrix - input binary matrix.
+
+    Returns:
+    r: int - rank of the matrix under Z2 algebra.'''
+    r, _ = z2eliminate(pack_rows(mat), mat.shape[1], False)
+    return r
+
+@njit(nogil=True)
+def z2rref(mat):
+    '''Reduced row echelon form of a binary matrix under Z2 algebra.
+
+    Parameters:
+    mat: int (nr, nc) - input binary matrix.
+
+    Returns:
+    rref: int (nr, nc) - reduced row echelon form (nonzero rows first).
+    pivots: int (r) - pivot columns, r being the rank.'''
+    nc = mat.shape[1]
+    rows = pack_rows(mat)
+    r, pivots = z2eliminate(rows, nc, True)
+    return unpack_rows(rows, nc), pivots
+
+@njit(nogil=True)
+def z2inv(mat):
+    '''Calculate Z2 inversion of a binary matrix.'''
+    assert mat.shape[0] == mat.shape[1] # assuming matrix is square
+    n = mat.shape[0] # get matrix dimension
+    a = numpy.zeros((n, 2*n), dtype=numpy.int_) # prepare a workspace
+    a[:,:n] = mat # copy matrix to the left part
+    # create a diagonal matrix on the right part
+    for i in range(n):
+        a[i, i+n] = 1
+    rows = pack_rows(a)
+    r, _ = z2eliminate(rows, n, True)
+    if r < n: # matrix not invertable
+        raise ValueError('binary matrix not invertable.')
+    inv = numpy.zeros((n, n), dtype=mat.dtype)
+    for i in range(n):
+        for j in range(n):
+            inv[i, j] = getbit(rows, i, j + n)
+    return inv
+
+@njit(nogil=True)
+def z2matmul(a, b):
+    '''Product of binary matrices under Z2 algebra: each row of the result
+    is the XOR of the packed rows of b selected by a row of a.
+
+    Parameters:
+    a: int (n, m) - left binary matrix.
+    b: int (m, k) - right binary matrix.
+
+    Returns:
+    c: int (n, k) - binary matrix a.b mod 2.'''
+    n, m = a.shape
+    k = b.shape[1]
+    rows_b = pack_rows(b)
+    W = rows_b.shape[1]
+    rows_c = numpy.zeros((n, W), dtype=numpy.uint64)
+    for i in range(n):
+        for j in range(m):
+            if a[i, j] % 2:
+                for w in range(W):
+                    rows_c[i, w] ^= rows_b[j, w]
+    return unpack_rows(rows_c, k)
+
+@njit(nogil=True)
+def z2null(mat):
+    '''Null space of a binary matrix under Z2 algebra.
+
+    Parameters:
+    mat: int (nr, nc) - input binary matrix.
+
+    Returns:
+    null: int (nc - r, nc) - basis vectors v (as rows) of mat.v = 0.'''
+    nc = mat.shape[1]
+    rows = pack_rows(mat)
+    r, pivots = z2eliminate(rows, nc, True)
+    is_pivot = numpy.zeros(nc, dtype=numpy.bool_)
+    for a in range(r):
+        is_pivot[pivots[a]] = True
+    null = numpy.zeros((nc - r, nc), dtype=numpy.int_)
+    k = 0
+    for j in range(nc):
+        if not is_pivot[j]: # free column j
+            null[k, j] = 1
+            for a in range(r):
+                null[k, pivots[a]] = getbit(rows, a, j)
+            k += 1
+    return null
+
+@njit(nogil=True)
+def z2solve(mat, rhs):
+    '''Solve the linear equations mat.x = rhs under Z2 algebra.
+
+    Parameters:
+    mat: int (nr, nc) - coefficient matrix.
+    rhs: int (nr, m) - right-hand sides (as columns).
+
+    Returns:
+    x: int (nc, m) - a particular solution (free variables set to 0).'''
+    nr, nc = mat.shape
+    m = rhs.shape[1]
+    a = numpy.zeros((nr, nc + m), dtype=numpy.int_)
+    a[:, :nc] = mat
+    a[:, nc:] = rhs
+    rows = pack_rows(a)
+    r, pivots = z2eliminate(rows, nc, True)
+    for i in range(r, nr): # remaining rows must vanish on the right
+        for j in range(m):
+            if getbit(rows, i, nc + j):
+                raise ValueError('binary linear equations have no solution.')
+    x = numpy.zeros((nc, m), dtype=numpy.int_)
+    for i in range(r):
+        for j in range(m):
+            x[pivots[i], j] = getbit(rows, i, nc + j)
+    return x
+
+@njit(nogil=True)
+def z2rank_batch(mats):
+    '''Calculate Z2 ranks of a batch of binary matrices. (the parallel 
+    variant is selected by utils.parallel)
+
+    Parameters:
+    mats: int (B, nr, nc) - batch of binary matrices (matrices of different
+        shapes can be zero-padded to a common shape).
+
+    Returns:
+    rs: int (B) - ranks of the matrices under Z2 algebra.'''
+    B = mats.shape[0]
+    rs = numpy.zeros(B, dtype=numpy.int_)
+    for b in prange(B):
+        rs[b] = z2rank(mats[b])
+    return rs
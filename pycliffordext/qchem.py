@@ -15,15 +15,8 @@ from qiskit_nature.mappers.second_quantization import JordanWignerMapper, Parity
 import numpy
 import sys
 sys.path.insert(0, '../')
-from pyclifford.paulialg import pauli
+from pyclifford.paulialg import pauli, PauliPolynomialBuilder
 
-def binary_sum(x):
-    # Summing in pyclifford seems to take quadratic time. More efficient to do a recursive sum over halves of the list.
-    if len(x) < 30:
-        return sum(x)
-    else:
-        return binary_sum(x[::2]) + binary_sum(x[1::2])
-    
 def qchem_hamiltonian(geometry, use_pyscf=False, multiplicity=1, freeze=True, mapper=ParityMapper()):
     molecule = Molecule(geometry=geometry, charge=0, multiplicity=multiplicity)
 
@@ -47,7 +40,11 @@ def qchem_hamiltonian(geometry, use_pyscf=False, multiplicity=1, freeze=True, ma
     is_identity = lambda x: str(x.primitive).count('I') == len(str(x.primitive))
     const_shift = sum([x.coeff for x in qubit_op if is_identity(x)])
     shift += const_shift
-    pyc_hamiltonian = binary_sum([x.coeff * pauli(str(x.primitive)) for x in qubit_op if not is_identity(x)])
+    builder = PauliPolynomialBuilder(capacity=len(qubit_op))
+    for x in qubit_op:
+        if not is_identity(x):
+            builder.add(pauli(str(x.primitive)), x.coeff)
+    pyc_hamiltonian = builder.build()
     print('Done calculating pyclifford Hamiltonian.')
     if pyc_hamiltonian.N >= 14 or use_pyscf:
         print("Using pyscf ground state estimate")